@@ -0,0 +1,62 @@
+; Compare persistent maps and vectors with association lists and
+; copying vectors. Run with:
+;
+;     python interpreter/repl.py examples/persistent-collections.scm
+
+(define size 2000)
+
+(define (report name start)
+  (display name)
+  (display " took ")
+  (display (quotient (- (current-jiffy) start) 1000))
+  (display " ms")
+  (newline))
+
+; n inserts and n lookups in an association list
+(define start (current-jiffy))
+(define alist
+  (do ((i 0 (+ i 1))
+       (alist (quote ()) (cons (cons i i) alist)))
+      ((= i size) alist)))
+(do ((i 0 (+ i 1)))
+    ((= i size))
+  (assv i alist))
+(report "association list" start)
+
+; n inserts and n lookups in a persistent map
+(set! start (current-jiffy))
+(define pmap
+  (do ((i 0 (+ i 1))
+       (pmap (persistent-map) (persistent-map-set pmap i i)))
+      ((= i size) pmap)))
+(do ((i 0 (+ i 1)))
+    ((= i size))
+  (persistent-map-ref pmap i))
+(report "persistent map" start)
+
+; n functional updates of a vector, copying it each time
+(set! start (current-jiffy))
+(do ((i 0 (+ i 1))
+     (vector (make-vector size 0)
+             (let ((copy (vector-copy vector)))
+               (vector-set! copy i i)
+               copy)))
+    ((= i size)))
+(report "copying vector" start)
+
+; n functional updates of a persistent vector
+(set! start (current-jiffy))
+(do ((i 0 (+ i 1))
+     (pvector (vector->persistent-vector (make-vector size 0))
+              (persistent-vector-set pvector i i)))
+    ((= i size)))
+(report "persistent vector" start)
+
+; building a persistent vector with a transient
+(set! start (current-jiffy))
+(define builder (transient (persistent-vector)))
+(do ((i 0 (+ i 1)))
+    ((= i size))
+  (transient-add! builder i))
+(define built (persistent! builder))
+(report "transient vector" start)
@@ -11,3 +11,17 @@ from . import strings
 from . import vectors
 from . import io
 from . import control
+from . import srfi1
+from . import sorting
+from . import numeric_vectors
+from . import arrays
+from . import bytevectors
+from . import srfi69
+from . import persistent
+from . import time
+from . import containers
+from . import symbols
+from . import srfi151
+from . import bitsets
+from . import memoize
+from . import streams
@@ -0,0 +1,401 @@
+"""Numeric arrays with two or more dimensions, in the spirit of SRFI-25:
+http://srfi.schemers.org/srfi-25/srfi-25.html
+
+Arrays are stored row-major in NumPy arrays. Rows, columns and
+transposes are views that share storage with the original array, and
+matrix multiplication and reductions run as single NumPy operations.
+As with numeric vectors, integer results are computed exactly, and we
+raise an error rather than let one wrap around.
+
+"""
+import numpy
+
+from .base import define_built_in
+from .numeric_vectors import box_scalar, is_integer_operand, magnitude, widen, narrow
+from ..utils import check_argument_number
+from ..data_types import (Array, NumericVector, Vector, Number, Integer, FloatingPoint,
+                          Boolean, Cons, Nil)
+from ..errors import SchemeTypeError, SchemeArityError, InvalidArgument
+
+
+def check_array(function_name, array):
+    if not isinstance(array, Array):
+        raise SchemeTypeError("%s requires an array, you gave me %s."
+                              % (function_name, array.get_external_representation()))
+
+
+def check_integer(function_name, integer):
+    if not isinstance(integer, Integer):
+        raise SchemeTypeError("%s requires an integer, you gave me %s."
+                              % (function_name, integer.get_external_representation()))
+
+
+def wrap_result(array):
+    """Convert the result of a NumPy operation to a number, a numeric
+    vector or an array, depending on how many dimensions it has.
+
+    """
+    if array.ndim == 0:
+        return box_scalar(array[()])
+    elif array.ndim == 1:
+        return NumericVector.from_array(array)
+
+    return Array.from_array(array)
+
+
+def to_numpy(function_name, numbers):
+    """Convert a Python list of number atoms to an s64 array if they are
+    all integers, and an f64 array otherwise.
+
+    """
+    for number in numbers:
+        if not isinstance(number, Number):
+            raise SchemeTypeError("%s: arrays can only hold numbers, not %s."
+                                  % (function_name, number.get_external_representation()))
+
+    if all(isinstance(number, Integer) for number in numbers):
+        try:
+            return numpy.array([number.value for number in numbers], dtype=numpy.int64)
+        except OverflowError:
+            raise InvalidArgument("%s: arrays can only hold integers that fit in 64 bits."
+                                  % function_name)
+
+    return numpy.array([number.value for number in numbers], dtype=numpy.float64)
+
+
+def get_indexes(function_name, array, indexes):
+    if len(indexes) != array.value.ndim:
+        raise SchemeArityError("%s: an array of rank %d needs %d indexes, but got %d."
+                               % (function_name, array.value.ndim, array.value.ndim,
+                                  len(indexes)))
+
+    for (index, dimension) in zip(indexes, array.value.shape):
+        check_integer(function_name, index)
+
+        if not 0 <= index.value < dimension:
+            raise InvalidArgument("%s: index %d is out of range for a dimension of %d."
+                                  % (function_name, index.value, dimension))
+
+    return tuple(index.value for index in indexes)
+
+
+@define_built_in('make-array')
+def make_array(arguments):
+    """(make-array (dimension ...) [fill]) makes an array of the given
+    shape, filled with fill (0.0 by default).
+
+    """
+    check_argument_number('make-array', arguments, 1, 2)
+
+    dimensions = arguments[0]
+    if not isinstance(dimensions, Cons) or len(dimensions) < 2:
+        raise SchemeTypeError("make-array requires a list of at least two dimensions.")
+
+    for dimension in dimensions:
+        check_integer('make-array', dimension)
+
+        if dimension.value < 0:
+            raise InvalidArgument("make-array: dimensions must be non-negative, "
+                                  "got %d." % dimension.value)
+
+    fill = FloatingPoint(0.0)
+    if len(arguments) == 2:
+        fill = arguments[1]
+
+    fill_array = to_numpy('make-array', [fill])
+    shape = tuple(dimension.value for dimension in dimensions)
+
+    return Array.from_array(numpy.full(shape, fill_array[0], dtype=fill_array.dtype))
+
+
+def nested_to_flat(function_name, nested, rank):
+    """Convert a nested Scheme list (or vector) of depth rank into a flat
+    Python list of elements and a shape tuple.
+
+    """
+    rows = [nested]
+    shape = []
+
+    for _ in range(rank):
+        sequences = []
+        for row in rows:
+            if isinstance(row, Vector):
+                sequences.append(list(row.value))
+            elif isinstance(row, NumericVector):
+                sequences.append([row.box(number) for number in row.value])
+            elif isinstance(row, (Cons, Nil)):
+                sequences.append(list(row))
+            else:
+                raise SchemeTypeError("%s: expected a list or vector, got %s."
+                                      % (function_name, row.get_external_representation()))
+
+        lengths = set(len(sequence) for sequence in sequences)
+        if len(lengths) > 1:
+            raise InvalidArgument("%s: every row must have the same length." % function_name)
+
+        shape.append(lengths.pop() if lengths else 0)
+        rows = [element for sequence in sequences for element in sequence]
+
+    return (rows, tuple(shape))
+
+
+def nested_rank(nested):
+    """Count how many levels of lists or vectors nested has, following
+    the first element at each level.
+
+    """
+    rank = 0
+
+    while True:
+        if isinstance(nested, Cons):
+            nested = nested.head
+        elif isinstance(nested, Vector) and len(nested.value):
+            nested = nested.value[0]
+        elif isinstance(nested, NumericVector):
+            return rank + 1
+        else:
+            return rank
+
+        rank += 1
+
+
+def nested_to_array(function_name, nested):
+    rank = nested_rank(nested)
+
+    if rank < 2:
+        raise InvalidArgument("%s requires a list of at least two dimensions." % function_name)
+
+    (elements, shape) = nested_to_flat(function_name, nested, rank)
+    return Array.from_array(to_numpy(function_name, elements).reshape(shape))
+
+
+@define_built_in('list->array')
+def list_to_array(arguments):
+    """(list->array '((1 2) (3 4))) makes an array from nested lists."""
+    check_argument_number('list->array', arguments, 1, 1)
+
+    return nested_to_array('list->array', arguments[0])
+
+
+@define_built_in('vector->array')
+def vector_to_array(arguments):
+    """(vector->array (vector (vector 1 2) (vector 3 4))) makes an array
+    from a vector of vectors.
+
+    """
+    check_argument_number('vector->array', arguments, 1, 1)
+
+    if not isinstance(arguments[0], Vector):
+        raise SchemeTypeError("vector->array requires a vector, you gave me %s."
+                              % arguments[0].get_external_representation())
+
+    return nested_to_array('vector->array', arguments[0])
+
+
+@define_built_in('array->list')
+def array_to_list(arguments):
+    check_argument_number('array->list', arguments, 1, 1)
+
+    array = arguments[0]
+    check_array('array->list', array)
+
+    def nested_list(values):
+        if values.ndim == 1:
+            return Cons.from_list([array.box(number) for number in values])
+
+        return Cons.from_list([nested_list(row) for row in values])
+
+    return nested_list(array.value)
+
+
+@define_built_in('array?')
+def is_array(arguments):
+    check_argument_number('array?', arguments, 1, 1)
+
+    if isinstance(arguments[0], Array):
+        return Boolean(True)
+
+    return Boolean(False)
+
+
+@define_built_in('array-rank')
+def array_rank(arguments):
+    check_argument_number('array-rank', arguments, 1, 1)
+    check_array('array-rank', arguments[0])
+
+    return Integer(arguments[0].value.ndim)
+
+
+@define_built_in('array-shape')
+def array_shape(arguments):
+    check_argument_number('array-shape', arguments, 1, 1)
+    check_array('array-shape', arguments[0])
+
+    return Cons.from_list([Integer(dimension) for dimension in arguments[0].value.shape])
+
+
+@define_built_in('array-dimension')
+def array_dimension(arguments):
+    check_argument_number('array-dimension', arguments, 2, 2)
+
+    array = arguments[0]
+    check_array('array-dimension', array)
+
+    axis = arguments[1]
+    check_integer('array-dimension', axis)
+
+    if not 0 <= axis.value < array.value.ndim:
+        raise InvalidArgument("array-dimension: axis %d is out of range for an array of "
+                              "rank %d." % (axis.value, array.value.ndim))
+
+    return Integer(array.value.shape[axis.value])
+
+
+@define_built_in('array-ref')
+def array_ref(arguments):
+    check_argument_number('array-ref', arguments, 2)
+
+    array = arguments[0]
+    check_array('array-ref', array)
+
+    indexes = get_indexes('array-ref', array, list(arguments.tail))
+    return array.box(array.value[indexes])
+
+
+@define_built_in('array-set!')
+def array_set(arguments):
+    check_argument_number('array-set!', arguments, 3)
+
+    array = arguments[0]
+    check_array('array-set!', array)
+
+    arguments = list(arguments)
+    indexes = get_indexes('array-set!', array, arguments[1:-1])
+
+    NumericVector.check_element(array.tag, arguments[-1])
+    array.value[indexes] = arguments[-1].value
+
+    return Nil()
+
+
+@define_built_in('matrix-multiply')
+def matrix_multiply(arguments):
+    """Multiply two matrices, or a matrix and a numeric vector."""
+    check_argument_number('matrix-multiply', arguments, 2, 2)
+
+    for argument in arguments:
+        if not isinstance(argument, (Array, NumericVector)):
+            raise SchemeTypeError("matrix-multiply requires arrays or numeric vectors, "
+                                  "you gave me %s." % argument.get_external_representation())
+
+    if not isinstance(arguments[0], Array) and not isinstance(arguments[1], Array):
+        raise SchemeTypeError("matrix-multiply requires at least one array.")
+
+    (first, second) = (arguments[0].value, arguments[1].value)
+
+    try:
+        if is_integer_operand(first) and is_integer_operand(second):
+            # each element of the result sums the products along a row
+            bound = magnitude(first.ravel()) * magnitude(second.ravel()) * first.shape[-1]
+            result = numpy.matmul(*widen([first, second], bound))
+
+            if result.ndim == 0:
+                return box_scalar(result[()])
+
+            return wrap_result(narrow('matrix-multiply', result, 's64'))
+
+        return wrap_result(numpy.matmul(first, second))
+    except ValueError:
+        raise InvalidArgument("matrix-multiply: can't multiply arrays of shape %s and %s."
+                              % (arguments[0].value.shape, arguments[1].value.shape))
+
+
+@define_built_in('transpose')
+def transpose(arguments):
+    """Return a transposed view of an array, sharing its storage."""
+    check_argument_number('transpose', arguments, 1, 1)
+    check_array('transpose', arguments[0])
+
+    return Array(arguments[0].tag, arguments[0].value.T)
+
+
+def get_slice_index(function_name, array, index, axis):
+    check_integer(function_name, index)
+
+    if not 0 <= index.value < array.value.shape[axis]:
+        raise InvalidArgument("%s: index %d is out of range for a dimension of %d."
+                              % (function_name, index.value, array.value.shape[axis]))
+
+    return index.value
+
+
+@define_built_in('array-row')
+def array_row(arguments):
+    """Return a view of row i of an array, sharing its storage."""
+    check_argument_number('array-row', arguments, 2, 2)
+
+    array = arguments[0]
+    check_array('array-row', array)
+    index = get_slice_index('array-row', array, arguments[1], 0)
+
+    return wrap_result(array.value[index])
+
+
+@define_built_in('array-column')
+def array_column(arguments):
+    """Return a view of column j of an array, sharing its storage."""
+    check_argument_number('array-column', arguments, 2, 2)
+
+    array = arguments[0]
+    check_array('array-column', array)
+    index = get_slice_index('array-column', array, arguments[1], 1)
+
+    return wrap_result(array.value[:, index])
+
+
+def define_array_reduction(function_name, reduction, bound=None):
+    """(function_name array [axis]) reduces the whole array to a number,
+    or reduces along axis.
+
+    If the reduction of integers can overflow, bound gives the largest
+    magnitude of its result, given the largest magnitude of an element
+    and the number of elements reduced.
+
+    """
+    @define_built_in(function_name)
+    def reduce_array(arguments):
+        check_argument_number(function_name, arguments, 1, 2)
+
+        array = arguments[0]
+        check_array(function_name, array)
+
+        if not array.value.size:
+            raise InvalidArgument("%s requires a non-empty array." % function_name)
+
+        values = array.value
+        is_exact = bound is not None and is_integer_operand(values)
+
+        if len(arguments) == 1:
+            if is_exact:
+                [values] = widen([values], bound(magnitude(values.ravel()), values.size))
+
+            return box_scalar(reduction(values))
+
+        axis = arguments[1]
+        check_integer(function_name, axis)
+
+        if not 0 <= axis.value < values.ndim:
+            raise InvalidArgument("%s: axis %d is out of range for an array of rank %d."
+                                  % (function_name, axis.value, values.ndim))
+
+        if is_exact:
+            [values] = widen([values], bound(magnitude(values.ravel()),
+                                             values.shape[axis.value]))
+            return wrap_result(narrow(function_name, reduction(values, axis=axis.value), 's64'))
+
+        return wrap_result(reduction(values, axis=axis.value))
+
+
+define_array_reduction('array-sum', numpy.sum, lambda largest, count: largest * count)
+define_array_reduction('array-min', numpy.min)
+define_array_reduction('array-max', numpy.max)
@@ -1,13 +1,33 @@
 built_ins = {}
 
+# Built-ins that call Scheme functions (such as map) need the current
+# environment, so they are called with it as a second argument.
+built_ins_using_environment = set()
+
 # a decorator for giving a name to built-in
-def define_built_in(function_name):
+def define_built_in(function_name, uses_environment=False):
     def define_built_in_decorator(function):
         built_ins[function_name] = function
 
+        if uses_environment:
+            built_ins_using_environment.add(function_name)
+
         # we return the function too, so we can use multiple decorators
         return function
 
     return define_built_in_decorator
 
 
+
+
+# Versions of built-ins that work on raw Python values, used when the
+# evaluator is running unboxed (see immediates.py). They take a Python
+# list of arguments, which may be raw or boxed, and return a raw value.
+unboxed_built_ins = {}
+
+def define_unboxed_built_in(function_name):
+    def define_unboxed_built_in_decorator(function):
+        unboxed_built_ins[function_name] = function
+        return function
+
+    return define_unboxed_built_in_decorator
@@ -0,0 +1,158 @@
+"""Bitsets: sets of non-negative integers, stored as the bits of a
+Python int. Union, intersection and difference are single bitwise
+operations, and counting the members is a population count, so they
+take microseconds even for sets with 100,000 members.
+
+"""
+from functools import reduce
+
+from .base import define_built_in
+from ..utils import check_argument_number
+from ..data_types import Bitset, Boolean, Integer, Cons, Nil
+from ..errors import SchemeTypeError, InvalidArgument
+
+
+def check_bitset(function_name, value):
+    if not isinstance(value, Bitset):
+        raise SchemeTypeError("%s requires a bitset, you gave me %s."
+                              % (function_name, value.get_external_representation()))
+
+
+def check_member(function_name, value):
+    if not isinstance(value, Integer):
+        raise SchemeTypeError("%s requires an integer, you gave me %s."
+                              % (function_name, value.get_external_representation()))
+
+    if value.value < 0:
+        raise InvalidArgument("%s requires a non-negative integer, you gave me %d."
+                              % (function_name, value.value))
+
+
+def bits_of_members(function_name, members):
+    bits = 0
+
+    for member in members:
+        check_member(function_name, member)
+        bits |= 1 << member.value
+
+    return bits
+
+
+@define_built_in('make-bitset')
+def make_bitset(arguments):
+    check_argument_number('make-bitset', arguments, 0, 0)
+
+    return Bitset()
+
+
+@define_built_in('bitset')
+def bitset(arguments):
+    return Bitset(bits_of_members('bitset', arguments))
+
+
+@define_built_in('list->bitset')
+def list_to_bitset(arguments):
+    check_argument_number('list->bitset', arguments, 1, 1)
+
+    members = arguments[0]
+    if not isinstance(members, (Cons, Nil)):
+        raise SchemeTypeError("list->bitset requires a list, you gave me %s."
+                              % members.get_external_representation())
+
+    return Bitset(bits_of_members('list->bitset', members))
+
+
+@define_built_in('bitset->list')
+def bitset_to_list(arguments):
+    check_argument_number('bitset->list', arguments, 1, 1)
+    check_bitset('bitset->list', arguments[0])
+
+    return Cons.from_list([Integer(member) for member in arguments[0].members()])
+
+
+@define_built_in('integer->bitset')
+def integer_to_bitset(arguments):
+    """The bitset whose members are the positions of the 1 bits in a
+    non-negative integer.
+
+    """
+    check_argument_number('integer->bitset', arguments, 1, 1)
+    check_member('integer->bitset', arguments[0])
+
+    return Bitset(arguments[0].value)
+
+
+@define_built_in('bitset->integer')
+def bitset_to_integer(arguments):
+    check_argument_number('bitset->integer', arguments, 1, 1)
+    check_bitset('bitset->integer', arguments[0])
+
+    return Integer(arguments[0].value)
+
+
+@define_built_in('bitset?')
+def is_bitset(arguments):
+    check_argument_number('bitset?', arguments, 1, 1)
+
+    return Boolean(isinstance(arguments[0], Bitset))
+
+
+@define_built_in('bitset-contains?')
+def bitset_contains(arguments):
+    check_argument_number('bitset-contains?', arguments, 2, 2)
+    check_bitset('bitset-contains?', arguments[0])
+    check_member('bitset-contains?', arguments[1])
+
+    return Boolean(bool((arguments[0].value >> arguments[1].value) & 1))
+
+
+@define_built_in('bitset-add!')
+def bitset_add(arguments):
+    check_argument_number('bitset-add!', arguments, 2, 2)
+    check_bitset('bitset-add!', arguments[0])
+    check_member('bitset-add!', arguments[1])
+
+    arguments[0].value |= 1 << arguments[1].value
+    return Nil()
+
+
+@define_built_in('bitset-remove!')
+def bitset_remove(arguments):
+    check_argument_number('bitset-remove!', arguments, 2, 2)
+    check_bitset('bitset-remove!', arguments[0])
+    check_member('bitset-remove!', arguments[1])
+
+    arguments[0].value &= ~(1 << arguments[1].value)
+    return Nil()
+
+
+def define_set_operation(function_name, operation):
+    @define_built_in(function_name)
+    def set_operation(arguments):
+        check_argument_number(function_name, arguments, 1)
+
+        for argument in arguments:
+            check_bitset(function_name, argument)
+
+        return Bitset(reduce(operation, [argument.value for argument in arguments]))
+
+
+define_set_operation('bitset-union', lambda x, y: x | y)
+define_set_operation('bitset-intersection', lambda x, y: x & y)
+define_set_operation('bitset-difference', lambda x, y: x & ~y)
+
+
+@define_built_in('bitset-count')
+def bitset_count(arguments):
+    check_argument_number('bitset-count', arguments, 1, 1)
+    check_bitset('bitset-count', arguments[0])
+
+    return Integer(len(arguments[0]))
+
+
+@define_built_in('bitset-empty?')
+def bitset_empty(arguments):
+    check_argument_number('bitset-empty?', arguments, 1, 1)
+    check_bitset('bitset-empty?', arguments[0])
+
+    return Boolean(arguments[0].value == 0)
@@ -0,0 +1,240 @@
+"""Bytevectors, as in R7RS, plus zero-copy slices and loading files
+with mmap.
+
+"""
+import mmap
+
+from .base import define_built_in
+from ..utils import check_argument_number
+from ..data_types import Bytevector, Boolean, Integer, String, Nil
+from ..errors import SchemeTypeError, InvalidArgument
+
+
+def check_bytevector(function_name, bytevector):
+    if not isinstance(bytevector, Bytevector):
+        raise SchemeTypeError("%s requires a bytevector, "
+                              "you gave me a %s." % (function_name, bytevector.__class__))
+
+
+def check_byte(function_name, byte):
+    if not isinstance(byte, Integer) or not 0 <= byte.value <= 255:
+        raise SchemeTypeError("%s requires a byte (an integer from 0 to 255), "
+                              "you gave me %s." % (function_name,
+                                                   byte.get_external_representation()))
+
+
+def check_index(function_name, bytevector, index):
+    if not isinstance(index, Integer):
+        raise SchemeTypeError("%s requires an integer index, "
+                              "you gave me a %s." % (function_name, index.__class__))
+
+    if not 0 <= index.value < len(bytevector):
+        raise InvalidArgument("%s: index %d is out of range for a bytevector of length %d."
+                              % (function_name, index.value, len(bytevector)))
+
+
+def get_range(function_name, bytevector, arguments):
+    """Return the (start, end) given in arguments, defaulting to the
+    whole bytevector, and check they are valid indexes.
+
+    """
+    start = 0
+    end = len(bytevector)
+
+    if arguments:
+        if not isinstance(arguments[0], Integer):
+            raise SchemeTypeError("%s requires an integer start index, "
+                                  "you gave me a %s." % (function_name, arguments[0].__class__))
+        start = arguments[0].value
+
+    if len(arguments) > 1:
+        if not isinstance(arguments[1], Integer):
+            raise SchemeTypeError("%s requires an integer end index, "
+                                  "you gave me a %s." % (function_name, arguments[1].__class__))
+        end = arguments[1].value
+
+    if not 0 <= start <= end <= len(bytevector):
+        raise InvalidArgument("%s: invalid range %d to %d for a bytevector of length %d."
+                              % (function_name, start, end, len(bytevector)))
+
+    return (start, end)
+
+
+@define_built_in('bytevector?')
+def is_bytevector(arguments):
+    check_argument_number('bytevector?', arguments, 1, 1)
+
+    if isinstance(arguments[0], Bytevector):
+        return Boolean(True)
+
+    return Boolean(False)
+
+
+@define_built_in('make-bytevector')
+def make_bytevector(arguments):
+    check_argument_number('make-bytevector', arguments, 1, 2)
+
+    length = arguments[0]
+    if not isinstance(length, Integer) or length.value < 0:
+        raise SchemeTypeError("make-bytevector requires a non-negative integer length, "
+                              "you gave me %s." % length.get_external_representation())
+
+    fill = 0
+    if len(arguments) == 2:
+        check_byte('make-bytevector', arguments[1])
+        fill = arguments[1].value
+
+    return Bytevector(bytearray([fill]) * length.value)
+
+
+@define_built_in('bytevector')
+def bytevector(arguments):
+    for byte in arguments:
+        check_byte('bytevector', byte)
+
+    return Bytevector(bytearray(byte.value for byte in arguments))
+
+
+@define_built_in('bytevector-length')
+def bytevector_length(arguments):
+    check_argument_number('bytevector-length', arguments, 1, 1)
+    check_bytevector('bytevector-length', arguments[0])
+
+    return Integer(len(arguments[0]))
+
+
+@define_built_in('bytevector-u8-ref')
+def bytevector_u8_ref(arguments):
+    check_argument_number('bytevector-u8-ref', arguments, 2, 2)
+    check_bytevector('bytevector-u8-ref', arguments[0])
+    check_index('bytevector-u8-ref', arguments[0], arguments[1])
+
+    return arguments[0][arguments[1].value]
+
+
+@define_built_in('bytevector-u8-set!')
+def bytevector_u8_set(arguments):
+    check_argument_number('bytevector-u8-set!', arguments, 3, 3)
+    check_bytevector('bytevector-u8-set!', arguments[0])
+    check_index('bytevector-u8-set!', arguments[0], arguments[1])
+    check_byte('bytevector-u8-set!', arguments[2])
+
+    arguments[0][arguments[1].value] = arguments[2]
+    return Nil()
+
+
+@define_built_in('bytevector-copy')
+def bytevector_copy(arguments):
+    check_argument_number('bytevector-copy', arguments, 1, 3)
+
+    bytevector = arguments[0]
+    check_bytevector('bytevector-copy', bytevector)
+    (start, end) = get_range('bytevector-copy', bytevector, list(arguments.tail))
+
+    return Bytevector(bytearray(memoryview(bytevector.value)[start:end]))
+
+
+@define_built_in('bytevector-copy!')
+def bytevector_copy_in_place(arguments):
+    """(bytevector-copy! to at from [start [end]]) copies bytes from
+    from into to, starting at index at.
+
+    """
+    check_argument_number('bytevector-copy!', arguments, 3, 5)
+
+    arguments = list(arguments)
+    (target, at, source) = arguments[:3]
+
+    check_bytevector('bytevector-copy!', target)
+    check_bytevector('bytevector-copy!', source)
+    (start, end) = get_range('bytevector-copy!', source, arguments[3:])
+
+    if not isinstance(at, Integer) or not 0 <= at.value <= len(target) - (end - start):
+        raise InvalidArgument("bytevector-copy!: %d bytes don't fit at index %s."
+                              % (end - start, at.get_external_representation()))
+
+    # memoryview slice assignment handles overlapping ranges correctly
+    memoryview(target.value)[at.value:at.value + end - start] = \
+        bytes(memoryview(source.value)[start:end])
+
+    return Nil()
+
+
+@define_built_in('bytevector-append')
+def bytevector_append(arguments):
+    result = bytearray()
+
+    for bytevector in arguments:
+        check_bytevector('bytevector-append', bytevector)
+        result += memoryview(bytevector.value)
+
+    return Bytevector(result)
+
+
+@define_built_in('bytevector-slice')
+def bytevector_slice(arguments):
+    """(bytevector-slice bytevector start end) returns a bytevector that
+    shares storage with bytevector, without copying.
+
+    """
+    check_argument_number('bytevector-slice', arguments, 3, 3)
+
+    bytevector = arguments[0]
+    check_bytevector('bytevector-slice', bytevector)
+    (start, end) = get_range('bytevector-slice', bytevector, list(arguments.tail))
+
+    return Bytevector(memoryview(bytevector.value)[start:end])
+
+
+@define_built_in('utf8->string')
+def utf8_to_string(arguments):
+    check_argument_number('utf8->string', arguments, 1, 3)
+
+    bytevector = arguments[0]
+    check_bytevector('utf8->string', bytevector)
+    (start, end) = get_range('utf8->string', bytevector, list(arguments.tail))
+
+    try:
+        return String(str(memoryview(bytevector.value)[start:end], 'utf-8'))
+    except UnicodeDecodeError as e:
+        raise InvalidArgument("utf8->string: bytevector isn't valid UTF-8 (%s)." % e.reason)
+
+
+@define_built_in('string->utf8')
+def string_to_utf8(arguments):
+    check_argument_number('string->utf8', arguments, 1, 1)
+
+    string = arguments[0]
+    if not isinstance(string, String):
+        raise SchemeTypeError("string->utf8 requires a string, "
+                              "you gave me a %s." % string.__class__)
+
+    return Bytevector(bytearray(string.value.encode('utf-8')))
+
+
+@define_built_in('file->bytevector')
+def file_to_bytevector(arguments):
+    """Load a file as a bytevector. We memory-map the file rather than
+    reading it, so only the pages that are used are loaded. Changes to
+    the bytevector aren't written back to the file.
+
+    """
+    check_argument_number('file->bytevector', arguments, 1, 1)
+
+    path = arguments[0]
+    if not isinstance(path, String):
+        raise SchemeTypeError("file->bytevector requires a string path, "
+                              "you gave me a %s." % path.__class__)
+
+    try:
+        with open(path.value, 'rb') as binary_file:
+            try:
+                # the mapping stays valid after the file is closed
+                return Bytevector(mmap.mmap(binary_file.fileno(), 0,
+                                            access=mmap.ACCESS_COPY))
+            except ValueError:
+                # we can't map an empty file
+                return Bytevector(bytearray())
+    except OSError as e:
+        raise InvalidArgument("file->bytevector: can't open %s (%s)." % (path.value,
+                                                                         e.strerror))
@@ -0,0 +1,420 @@
+"""Mutable containers for algorithms that need queues and heaps:
+
+* deques, with O(1) pushes and pops at both ends
+* gvectors (growable vectors), with amortized O(1) appends
+* priority queues, with O(log n) pushes and pops
+
+Each has conversions to and from lists and vectors.
+
+"""
+import heapq
+
+from .base import define_built_in
+from ..utils import (check_argument_number, check_procedure, check_type, check_list,
+                     check_vector)
+from ..data_types import (Deque, GrowableVector, PriorityQueue, Vector, Cons, Nil, Boolean,
+                          Integer, Number, String, Character)
+from ..errors import SchemeTypeError, InvalidArgument
+from ..evaluator import apply_function
+
+
+def check_not_empty(function_name, container, type_name):
+    if not len(container):
+        raise InvalidArgument("%s requires a non-empty %s." % (function_name, type_name))
+
+
+def list_items(function_name, list_given):
+    """Return the items of a proper list as a Python list."""
+    check_list(function_name, list_given)
+
+    return list(list_given)
+
+
+def vector_items(function_name, vector):
+    """Return the items of a vector as a Python list."""
+    check_vector(function_name, vector)
+
+    return list(vector.value)
+
+
+# deques
+
+@define_built_in('make-deque')
+def make_deque(arguments):
+    check_argument_number('make-deque', arguments, 0, 0)
+
+    return Deque()
+
+
+@define_built_in('deque')
+def deque(arguments):
+    return Deque(arguments)
+
+
+@define_built_in('list->deque')
+def list_to_deque(arguments):
+    check_argument_number('list->deque', arguments, 1, 1)
+
+    return Deque(list_items('list->deque', arguments[0]))
+
+
+@define_built_in('vector->deque')
+def vector_to_deque(arguments):
+    check_argument_number('vector->deque', arguments, 1, 1)
+
+    return Deque(vector_items('vector->deque', arguments[0]))
+
+
+@define_built_in('deque?')
+def is_deque(arguments):
+    check_argument_number('deque?', arguments, 1, 1)
+
+    return Boolean(isinstance(arguments[0], Deque))
+
+
+@define_built_in('deque-length')
+def deque_length(arguments):
+    check_argument_number('deque-length', arguments, 1, 1)
+    check_type('deque-length', arguments[0], Deque, 'deque')
+
+    return Integer(len(arguments[0]))
+
+
+@define_built_in('deque-empty?')
+def is_deque_empty(arguments):
+    check_argument_number('deque-empty?', arguments, 1, 1)
+    check_type('deque-empty?', arguments[0], Deque, 'deque')
+
+    return Boolean(not arguments[0].value)
+
+
+@define_built_in('deque-push-front!')
+def deque_push_front(arguments):
+    check_argument_number('deque-push-front!', arguments, 2, 2)
+    check_type('deque-push-front!', arguments[0], Deque, 'deque')
+
+    arguments[0].value.appendleft(arguments[1])
+    return Nil()
+
+
+@define_built_in('deque-push-back!')
+def deque_push_back(arguments):
+    check_argument_number('deque-push-back!', arguments, 2, 2)
+    check_type('deque-push-back!', arguments[0], Deque, 'deque')
+
+    arguments[0].value.append(arguments[1])
+    return Nil()
+
+
+@define_built_in('deque-pop-front!')
+def deque_pop_front(arguments):
+    check_argument_number('deque-pop-front!', arguments, 1, 1)
+    check_type('deque-pop-front!', arguments[0], Deque, 'deque')
+    check_not_empty('deque-pop-front!', arguments[0], 'deque')
+
+    return arguments[0].value.popleft()
+
+
+@define_built_in('deque-pop-back!')
+def deque_pop_back(arguments):
+    check_argument_number('deque-pop-back!', arguments, 1, 1)
+    check_type('deque-pop-back!', arguments[0], Deque, 'deque')
+    check_not_empty('deque-pop-back!', arguments[0], 'deque')
+
+    return arguments[0].value.pop()
+
+
+@define_built_in('deque-front')
+def deque_front(arguments):
+    check_argument_number('deque-front', arguments, 1, 1)
+    check_type('deque-front', arguments[0], Deque, 'deque')
+    check_not_empty('deque-front', arguments[0], 'deque')
+
+    return arguments[0].value[0]
+
+
+@define_built_in('deque-back')
+def deque_back(arguments):
+    check_argument_number('deque-back', arguments, 1, 1)
+    check_type('deque-back', arguments[0], Deque, 'deque')
+    check_not_empty('deque-back', arguments[0], 'deque')
+
+    return arguments[0].value[-1]
+
+
+@define_built_in('deque->list')
+def deque_to_list(arguments):
+    check_argument_number('deque->list', arguments, 1, 1)
+    check_type('deque->list', arguments[0], Deque, 'deque')
+
+    return Cons.from_list(list(arguments[0].value))
+
+
+@define_built_in('deque->vector')
+def deque_to_vector(arguments):
+    check_argument_number('deque->vector', arguments, 1, 1)
+    check_type('deque->vector', arguments[0], Deque, 'deque')
+
+    return Vector.from_list(list(arguments[0].value))
+
+
+# growable vectors
+
+@define_built_in('make-gvector')
+def make_gvector(arguments):
+    check_argument_number('make-gvector', arguments, 0, 0)
+
+    return GrowableVector()
+
+
+@define_built_in('gvector')
+def gvector(arguments):
+    return GrowableVector(arguments)
+
+
+@define_built_in('list->gvector')
+def list_to_gvector(arguments):
+    check_argument_number('list->gvector', arguments, 1, 1)
+
+    return GrowableVector(list_items('list->gvector', arguments[0]))
+
+
+@define_built_in('vector->gvector')
+def vector_to_gvector(arguments):
+    check_argument_number('vector->gvector', arguments, 1, 1)
+
+    return GrowableVector(vector_items('vector->gvector', arguments[0]))
+
+
+@define_built_in('gvector?')
+def is_gvector(arguments):
+    check_argument_number('gvector?', arguments, 1, 1)
+
+    return Boolean(isinstance(arguments[0], GrowableVector))
+
+
+def check_gvector_index(function_name, gvector, index):
+    if not isinstance(index, Integer):
+        raise SchemeTypeError("%s requires an integer index, "
+                              "you gave me %s." % (function_name,
+                                                   index.get_external_representation()))
+
+    if not 0 <= index.value < len(gvector):
+        raise InvalidArgument("%s: index %d is out of range for a gvector of length %d."
+                              % (function_name, index.value, len(gvector)))
+
+
+@define_built_in('gvector-ref')
+def gvector_ref(arguments):
+    check_argument_number('gvector-ref', arguments, 2, 2)
+    check_type('gvector-ref', arguments[0], GrowableVector, 'gvector')
+    check_gvector_index('gvector-ref', arguments[0], arguments[1])
+
+    return arguments[0].value[arguments[1].value]
+
+
+@define_built_in('gvector-set!')
+def gvector_set(arguments):
+    check_argument_number('gvector-set!', arguments, 3, 3)
+    check_type('gvector-set!', arguments[0], GrowableVector, 'gvector')
+    check_gvector_index('gvector-set!', arguments[0], arguments[1])
+
+    arguments[0].value[arguments[1].value] = arguments[2]
+    return Nil()
+
+
+@define_built_in('gvector-add!')
+def gvector_add(arguments):
+    """(gvector-add! gvector item ...) appends the items."""
+    check_argument_number('gvector-add!', arguments, 1)
+    check_type('gvector-add!', arguments[0], GrowableVector, 'gvector')
+
+    arguments[0].value.extend(arguments.tail)
+    return Nil()
+
+
+@define_built_in('gvector-remove-last!')
+def gvector_remove_last(arguments):
+    check_argument_number('gvector-remove-last!', arguments, 1, 1)
+    check_type('gvector-remove-last!', arguments[0], GrowableVector, 'gvector')
+    check_not_empty('gvector-remove-last!', arguments[0], 'gvector')
+
+    return arguments[0].value.pop()
+
+
+@define_built_in('gvector-count')
+def gvector_count(arguments):
+    check_argument_number('gvector-count', arguments, 1, 1)
+    check_type('gvector-count', arguments[0], GrowableVector, 'gvector')
+
+    return Integer(len(arguments[0]))
+
+
+@define_built_in('gvector->list')
+def gvector_to_list(arguments):
+    check_argument_number('gvector->list', arguments, 1, 1)
+    check_type('gvector->list', arguments[0], GrowableVector, 'gvector')
+
+    return Cons.from_list(list(arguments[0].value))
+
+
+@define_built_in('gvector->vector')
+def gvector_to_vector(arguments):
+    check_argument_number('gvector->vector', arguments, 1, 1)
+    check_type('gvector->vector', arguments[0], GrowableVector, 'gvector')
+
+    return Vector.from_list(list(arguments[0].value))
+
+
+# priority queues
+
+def priority(function_name, queue, item, environment):
+    """Return the Python value that orders item in queue."""
+    key = item
+    if queue.key is not None:
+        key = apply_function(queue.key, [item], environment)
+
+    if not isinstance(key, (Number, String, Character)):
+        raise SchemeTypeError("%s: priorities must be numbers, strings or characters, "
+                              "not %s." % (function_name, key.get_external_representation()))
+
+    return key.value
+
+
+def push_items(function_name, queue, items, environment):
+    for item in items:
+        entry = (priority(function_name, queue, item, environment), queue.insertions, item)
+
+        # heappush leaves the heap broken if a comparison fails, so we
+        # check first. The priorities in the queue are all comparable
+        # with each other, so comparing with one of them is enough.
+        if queue.value:
+            try:
+                entry < queue.value[0]
+            except TypeError:
+                raise SchemeTypeError("%s: can't compare the priority of %s with the others "
+                                      "in the queue." % (function_name,
+                                                         item.get_external_representation()))
+
+        queue.insertions += 1
+        heapq.heappush(queue.value, entry)
+
+
+def make_queue(function_name, arguments):
+    """Make an empty queue using the optional key procedure in arguments."""
+    if not arguments:
+        return PriorityQueue()
+
+    check_procedure(function_name, arguments[0])
+    return PriorityQueue(arguments[0])
+
+
+@define_built_in('make-priority-queue')
+def make_priority_queue(arguments):
+    """(make-priority-queue [key]) makes an empty queue, where pop!
+    returns the item with the smallest (key item).
+
+    """
+    check_argument_number('make-priority-queue', arguments, 0, 1)
+
+    return make_queue('make-priority-queue', list(arguments))
+
+
+def items_to_queue(function_name, items, arguments, environment):
+    """Make a queue of items, using the optional key procedure after the
+    sequence in arguments.
+
+    """
+    queue = make_queue(function_name, list(arguments.tail))
+    push_items(function_name, queue, items, environment)
+
+    return queue
+
+
+@define_built_in('list->priority-queue', uses_environment=True)
+def list_to_priority_queue(arguments, environment):
+    check_argument_number('list->priority-queue', arguments, 1, 2)
+
+    return items_to_queue('list->priority-queue',
+                          list_items('list->priority-queue', arguments[0]),
+                          arguments, environment)
+
+
+@define_built_in('vector->priority-queue', uses_environment=True)
+def vector_to_priority_queue(arguments, environment):
+    check_argument_number('vector->priority-queue', arguments, 1, 2)
+
+    return items_to_queue('vector->priority-queue',
+                          vector_items('vector->priority-queue', arguments[0]),
+                          arguments, environment)
+
+
+@define_built_in('priority-queue?')
+def is_priority_queue(arguments):
+    check_argument_number('priority-queue?', arguments, 1, 1)
+
+    return Boolean(isinstance(arguments[0], PriorityQueue))
+
+
+@define_built_in('priority-queue-length')
+def priority_queue_length(arguments):
+    check_argument_number('priority-queue-length', arguments, 1, 1)
+    check_type('priority-queue-length', arguments[0], PriorityQueue, 'priority queue')
+
+    return Integer(len(arguments[0]))
+
+
+@define_built_in('priority-queue-empty?')
+def is_priority_queue_empty(arguments):
+    check_argument_number('priority-queue-empty?', arguments, 1, 1)
+    check_type('priority-queue-empty?', arguments[0], PriorityQueue, 'priority queue')
+
+    return Boolean(not arguments[0].value)
+
+
+@define_built_in('priority-queue-push!', uses_environment=True)
+def priority_queue_push(arguments, environment):
+    """(priority-queue-push! queue item ...)"""
+    check_argument_number('priority-queue-push!', arguments, 1)
+    check_type('priority-queue-push!', arguments[0], PriorityQueue, 'priority queue')
+
+    push_items('priority-queue-push!', arguments[0], arguments.tail, environment)
+    return Nil()
+
+
+@define_built_in('priority-queue-peek')
+def priority_queue_peek(arguments):
+    check_argument_number('priority-queue-peek', arguments, 1, 1)
+    check_type('priority-queue-peek', arguments[0], PriorityQueue, 'priority queue')
+    check_not_empty('priority-queue-peek', arguments[0], 'priority queue')
+
+    return arguments[0].value[0][2]
+
+
+@define_built_in('priority-queue-pop!')
+def priority_queue_pop(arguments):
+    check_argument_number('priority-queue-pop!', arguments, 1, 1)
+    check_type('priority-queue-pop!', arguments[0], PriorityQueue, 'priority queue')
+    check_not_empty('priority-queue-pop!', arguments[0], 'priority queue')
+
+    return heapq.heappop(arguments[0].value)[2]
+
+
+@define_built_in('priority-queue->list')
+def priority_queue_to_list(arguments):
+    """Return the items in the order they would be popped, without
+    changing the queue.
+
+    """
+    check_argument_number('priority-queue->list', arguments, 1, 1)
+    check_type('priority-queue->list', arguments[0], PriorityQueue, 'priority queue')
+
+    return Cons.from_list([item for (_, _, item) in sorted(arguments[0].value)])
+
+
+@define_built_in('priority-queue->vector')
+def priority_queue_to_vector(arguments):
+    check_argument_number('priority-queue->vector', arguments, 1, 1)
+    check_type('priority-queue->vector', arguments[0], PriorityQueue, 'priority queue')
+
+    return Vector.from_list([item for (_, _, item) in sorted(arguments[0].value)])
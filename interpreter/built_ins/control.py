@@ -1,6 +1,7 @@
 from .base import define_built_in
-from ..utils import check_argument_number
-from ..data_types import Boolean
+from ..utils import check_argument_number, check_procedure
+from ..data_types import Boolean, Cons, Nil
+from ..evaluator import apply_function
 
 
 @define_built_in('procedure?')
@@ -11,3 +12,40 @@ def is_procedure(arguments):
         return Boolean(True)
 
     return Boolean(False)
+
+
+@define_built_in('map', uses_environment=True)
+def map_function(arguments, environment):
+    check_argument_number('map', arguments, 2)
+
+    function = arguments[0]
+    check_procedure('map', function)
+
+    # we stop at the end of the shortest list
+    lists = list(arguments.tail)
+    results = []
+
+    while all(isinstance(list_given, Cons) for list_given in lists):
+        results.append(apply_function(function,
+                                      [list_given.head for list_given in lists],
+                                      environment))
+        lists = [list_given.tail for list_given in lists]
+
+    return Cons.from_list(results)
+
+
+@define_built_in('for-each', uses_environment=True)
+def for_each(arguments, environment):
+    check_argument_number('for-each', arguments, 2)
+
+    function = arguments[0]
+    check_procedure('for-each', function)
+
+    lists = list(arguments.tail)
+
+    while all(isinstance(list_given, Cons) for list_given in lists):
+        apply_function(function, [list_given.head for list_given in lists],
+                       environment)
+        lists = [list_given.tail for list_given in lists]
+
+    return Nil()
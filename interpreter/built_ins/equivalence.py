@@ -1,8 +1,246 @@
-from .base import define_built_in
+from .base import define_built_in, define_unboxed_built_in
 from ..utils import check_argument_number
 
-from ..data_types import (Cons, Atom, Boolean, Number)
+from ..data_types import (Cons, Nil, Atom, Symbol, Boolean, Number, Integer, String, Vector,
+                          NumericVector, Array, Bytevector, PersistentMap, PersistentSet,
+                          PersistentVector)
 from ..errors import SchemeTypeError
+from ..immediates import box, UNBOXED_TYPES
+
+
+def is_eqv(first, second):
+    # symbols are interned, so identical values are always eqv?
+    if first is second:
+        return True
+
+    if isinstance(first, (Cons, Symbol)):
+        return False
+
+    # __eq__ is defined on Atom and Nil
+    # todo: test vectors
+    return first == second
+
+
+# how many pairs of lists or vectors is_equal compares before it starts
+# checking for cycles
+FAST_PATH_COMPARISONS = 1000
+
+# how many lists or vectors equal_hash visits; past this it ignores
+# the rest of the structure, which also stops it looping on cycles
+MAX_HASHED_NODES = 10000
+
+
+def vector_children(first, second):
+    """If first and second are both vectors, return their pairs of
+    items to compare. Return None if they aren't vectors, and False if
+    they can't be equal.
+
+    """
+    if isinstance(first, Vector):
+        if not isinstance(second, Vector) or len(first.value) != len(second.value):
+            return False
+
+        return list(zip(first.value, second.value))
+
+    if isinstance(first, PersistentVector):
+        if not isinstance(second, PersistentVector) or len(first) != len(second):
+            return False
+
+        return list(zip(first.value, second.value))
+
+    return None
+
+
+def is_equal(first, second):
+    """Compare two values structurally, as equal? does. We use an
+    explicit stack, so deeply nested structures don't overflow the
+    Python stack.
+
+    Cyclic structures are compared with the union-find algorithm of
+    Adams and Dybvig: once we start comparing two lists or vectors we
+    assume they're equal, so meeting them again ends that branch. Most
+    comparisons are small and acyclic, so we only start doing this
+    after FAST_PATH_COMPARISONS comparisons.
+
+    """
+    # parent links for the union-find forest, keyed by id
+    parents = {}
+
+    def find(value):
+        root = id(value)
+        while parents.get(root, root) != root:
+            root = parents[root]
+
+        # path compression
+        node = id(value)
+        while node != root:
+            (node, parents[node]) = (parents[node], root)
+
+        return root
+
+    pending = [(first, second)]
+    comparisons = 0
+
+    while pending:
+        (first, second) = pending.pop()
+
+        if first is second:
+            continue
+
+        # atoms are the commonest case, and are quick to check
+        if isinstance(first, Atom):
+            if not first == second:
+                return False
+
+            continue
+
+        if isinstance(first, Cons):
+            if not isinstance(second, Cons):
+                return False
+
+            children = None
+        else:
+            children = vector_children(first, second)
+
+            if children is False:
+                return False
+            elif children is None:
+                if not first == second:
+                    return False
+
+                continue
+
+        comparisons += 1
+        if comparisons > FAST_PATH_COMPARISONS:
+            (first_root, second_root) = (find(first), find(second))
+
+            if first_root == second_root:
+                # we've already assumed these are equal
+                continue
+
+            parents[first_root] = second_root
+
+        if children is None:
+            # compare heads before tails
+            pending.append((first.tail, second.tail))
+            pending.append((first.head, second.head))
+        else:
+            pending.extend(reversed(children))
+
+    return True
+
+
+def combine_hashes(first, second):
+    return (first * 1000003 ^ second) & 0xffffffffffffffff
+
+
+def equal_hash(value):
+    """Return a hash of value that is the same for any two values that
+    are equal?. We visit at most MAX_HASHED_NODES lists and vectors,
+    so this is O(size) and terminates on cyclic structures.
+
+    """
+    result = 0
+    pending = [value]
+    nodes_visited = 0
+
+    while pending and nodes_visited < MAX_HASHED_NODES:
+        value = pending.pop()
+
+        if isinstance(value, Atom):
+            result = combine_hashes(result, hash(value))
+        elif isinstance(value, Cons):
+            nodes_visited += 1
+            result = combine_hashes(result, 1)
+            pending.append(value.tail)
+            pending.append(value.head)
+        elif isinstance(value, (Vector, PersistentVector)):
+            nodes_visited += 1
+            result = combine_hashes(result, hash((value.__class__, len(value))))
+            pending.extend(reversed(list(value.value)))
+        else:
+            result = combine_hashes(result, atomic_hash(value))
+
+    return result
+
+
+def atomic_hash(value):
+    """Hash a value that isn't a list or vector."""
+    if isinstance(value, NumericVector):
+        return hash((value.tag, tuple(value.value.tolist())))
+    elif isinstance(value, Array):
+        return hash((value.tag, value.value.shape))
+    elif isinstance(value, Bytevector):
+        return hash(bytes(memoryview(value.value)))
+    elif isinstance(value, PersistentSet):
+        # the trie is already keyed by equal_key
+        return hash(frozenset(hash_key for (hash_key, _) in value.value.items()))
+    elif isinstance(value, PersistentMap):
+        return hash(frozenset((hash_key, equal_hash(entry_value))
+                              for (hash_key, (_, entry_value)) in value.value.items()))
+
+    try:
+        return hash(value)
+    except TypeError:
+        # the value has __eq__ but no __hash__
+        return hash(value.__class__)
+
+
+class EqualKey(object):
+    """Wrap a value so it compares and hashes as equal? does, so we can
+    use it as a dict key. The hash is computed once.
+
+    """
+    __slots__ = ('value', 'hash')
+
+    def __init__(self, value):
+        self.value = value
+        self.hash = equal_hash(value)
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        return isinstance(other, EqualKey) and self.hash == other.hash and \
+            is_equal(self.value, other.value)
+
+
+def string_key(string):
+    """Strings are mutable, so we key them by a copy of their contents.
+    A table entry keeps the key it was added with, even if the string
+    is changed later.
+
+    """
+    return (String, string.value)
+
+
+def eqv_key(value):
+    """Return a hashable key for value, such that two values have equal
+    keys exactly when they are eqv?.
+
+    """
+    if isinstance(value, String):
+        return string_key(value)
+
+    if isinstance(value, (Atom, Nil)):
+        return value
+
+    # everything else is only eqv? to itself
+    return ('identity', id(value))
+
+
+def equal_key(value):
+    """Return a hashable key for value, such that two values have equal
+    keys exactly when they are equal?.
+
+    """
+    if isinstance(value, String):
+        return string_key(value)
+
+    if isinstance(value, (Atom, Nil)):
+        return value
+
+    return EqualKey(value)
 
 
 @define_built_in('eq?')
@@ -10,16 +248,54 @@ from ..errors import SchemeTypeError
 def test_equivalence(arguments):
     check_argument_number('eqv?', arguments, 2, 2)
 
-    if isinstance(arguments[0], Atom):
-        # __eq__ is defined on Atom
-        return Boolean(arguments[0] == arguments[1])
-    if isinstance(arguments[0], Cons):
-        # __eq__ on Cons is deep equality
-        return Boolean(arguments[0] is arguments[1])
-    else:
-        # __eq__ is defined on Nil
-        # todo: test vectors
-        return Boolean(arguments[0] == arguments[1])
+    return Boolean(is_eqv(arguments[0], arguments[1]))
+
+
+@define_unboxed_built_in('eq?')
+@define_unboxed_built_in('eqv?')
+def unboxed_test_equivalence(arguments):
+    check_argument_number('eqv?', arguments, 2, 2)
+
+    (first, second) = arguments
+
+    if first.__class__ is second.__class__ and first.__class__ in UNBOXED_TYPES:
+        # two raw values of the same type, e.g. (eqv? x #f) in not
+        return first == second
+
+    return is_eqv(box(first), box(second))
+
+
+@define_built_in('equal?')
+def test_equality(arguments):
+    check_argument_number('equal?', arguments, 2, 2)
+
+    return Boolean(is_equal(arguments[0], arguments[1]))
+
+
+def bounded_hash(function_name, arguments):
+    """(function_name value [bound]) returns a hash from 0 to bound - 1."""
+    check_argument_number(function_name, arguments, 1, 2)
+
+    if len(arguments) == 2:
+        bound = arguments[1]
+        if not isinstance(bound, Integer) or bound.value <= 0:
+            raise SchemeTypeError("%s requires a positive integer bound, "
+                                  "you gave me %s." % (function_name,
+                                                       bound.get_external_representation()))
+
+        return Integer(equal_hash(arguments[0]) % bound.value)
+
+    return Integer(equal_hash(arguments[0]))
+
+
+@define_built_in('equal-hash')
+def equal_hash_function(arguments):
+    return bounded_hash('equal-hash', arguments)
+
+
+@define_built_in('hash')
+def hash_function(arguments):
+    return bounded_hash('hash', arguments)
 
 
 @define_built_in('=')
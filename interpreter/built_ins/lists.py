@@ -1,6 +1,9 @@
+import itertools
+
 from .base import define_built_in
-from ..utils import check_argument_number
-from ..data_types import (Cons, Nil, Boolean)
+from ..utils import check_argument_number, check_mutable
+from ..data_types import (Cons, Nil, Boolean, Integer)
+from ..errors import SchemeTypeError
 
 
 @define_built_in('car')
@@ -28,6 +31,7 @@ def set_car(arguments):
     check_argument_number('set-car!', arguments, 2, 2)
 
     list_given = arguments[0]
+    check_mutable('set-car!', list_given)
     list_given.head = arguments[1]
 
     return Nil()
@@ -39,6 +43,7 @@ def set_cdr(arguments):
     check_argument_number('set-cdr!', arguments, 2, 2)
 
     list_given = arguments[0]
+    check_mutable('set-cdr!', list_given)
     list_given.tail = arguments[1]
 
     return Nil()
@@ -62,3 +67,76 @@ def pair(arguments):
     return Boolean(False)
 
 
+@define_built_in('null?')
+def is_null(arguments):
+    check_argument_number('null?', arguments, 1, 1)
+
+    if isinstance(arguments[0], Nil):
+        return Boolean(True)
+
+    return Boolean(False)
+
+
+@define_built_in('list?')
+def is_list(arguments):
+    check_argument_number('list?', arguments, 1, 1)
+
+    # is_proper returns False for circular lists
+    if isinstance(arguments[0], (Cons, Nil)) and arguments[0].is_proper():
+        return Boolean(True)
+
+    return Boolean(False)
+
+
+@define_built_in('list')
+def make_list(arguments):
+    # our arguments are already a newly allocated list
+    return arguments
+
+
+@define_built_in('length')
+def length(arguments):
+    check_argument_number('length', arguments, 1, 1)
+
+    list_given = arguments[0]
+
+    if not isinstance(list_given, (Cons, Nil)) or not list_given.is_proper():
+        raise SchemeTypeError("length requires a proper list, "
+                              "you gave me a %s." % list_given.__class__)
+
+    list_length = 0
+    while isinstance(list_given, Cons):
+        list_length += 1
+        list_given = list_given.tail
+
+    return Integer(list_length)
+
+
+def define_car_cdr_composition(function_name):
+    # caddr is (car (cdr (cdr x))), so we apply the letters from the right
+    operations = function_name[-2:0:-1]
+
+    @define_built_in(function_name)
+    def car_cdr_composition(arguments):
+        check_argument_number(function_name, arguments, 1, 1)
+
+        result = arguments[0]
+
+        for operation in operations:
+            if not isinstance(result, Cons):
+                raise SchemeTypeError("%s requires a list with enough elements, "
+                                      "you gave me %s." % (function_name,
+                                                           arguments[0].get_external_representation()))
+
+            if operation == 'a':
+                result = result.head
+            else:
+                result = result.tail
+
+        return result
+
+
+# caar, cadr, ... cddddr
+for composition_length in range(2, 5):
+    for letters in itertools.product('ad', repeat=composition_length):
+        define_car_cdr_composition('c%sr' % ''.join(letters))
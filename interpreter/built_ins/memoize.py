@@ -0,0 +1,170 @@
+"""Memoization: caching the results of pure functions.
+
+(memoize f) returns a function that calls f once for each distinct
+list of arguments, comparing arguments with equal?, and returns the
+cached result afterwards. An optional maximum size evicts the least
+recently used result when the cache is full, and results can be held
+weakly, so they're dropped once nothing else refers to them.
+
+The define-memoized macro in the standard library defines a function
+then memoizes it, so recursive calls are cached too.
+define-memoized/options does the same, passing a maximum size and
+weak? on to memoize.
+
+"""
+import weakref
+from collections import OrderedDict
+
+from .base import define_built_in
+from .equivalence import equal_key
+from .. import immediates
+from ..immediates import box, unbox, is_false
+from ..utils import check_argument_number
+from ..data_types import MemoizedFunction, Cons, Symbol, Integer
+from ..errors import SchemeTypeError, InvalidArgument
+from ..evaluator import eval_s_expression, apply_function
+
+
+# a cache miss, since None is a result
+MISSING = object()
+
+
+class MemoCache(object):
+    """Results keyed by equal_key of the arguments, in order from least
+    to most recently used.
+
+    """
+    def __init__(self, max_size=None, weak=False):
+        self.max_size = max_size
+        self.weak = weak
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached result for key, or MISSING."""
+        entry = self.entries.get(key, MISSING)
+
+        if isinstance(entry, weakref.ref):
+            entry = entry()
+
+            if entry is None:
+                # collected, but we haven't been told yet
+                entry = MISSING
+
+        if entry is MISSING:
+            self.misses += 1
+        else:
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+        return entry
+
+    def set(self, key, result):
+        entry = result
+
+        if self.weak:
+            try:
+                entry = weakref.ref(result, self.collected(key))
+            except TypeError:
+                # e.g. None, the unspecified value, which we hold
+                # normally
+                pass
+
+        self.entries[key] = entry
+
+        if self.max_size is not None and len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def collected(self, key):
+        """A callback removing key once its weakly held result has been
+        garbage collected.
+
+        """
+        def remove(reference):
+            if self.entries.get(key) is reference:
+                del self.entries[key]
+                self.evictions += 1
+
+        return remove
+
+
+def make_memoized_function(function, max_size=None, weak=False):
+    cache = MemoCache(max_size, weak)
+    name = getattr(function, 'name', None) or '(anonymous function)'
+
+    def memoized_function(arguments, environment):
+        values = []
+        for argument in arguments:
+            (value, environment) = eval_s_expression(argument, environment)
+            values.append(box(value))
+
+        key = tuple(equal_key(value) for value in values)
+        result = cache.get(key)
+
+        if result is MISSING:
+            result = apply_function(function, values, environment)
+            cache.set(key, result)
+
+        if immediates.unboxed:
+            return (unbox(result), environment)
+
+        return (result, environment)
+
+    return MemoizedFunction(memoized_function, name, function, cache)
+
+
+@define_built_in('memoize')
+def memoize(arguments):
+    """Syntax: (memoize <function> [<max-size> [<weak?>]])
+
+    max-size may be #f for a cache without a limit.
+
+    """
+    check_argument_number('memoize', arguments, 1, 3)
+
+    function = arguments[0]
+    if not callable(function):
+        raise SchemeTypeError("memoize requires a function, "
+                              "you gave me a %s." % function.__class__)
+
+    if isinstance(function, MemoizedFunction):
+        # wrap the original function, so a call doesn't go through two
+        # caches
+        function = function.memoized
+
+    max_size = None
+    if len(arguments) >= 2 and not is_false(arguments[1]):
+        if not isinstance(arguments[1], Integer) or arguments[1].value < 1:
+            raise InvalidArgument("memoize requires a positive integer size, "
+                                  "you gave me %s." % arguments[1].get_external_representation())
+
+        max_size = arguments[1].value
+
+    weak = len(arguments) == 3 and not is_false(arguments[2])
+
+    return make_memoized_function(function, max_size, weak)
+
+
+@define_built_in('memo-stats')
+def memo_stats(arguments):
+    """Return an association list of the hits, misses, evictions and
+    current size of a memoized function's cache.
+
+    """
+    check_argument_number('memo-stats', arguments, 1, 1)
+
+    function = arguments[0]
+    if not isinstance(function, MemoizedFunction):
+        raise SchemeTypeError("memo-stats requires a memoized function, "
+                              "you gave me a %s." % function.__class__)
+
+    cache = function.cache
+    statistics = [('hits', cache.hits), ('misses', cache.misses),
+                  ('evictions', cache.evictions), ('size', len(cache.entries))]
+
+    return Cons.from_list([Cons(Symbol(name), Integer(value))
+                           for (name, value) in statistics])
@@ -1,10 +1,98 @@
 import math
-from copy import copy
+import operator
+from fractions import Fraction
 
-from .base import define_built_in
+from .base import define_built_in, define_unboxed_built_in
 from ..utils import check_argument_number
-from ..data_types import (Boolean, Number, Integer, FloatingPoint)
-from ..errors import SchemeTypeError
+from ..data_types import (Boolean, Number, Integer, Rational, FloatingPoint,
+                          Cons, Nil)
+from ..errors import SchemeTypeError, InvalidArgument
+from ..immediates import box
+
+
+# The numeric tower, from least to most general. Combining two numbers
+# gives a result of the more general type, except that exact results
+# which are whole numbers are always integers.
+NUMBER_TYPES = (Integer, Rational, FloatingPoint)
+
+
+def make_exact(value):
+    """Wrap an int or Fraction, using Integer where we can."""
+    if value.denominator == 1:
+        return Integer(int(value))
+
+    return Rational(value)
+
+
+def make_dispatch_table(operation, exact_operation=None):
+    """Build a table mapping every pair of number types to a function
+    that applies operation to numbers of those types and wraps the
+    result. exact_operation, if given, is used on a pair of integers.
+
+    We build the table once, so arithmetic only needs a dict lookup
+    rather than a series of isinstance checks.
+
+    """
+    table = {}
+
+    for first_type in NUMBER_TYPES:
+        for second_type in NUMBER_TYPES:
+            if FloatingPoint in (first_type, second_type):
+                table[first_type, second_type] = \
+                    lambda x, y: FloatingPoint(operation(x.value, y.value))
+
+            elif first_type is Integer and second_type is Integer and exact_operation is None:
+                table[first_type, second_type] = \
+                    lambda x, y: Integer(operation(x.value, y.value))
+
+            elif first_type is Integer and second_type is Integer:
+                table[first_type, second_type] = \
+                    lambda x, y: make_exact(exact_operation(x.value, y.value))
+
+            else:
+                table[first_type, second_type] = \
+                    lambda x, y: make_exact(operation(x.value, y.value))
+
+    return table
+
+
+ADDITION = make_dispatch_table(operator.add)
+SUBTRACTION = make_dispatch_table(operator.sub)
+MULTIPLICATION = make_dispatch_table(operator.mul)
+# dividing integers gives an exact fraction, not a float
+DIVISION = make_dispatch_table(operator.truediv, Fraction)
+
+
+def combine(function_name, table, first, second):
+    """Apply the operation in table to two Scheme numbers."""
+    try:
+        operation = table[first.__class__, second.__class__]
+    except KeyError:
+        raise SchemeTypeError("%s is only defined for numbers, you gave me %s and %s."
+                              % (function_name, first.__class__, second.__class__))
+
+    try:
+        return operation(first, second)
+    except ZeroDivisionError:
+        raise InvalidArgument("%s: division by zero." % function_name)
+
+
+def is_pair_of_arguments(arguments):
+    """Are there exactly two arguments? This is much cheaper than
+    len(), which has to check whether the list is circular.
+
+    """
+    return isinstance(arguments, Cons) and isinstance(arguments.tail, Cons) and \
+        isinstance(arguments.tail.tail, Nil)
+
+
+def fold(function_name, table, initial, arguments):
+    result = initial
+
+    for argument in arguments:
+        result = combine(function_name, table, result, argument)
+
+    return result
 
 
 @define_built_in('rational?')
@@ -24,7 +112,7 @@ def number(arguments):
 def exact(arguments):
     check_argument_number('exact?', arguments, 1, 1)
 
-    if isinstance(arguments[0], Integer):
+    if isinstance(arguments[0], (Integer, Rational)):
         return Boolean(True)
     elif isinstance(arguments[0], FloatingPoint):
         return Boolean(False)
@@ -39,149 +127,278 @@ def inexact(arguments):
 
     if isinstance(arguments[0], FloatingPoint):
         return Boolean(True)
-    elif isinstance(arguments[0], Integer):
+    elif isinstance(arguments[0], (Integer, Rational)):
         return Boolean(False)
     else:
         raise SchemeTypeError("exact? only takes integers or floating point "
                               "numbers as arguments, you gave me ""%s." % \
                                   len(arguments))
 
-@define_built_in('+')
-def add(arguments):
-    if not arguments:
-        return Integer(0)
+@define_built_in('exact')
+def to_exact(arguments):
+    check_argument_number('exact', arguments, 1, 1)
 
-    if isinstance(arguments[0], Integer):
-        total = Integer(0)
-    elif isinstance(arguments[0], FloatingPoint):
-        total = FloatingPoint(0.0)
+    number = arguments[0]
+    if not isinstance(number, Number):
+        raise SchemeTypeError("exact is only defined for numbers, "
+                              "you gave me %s." % number.__class__)
 
-    for argument in arguments:
-        if not isinstance(argument, Number):
-            raise SchemeTypeError("Addition is only defined for numbers, "
-                                  "you gave me %s." % argument.__class__)
+    if isinstance(number, FloatingPoint):
+        try:
+            return make_exact(Fraction(number.value))
+        except (ValueError, OverflowError):
+            raise InvalidArgument("exact: %s has no exact equivalent."
+                                  % number.get_external_representation())
 
-        # adding a float to an integer gives us a float
-        if isinstance(total, Integer) and isinstance(argument, FloatingPoint):
-            total = FloatingPoint(float(total.value))
+    return number
 
-        total.value += argument.value
-    return total
 
+@define_built_in('inexact')
+def to_inexact(arguments):
+    check_argument_number('inexact', arguments, 1, 1)
 
-@define_built_in('-')
-def subtract(arguments):
-    check_argument_number('-', arguments, 1)
+    number = arguments[0]
+    if not isinstance(number, Number):
+        raise SchemeTypeError("inexact is only defined for numbers, "
+                              "you gave me %s." % number.__class__)
 
-    if len(arguments) == 1:
-        # we just negate a single argument
-        if isinstance(arguments[0], Integer):
-            return Integer(-1 * arguments[0].value)
-        elif isinstance(arguments[0], FloatingPoint):
-            return FloatingPoint(-1 * arguments[0].value)
-        else:
-            raise SchemeTypeError("Subtraction is only defined for integers and "
-                                  "floating point, you gave me %s." % arguments[0].__class__)
+    return FloatingPoint(float(number.value))
 
-    total = copy(arguments[0])
 
-    for argument in arguments.tail:
-        if not isinstance(argument, Number):
-            raise SchemeTypeError("Subtraction is only defined for numbers, "
-                                  "you gave me %s." % argument.__class__)
+@define_built_in('numerator')
+def numerator(arguments):
+    check_argument_number('numerator', arguments, 1, 1)
 
-        # subtracting a float from an integer gives us a float
-        if isinstance(total, Integer) and isinstance(argument, FloatingPoint):
-            total = FloatingPoint(float(total.value))
+    number = arguments[0]
+    if isinstance(number, (Integer, Rational)):
+        return Integer(number.value.numerator)
+    elif isinstance(number, FloatingPoint):
+        return FloatingPoint(float(Fraction(number.value).numerator))
 
-        total.value -= argument.value
+    raise SchemeTypeError("numerator is only defined for numbers, "
+                          "you gave me %s." % number.__class__)
 
-    return total
 
+@define_built_in('denominator')
+def denominator(arguments):
+    check_argument_number('denominator', arguments, 1, 1)
 
-@define_built_in('*')
-def multiply(arguments):
-    if not arguments:
-        return Integer(1)
+    number = arguments[0]
+    if isinstance(number, (Integer, Rational)):
+        return Integer(number.value.denominator)
+    elif isinstance(number, FloatingPoint):
+        return FloatingPoint(float(Fraction(number.value).denominator))
 
-    if isinstance(arguments[0], Integer):
-        product = Integer(1)
+    raise SchemeTypeError("denominator is only defined for numbers, "
+                          "you gave me %s." % number.__class__)
 
-    elif isinstance(arguments[0], FloatingPoint):
-        product = FloatingPoint(1.0)
 
-    for argument in arguments:
-        if not isinstance(argument, Number):
-            raise SchemeTypeError("Multiplication is only defined for numbers, "
-                                  "you gave me %s." % argument.__class__)
+@define_built_in('+')
+def add(arguments):
+    if is_pair_of_arguments(arguments):
+        # the common case, (+ a b)
+        return combine('+', ADDITION, arguments.head, arguments.tail.head)
+
+    return fold('+', ADDITION, Integer(0), arguments)
+
+
+@define_built_in('-')
+def subtract(arguments):
+    check_argument_number('-', arguments, 1)
+
+    if is_pair_of_arguments(arguments):
+        return combine('-', SUBTRACTION, arguments.head, arguments.tail.head)
+
+    if not arguments.tail:
+        # we just negate a single argument (multiplying, so (- 0.0) is -0.0)
+        return combine('-', MULTIPLICATION, Integer(-1), arguments.head)
 
-        if isinstance(product, Integer) and isinstance(argument, FloatingPoint):
-            product = FloatingPoint(float(product.value))
+    return fold('-', SUBTRACTION, arguments.head, arguments.tail)
 
-        product.value *= argument.value
 
-    return product
+@define_built_in('*')
+def multiply(arguments):
+    if is_pair_of_arguments(arguments):
+        return combine('*', MULTIPLICATION, arguments.head, arguments.tail.head)
+
+    return fold('*', MULTIPLICATION, Integer(1), arguments)
 
 
 @define_built_in('/')
 def divide(arguments):
-    # TODO: support exact fractions
-    # TODO: return integer if all arguments were integers and result is whole number
     check_argument_number('/', arguments, 1)
 
+    if is_pair_of_arguments(arguments):
+        return combine('/', DIVISION, arguments.head, arguments.tail.head)
+
+    if not arguments.tail:
+        # (/ x) is the reciprocal of x
+        return combine('/', DIVISION, Integer(1), arguments.head)
+
+    return fold('/', DIVISION, arguments.head, arguments.tail)
+
+
+def define_comparison(function_name, comparison):
+    @define_built_in(function_name)
+    def compare(arguments):
+        if is_pair_of_arguments(arguments):
+            # the common case, e.g. (< a b)
+            first = arguments.head
+            second = arguments.tail.head
+
+            if first.__class__ not in NUMBER_TYPES or second.__class__ not in NUMBER_TYPES:
+                raise SchemeTypeError("%s is only defined for numbers, you gave me %s and %s."
+                                      % (function_name, first.__class__, second.__class__))
+
+            # Python compares ints, Fractions and floats exactly
+            return Boolean(comparison(first.value, second.value))
+
+        check_argument_number(function_name, arguments, 2)
+
+        for argument in arguments:
+            if argument.__class__ not in NUMBER_TYPES:
+                raise SchemeTypeError("%s is only defined for numbers, "
+                                      "you gave me %s." % (function_name, argument.__class__))
+
+        arguments = list(arguments)
+        for i in range(len(arguments) - 1):
+            if not comparison(arguments[i].value, arguments[i+1].value):
+                return Boolean(False)
+
+        return Boolean(True)
+
+
+define_comparison('<', operator.lt)
+define_comparison('<=', operator.le)
+define_comparison('>', operator.gt)
+define_comparison('>=', operator.ge)
+
+
+# Unboxed versions of the arithmetic built-ins, used when the evaluator
+# passes numbers around as raw Python values (see immediates.py). An
+# argument may still be boxed, e.g. if it came from a quoted list.
+
+RAW_NUMBER_TYPES = frozenset([int, Fraction, float])
+
+
+def raw_number(function_name, value):
+    """Return the Python number for a raw or boxed Scheme number."""
+    if value.__class__ in RAW_NUMBER_TYPES:
+        return value
+    elif value.__class__ in NUMBER_TYPES:
+        return value.value
+
+    # we name the Scheme type, as the boxed built-ins do, rather than
+    # the Python type of a raw value
+    raise SchemeTypeError("%s is only defined for numbers, "
+                          "you gave me %s." % (function_name, box(value).__class__))
+
+
+def normalise(value):
+    """Exact results that are whole numbers are ints."""
+    if value.__class__ is Fraction and value.denominator == 1:
+        return value.numerator
+
+    return value
+
+
+def raw_divide(dividend, divisor):
+    if dividend.__class__ is int and divisor.__class__ is int:
+        return Fraction(dividend, divisor)
+
+    return dividend / divisor
+
+
+@define_unboxed_built_in('+')
+def unboxed_add(arguments):
+    if len(arguments) == 2:
+        (first, second) = arguments
+        if first.__class__ is int and second.__class__ is int:
+            # the common case, adding two integers
+            return first + second
+
+    total = 0
+    for argument in arguments:
+        total += raw_number('+', argument)
+
+    return normalise(total)
+
+
+@define_unboxed_built_in('-')
+def unboxed_subtract(arguments):
+    if len(arguments) == 2:
+        (first, second) = arguments
+        if first.__class__ is int and second.__class__ is int:
+            return first - second
+
+    check_argument_number('-', arguments, 1)
+
     if len(arguments) == 1:
-        return FloatingPoint(1 / arguments[0].value)
-    else:
-        result = FloatingPoint(arguments[0].value)
+        return -raw_number('-', arguments[0])
 
-        for argument in arguments.tail:
-            result.value /= argument.value
+    total = raw_number('-', arguments[0])
+    for argument in arguments[1:]:
+        total -= raw_number('-', argument)
 
-        return result
+    return normalise(total)
 
 
-@define_built_in('<')
-def less_than(arguments):
-    check_argument_number('<', arguments, 2)
+@define_unboxed_built_in('*')
+def unboxed_multiply(arguments):
+    if len(arguments) == 2:
+        (first, second) = arguments
+        if first.__class__ is int and second.__class__ is int:
+            return first * second
 
-    for i in range(len(arguments) - 1):
-        if not arguments[i].value < arguments[i+1].value:
-            return Boolean(False)
+    product = 1
+    for argument in arguments:
+        product *= raw_number('*', argument)
 
-    return Boolean(True)
+    return normalise(product)
 
 
-@define_built_in('<=')
-def less_or_equal(arguments):
-    check_argument_number('<=', arguments, 2)
+@define_unboxed_built_in('/')
+def unboxed_divide(arguments):
+    check_argument_number('/', arguments, 1)
+
+    if len(arguments) == 1:
+        arguments = [1] + arguments
 
-    for i in range(len(arguments) - 1):
-        if not arguments[i].value <= arguments[i+1].value:
-            return Boolean(False)
+    try:
+        result = raw_number('/', arguments[0])
+        for argument in arguments[1:]:
+            result = raw_divide(result, raw_number('/', argument))
+    except ZeroDivisionError:
+        raise InvalidArgument("/: division by zero.")
 
-    return Boolean(True)
+    return normalise(result)
 
 
-@define_built_in('>')
-def greater_than(arguments):
-    check_argument_number('>', arguments, 2)
+def define_unboxed_comparison(function_name, comparison, min_arguments=2):
+    @define_unboxed_built_in(function_name)
+    def compare(arguments):
+        if len(arguments) == 2:
+            (first, second) = arguments
+            if first.__class__ is int and second.__class__ is int:
+                return comparison(first, second)
 
-    for i in range(len(arguments) - 1):
-        if not arguments[i].value > arguments[i+1].value:
-            return Boolean(False)
+        check_argument_number(function_name, arguments, min_arguments)
 
-    return Boolean(True)
+        numbers = [raw_number(function_name, argument) for argument in arguments]
 
+        for i in range(len(numbers) - 1):
+            if not comparison(numbers[i], numbers[i+1]):
+                return False
 
-@define_built_in('>=')
-def greater_or_equal(arguments):
-    check_argument_number('>=', arguments, 2)
+        return True
 
-    for i in range(len(arguments) - 1):
-        if not arguments[i].value >= arguments[i+1].value:
-            return Boolean(False)
 
-    return Boolean(True)
+define_unboxed_comparison('<', operator.lt)
+define_unboxed_comparison('<=', operator.le)
+define_unboxed_comparison('>', operator.gt)
+define_unboxed_comparison('>=', operator.ge)
+# (=) and (= x) are true, as for the boxed =
+define_unboxed_comparison('=', operator.eq, 0)
 
 
 @define_built_in('quotient')
@@ -235,8 +452,8 @@ def remainder(arguments):
 def exp(arguments):
     check_argument_number('exp', arguments, 1, 1)
 
-    if arguments[0].__class__ not in [Integer, FloatingPoint]:
-        raise SchemeTypeError("exp only takes integers or floats, "
+    if arguments[0].__class__ not in NUMBER_TYPES:
+        raise SchemeTypeError("exp only takes real numbers, "
                               "got %s" % arguments[0].__class__)
 
     x1 = arguments[0].value
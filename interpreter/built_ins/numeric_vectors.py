@@ -0,0 +1,433 @@
+"""Homogeneous numeric vectors, as in SRFI-4:
+http://srfi.schemers.org/srfi-4/srfi-4.html
+
+Each type of vector (f64vector, s64vector, u8vector ...) gets its own
+constructors, predicate and accessors. The numeric-vector-*
+operations work on any type of numeric vector, and run as single NumPy
+operations rather than one interpreted call per element.
+
+"""
+import numpy
+
+from .base import define_built_in
+from ..utils import check_argument_number, check_list
+from ..data_types import (NumericVector, Number, Integer, FloatingPoint, Boolean,
+                          Cons, Nil, BuiltInFunction)
+from ..errors import SchemeTypeError, InvalidArgument
+from ..evaluator import apply_function
+
+
+def check_numeric_vector(function_name, vector, tag=None):
+    if not isinstance(vector, NumericVector) or (tag and vector.tag != tag):
+        raise SchemeTypeError("%s requires a %svector, you gave me %s."
+                              % (function_name, tag or "numeric ",
+                                 vector.get_external_representation()))
+
+
+def check_index(function_name, vector, index):
+    if not isinstance(index, Integer):
+        raise SchemeTypeError("%s requires an integer index, "
+                              "you gave me a %s." % (function_name, index.__class__))
+
+    if not 0 <= index.value < len(vector):
+        raise InvalidArgument("%s: index %d is out of range for a vector of length %d."
+                              % (function_name, index.value, len(vector)))
+
+
+def make_array(tag, numbers):
+    """Convert a Python list of number atoms to an array for a
+    tag-vector, checking they can all be stored.
+
+    """
+    for number in numbers:
+        NumericVector.check_element(tag, number)
+
+    return numpy.array([number.value for number in numbers],
+                       dtype=NumericVector.element_types[tag])
+
+
+def define_numeric_vector_built_ins(tag):
+    """Define make-TAGvector, TAGvector, TAGvector?, TAGvector-length,
+    TAGvector-ref, TAGvector-set!, TAGvector->list and list->TAGvector.
+
+    """
+    type_name = '%svector' % tag
+
+    @define_built_in('make-%s' % type_name)
+    def make_numeric_vector(arguments):
+        function_name = 'make-%s' % type_name
+        check_argument_number(function_name, arguments, 1, 2)
+
+        length = arguments[0]
+        if not isinstance(length, Integer) or length.value < 0:
+            raise SchemeTypeError("%s requires a non-negative integer length, "
+                                  "you gave me %s." % (function_name,
+                                                       length.get_external_representation()))
+
+        fill = Integer(0)
+        if len(arguments) == 2:
+            fill = arguments[1]
+
+        NumericVector.check_element(tag, fill)
+        return NumericVector(tag, numpy.full(length.value, fill.value,
+                                             dtype=NumericVector.element_types[tag]))
+
+    @define_built_in(type_name)
+    def numeric_vector(arguments):
+        return NumericVector(tag, make_array(tag, list(arguments)))
+
+    @define_built_in('%s?' % type_name)
+    def is_numeric_vector(arguments):
+        check_argument_number('%s?' % type_name, arguments, 1, 1)
+
+        if isinstance(arguments[0], NumericVector) and arguments[0].tag == tag:
+            return Boolean(True)
+
+        return Boolean(False)
+
+    @define_built_in('%s-length' % type_name)
+    def numeric_vector_length(arguments):
+        function_name = '%s-length' % type_name
+        check_argument_number(function_name, arguments, 1, 1)
+        check_numeric_vector(function_name, arguments[0], tag)
+
+        return Integer(len(arguments[0]))
+
+    @define_built_in('%s-ref' % type_name)
+    def numeric_vector_ref(arguments):
+        function_name = '%s-ref' % type_name
+        check_argument_number(function_name, arguments, 2, 2)
+        check_numeric_vector(function_name, arguments[0], tag)
+        check_index(function_name, arguments[0], arguments[1])
+
+        return arguments[0][arguments[1].value]
+
+    @define_built_in('%s-set!' % type_name)
+    def numeric_vector_set(arguments):
+        function_name = '%s-set!' % type_name
+        check_argument_number(function_name, arguments, 3, 3)
+        check_numeric_vector(function_name, arguments[0], tag)
+        check_index(function_name, arguments[0], arguments[1])
+
+        arguments[0][arguments[1].value] = arguments[2]
+        return Nil()
+
+    @define_built_in('%s->list' % type_name)
+    def numeric_vector_to_list(arguments):
+        function_name = '%s->list' % type_name
+        check_argument_number(function_name, arguments, 1, 1)
+        check_numeric_vector(function_name, arguments[0], tag)
+
+        vector = arguments[0]
+        return Cons.from_list([vector.box(number) for number in vector.value])
+
+    @define_built_in('list->%s' % type_name)
+    def list_to_numeric_vector(arguments):
+        function_name = 'list->%s' % type_name
+        check_argument_number(function_name, arguments, 1, 1)
+
+        check_list(function_name, arguments[0])
+
+        return NumericVector(tag, make_array(tag, list(arguments[0])))
+
+
+for tag in NumericVector.element_types:
+    define_numeric_vector_built_ins(tag)
+
+
+@define_built_in('numeric-vector?')
+def is_numeric_vector(arguments):
+    check_argument_number('numeric-vector?', arguments, 1, 1)
+
+    if isinstance(arguments[0], NumericVector):
+        return Boolean(True)
+
+    return Boolean(False)
+
+
+def to_operand(function_name, argument):
+    """Numeric vectors are used as arrays, and numbers are broadcast."""
+    if isinstance(argument, NumericVector):
+        return argument.value
+    elif isinstance(argument, Number):
+        return argument.value
+    else:
+        raise SchemeTypeError("%s requires numeric vectors or numbers, "
+                              "you gave me %s." % (function_name,
+                                                   argument.get_external_representation()))
+
+
+def is_integer_operand(operand):
+    if isinstance(operand, numpy.ndarray):
+        return operand.dtype.kind in 'iu'
+
+    return isinstance(operand, int)
+
+
+def magnitude(operand):
+    """The largest absolute value in an integer operand, as a Python int."""
+    if isinstance(operand, numpy.ndarray):
+        if not len(operand):
+            return 0
+
+        return max(abs(int(operand.min())), abs(int(operand.max())))
+
+    return abs(operand)
+
+
+def widen(operands, bound):
+    """Convert integer operands to a type we can compute a result of at
+    most bound in without overflowing: int64 if it's big enough,
+    otherwise Python ints.
+
+    """
+    magnitudes = [magnitude(operand) for operand in operands]
+
+    if max(magnitudes + [bound]) <= numpy.iinfo(numpy.int64).max:
+        wide_type = numpy.int64
+    else:
+        wide_type = object
+
+    return [operand.astype(wide_type) if isinstance(operand, numpy.ndarray) else operand
+            for operand in operands]
+
+
+def narrow(function_name, result, tag):
+    """Convert an integer result computed by widen to an array of tag
+    elements, checking every element fits.
+
+    """
+    element_type = NumericVector.element_types[tag]
+
+    if len(result):
+        limits = numpy.iinfo(element_type)
+
+        if not limits.min <= result.min() or not result.max() <= limits.max:
+            raise InvalidArgument("%s: the result is out of range for %s elements."
+                                  % (function_name, tag))
+
+    return result.astype(element_type)
+
+
+# The integer operations we compute exactly. Maps each operation to
+# the largest magnitude of its result, given the magnitudes of its
+# operands.
+INTEGER_OPERATIONS = {
+    numpy.add: lambda first, second: first + second,
+    numpy.subtract: lambda first, second: first + second,
+    numpy.multiply: lambda first, second: first * second,
+    numpy.mod: lambda first, second: second,
+    numpy.negative: lambda first: first,
+}
+
+DIVISIONS = (numpy.true_divide, numpy.mod)
+
+
+def integer_tag(vectors):
+    """The tag of the vector NumPy would give an integer result of
+    combining vectors in.
+
+    """
+    result_type = numpy.result_type(*[vector.value for vector in vectors])
+
+    for (tag, element_type) in NumericVector.element_types.items():
+        if result_type == element_type and not tag.startswith('f'):
+            return tag
+
+    # e.g. u64 and s64, which NumPy combines as floats
+    return 's64'
+
+
+def apply_elementwise(function_name, operation, arguments, result_tag=None):
+    """Apply a NumPy operation to numeric vectors and numbers. Integer
+    results are computed exactly, and stored in a vector of result_tag,
+    or the vectors' own type if result_tag is None. We raise an error
+    rather than let a result wrap around.
+
+    """
+    operands = [to_operand(function_name, argument) for argument in arguments]
+    vectors = [argument for argument in arguments if isinstance(argument, NumericVector)]
+
+    if not vectors:
+        raise SchemeTypeError("%s requires at least one numeric vector." % function_name)
+
+    if operation in DIVISIONS and numpy.any(operands[-1] == 0):
+        raise InvalidArgument("%s: division by zero." % function_name)
+
+    try:
+        if operation in INTEGER_OPERATIONS and all(is_integer_operand(operand)
+                                                   for operand in operands):
+            bound = INTEGER_OPERATIONS[operation](*[magnitude(operand) for operand in operands])
+            result = operation(*widen(operands, bound))
+
+            tag = result_tag or integer_tag(vectors)
+            return NumericVector(tag, narrow(function_name, result, tag))
+
+        operands = [float(operand) if not isinstance(operand, numpy.ndarray) else operand
+                    for operand in operands]
+
+        # float overflow gives an infinity, as it does for numbers
+        with numpy.errstate(over='ignore', invalid='ignore'):
+            result = operation(*operands)
+
+    except ValueError:
+        raise InvalidArgument("%s requires numeric vectors of the same length." % function_name)
+    except OverflowError:
+        raise InvalidArgument("%s: a number is too large to use with these vectors."
+                              % function_name)
+    except TypeError:
+        raise SchemeTypeError("%s can't combine these numbers and vectors." % function_name)
+
+    return NumericVector.from_array(result)
+
+
+def define_elementwise_operation(function_name, operation):
+    @define_built_in(function_name)
+    def elementwise_operation(arguments):
+        check_argument_number(function_name, arguments, 2, 2)
+
+        return apply_elementwise(function_name, operation, list(arguments))
+
+
+define_elementwise_operation('numeric-vector+', numpy.add)
+define_elementwise_operation('numeric-vector-', numpy.subtract)
+define_elementwise_operation('numeric-vector*', numpy.multiply)
+define_elementwise_operation('numeric-vector/', numpy.true_divide)
+
+
+def box_scalar(number):
+    """Convert a NumPy scalar result to an atom."""
+    if isinstance(number, (numpy.floating, float)):
+        return FloatingPoint(float(number))
+
+    return Integer(int(number))
+
+
+def define_reduction(function_name, reduction):
+    @define_built_in(function_name)
+    def reduce_vector(arguments):
+        check_argument_number(function_name, arguments, 1, 1)
+        check_numeric_vector(function_name, arguments[0])
+
+        if not len(arguments[0]):
+            raise InvalidArgument("%s requires a non-empty vector." % function_name)
+
+        return box_scalar(reduction(arguments[0].value))
+
+
+define_reduction('numeric-vector-min', numpy.min)
+define_reduction('numeric-vector-max', numpy.max)
+
+
+@define_built_in('numeric-vector-sum')
+def numeric_vector_sum(arguments):
+    check_argument_number('numeric-vector-sum', arguments, 1, 1)
+    check_numeric_vector('numeric-vector-sum', arguments[0])
+
+    vector = arguments[0]
+    if vector.is_floating_point():
+        return box_scalar(numpy.sum(vector.value))
+
+    [values] = widen([vector.value], magnitude(vector.value) * len(vector))
+    return box_scalar(numpy.sum(values))
+
+
+@define_built_in('numeric-vector-dot')
+def numeric_vector_dot(arguments):
+    check_argument_number('numeric-vector-dot', arguments, 2, 2)
+    check_numeric_vector('numeric-vector-dot', arguments[0])
+    check_numeric_vector('numeric-vector-dot', arguments[1])
+
+    (first, second) = (arguments[0], arguments[1])
+    if len(first) != len(second):
+        raise InvalidArgument("numeric-vector-dot requires vectors of the same length.")
+
+    if first.is_floating_point() or second.is_floating_point():
+        return box_scalar(numpy.dot(first.value, second.value))
+
+    bound = magnitude(first.value) * magnitude(second.value) * len(first)
+    return box_scalar(numpy.dot(*widen([first.value, second.value], bound)))
+
+
+# Built-ins that numeric-vector-map can run as a single NumPy
+# operation. Maps the built-in's name to the operation when given one
+# vector, and when given two.
+VECTORIZED_BUILT_INS = {
+    '+': (None, numpy.add),
+    '-': (numpy.negative, numpy.subtract),
+    '*': (None, numpy.multiply),
+    '/': (numpy.reciprocal, numpy.true_divide),
+    'modulo': (None, numpy.mod),
+    'exp': (numpy.exp, None),
+    'log': (numpy.log, None),
+}
+
+
+@define_built_in('numeric-vector-map', uses_environment=True)
+def numeric_vector_map(arguments, environment):
+    """(numeric-vector-map function vector ...) returns a vector of the
+    results of calling function on the elements of the vectors.
+
+    """
+    check_argument_number('numeric-vector-map', arguments, 2)
+
+    function = arguments[0]
+    vectors = list(arguments.tail)
+
+    for vector in vectors:
+        check_numeric_vector('numeric-vector-map', vector)
+
+    if isinstance(function, BuiltInFunction) and function.name in VECTORIZED_BUILT_INS \
+       and len(vectors) <= 2:
+        operation = VECTORIZED_BUILT_INS[function.name][len(vectors) - 1]
+
+        if operation is numpy.reciprocal:
+            # numpy.reciprocal does integer division on integer arrays
+            return apply_elementwise('numeric-vector-map', numpy.true_divide,
+                                     [Integer(1)] + vectors)
+
+        if operation is not None:
+            # integer results go in an s64vector, as they do when we
+            # call function on each element
+            return apply_elementwise('numeric-vector-map', operation, vectors, 's64')
+
+    # Otherwise, we have to call the function on each element.
+    length = min(len(vector) for vector in vectors)
+    results = [apply_function(function, [vector[index] for vector in vectors], environment)
+               for index in range(length)]
+
+    for result in results:
+        if not isinstance(result, Number):
+            raise SchemeTypeError("numeric-vector-map requires a function that returns "
+                                  "numbers, but it returned %s." % result.get_external_representation())
+
+    if all(isinstance(result, Integer) for result in results) and \
+       not any(vector.is_floating_point() for vector in vectors):
+        return NumericVector('s64', make_array('s64', results))
+
+    return NumericVector('f64', make_array('f64', results))
+
+
+@define_built_in('numeric-vector-slice')
+def numeric_vector_slice(arguments):
+    """(numeric-vector-slice vector start end) returns a view of the
+    elements from start up to end. The view shares storage with
+    vector, so changes to one are visible in the other.
+
+    """
+    check_argument_number('numeric-vector-slice', arguments, 3, 3)
+
+    vector = arguments[0]
+    check_numeric_vector('numeric-vector-slice', vector)
+
+    (start, end) = (arguments[1], arguments[2])
+    for index in (start, end):
+        if not isinstance(index, Integer):
+            raise SchemeTypeError("numeric-vector-slice requires integer indexes, "
+                                  "you gave me a %s." % index.__class__)
+
+    if not 0 <= start.value <= end.value <= len(vector):
+        raise InvalidArgument("numeric-vector-slice: invalid range %d to %d for a vector "
+                              "of length %d." % (start.value, end.value, len(vector)))
+
+    return NumericVector(vector.tag, vector.value[start.value:end.value])
@@ -0,0 +1,444 @@
+"""Persistent maps, sets and vectors. Updating one returns a new
+collection, sharing structure with the original, so updates are
+O(log32 n) rather than copying the whole collection.
+
+Transients build a collection in place, which is faster for bulk
+loading:
+
+    (define t (transient (persistent-vector)))
+    (transient-add! t 1)
+    (persistent! t)
+
+"""
+from .base import define_built_in
+from .equivalence import equal_key
+from ..utils import check_argument_number, check_procedure, check_type
+from ..data_types import (PersistentMap, PersistentSet, PersistentVector, Transient,
+                          Vector, Cons, Nil, Boolean, Integer)
+from ..errors import SchemeTypeError, SchemeArityError, InvalidArgument
+from ..evaluator import apply_function
+from ..persistent import HashTrie, VectorTrie, TransientError
+
+
+def check_index(function_name, vector, index, allow_end=False):
+    if not isinstance(index, Integer):
+        raise SchemeTypeError("%s requires an integer index, "
+                              "you gave me %s." % (function_name,
+                                                   index.get_external_representation()))
+
+    length = len(vector)
+    if not 0 <= index.value < length + (1 if allow_end else 0):
+        raise InvalidArgument("%s: index %d is out of range for a vector of length %d."
+                              % (function_name, index.value, length))
+
+
+def build_map(pairs):
+    """Make a persistent map from a Python iterable of (key, value)."""
+    builder = HashTrie().transient()
+    for (key, value) in pairs:
+        builder.set(equal_key(key), (key, value))
+
+    return PersistentMap(builder.persistent())
+
+
+def build_set(items):
+    builder = HashTrie().transient()
+    for item in items:
+        builder.set(equal_key(item), item)
+
+    return PersistentSet(builder.persistent())
+
+
+def build_vector(items):
+    builder = VectorTrie().transient()
+    for item in items:
+        builder.append(item)
+
+    return PersistentVector(builder.persistent())
+
+
+# maps
+
+@define_built_in('persistent-map')
+def persistent_map(arguments):
+    """(persistent-map key value ...)"""
+    arguments = list(arguments)
+
+    if len(arguments) % 2:
+        raise SchemeArityError("persistent-map requires an even number of arguments, "
+                               "but got %d." % len(arguments))
+
+    return build_map(zip(arguments[::2], arguments[1::2]))
+
+
+@define_built_in('alist->persistent-map')
+def alist_to_persistent_map(arguments):
+    check_argument_number('alist->persistent-map', arguments, 1, 1)
+
+    pairs = list(arguments[0])
+    for pair in pairs:
+        check_type('alist->persistent-map', pair, Cons, 'list of pairs')
+
+    # earlier associations take precedence, as with assoc
+    return build_map((pair.head, pair.tail) for pair in reversed(pairs))
+
+
+@define_built_in('persistent-map?')
+def is_persistent_map(arguments):
+    check_argument_number('persistent-map?', arguments, 1, 1)
+
+    return Boolean(isinstance(arguments[0], PersistentMap))
+
+
+@define_built_in('persistent-map-ref')
+def persistent_map_ref(arguments):
+    """(persistent-map-ref map key [default])"""
+    check_argument_number('persistent-map-ref', arguments, 2, 3)
+    check_type('persistent-map-ref', arguments[0], PersistentMap, 'persistent map')
+
+    entry = arguments[0].value.get(equal_key(arguments[1]))
+
+    if entry is None:
+        if len(arguments) == 3:
+            return arguments[2]
+
+        raise InvalidArgument("persistent-map-ref: no value for key %s."
+                              % arguments[1].get_external_representation())
+
+    return entry[1]
+
+
+@define_built_in('persistent-map-set')
+def persistent_map_set(arguments):
+    check_argument_number('persistent-map-set', arguments, 3, 3)
+    check_type('persistent-map-set', arguments[0], PersistentMap, 'persistent map')
+
+    (persistent_map, key, value) = arguments
+    return PersistentMap(persistent_map.value.set(equal_key(key), (key, value)))
+
+
+@define_built_in('persistent-map-delete')
+def persistent_map_delete(arguments):
+    check_argument_number('persistent-map-delete', arguments, 2, 2)
+    check_type('persistent-map-delete', arguments[0], PersistentMap, 'persistent map')
+
+    return PersistentMap(arguments[0].value.delete(equal_key(arguments[1])))
+
+
+@define_built_in('persistent-map-contains?')
+def persistent_map_contains(arguments):
+    check_argument_number('persistent-map-contains?', arguments, 2, 2)
+    check_type('persistent-map-contains?', arguments[0], PersistentMap, 'persistent map')
+
+    return Boolean(equal_key(arguments[1]) in arguments[0].value)
+
+
+@define_built_in('persistent-map-update', uses_environment=True)
+def persistent_map_update(arguments, environment):
+    """(persistent-map-update map key function [default]) returns a map
+    where key has the result of calling function on its current value
+    (or default, if it has no value).
+
+    """
+    check_argument_number('persistent-map-update', arguments, 3, 4)
+    check_type('persistent-map-update', arguments[0], PersistentMap, 'persistent map')
+    check_procedure('persistent-map-update', arguments[2])
+
+    arguments = list(arguments)
+    (persistent_map, key, function) = arguments[:3]
+
+    hash_key = equal_key(key)
+    entry = persistent_map.value.get(hash_key)
+
+    if entry is not None:
+        current_value = entry[1]
+    elif len(arguments) == 4:
+        current_value = arguments[3]
+    else:
+        raise InvalidArgument("persistent-map-update: no value for key %s."
+                              % key.get_external_representation())
+
+    new_value = apply_function(function, [current_value], environment)
+    return PersistentMap(persistent_map.value.set(hash_key, (key, new_value)))
+
+
+@define_built_in('persistent-map-size')
+def persistent_map_size(arguments):
+    check_argument_number('persistent-map-size', arguments, 1, 1)
+    check_type('persistent-map-size', arguments[0], PersistentMap, 'persistent map')
+
+    return Integer(len(arguments[0]))
+
+
+@define_built_in('persistent-map-keys')
+def persistent_map_keys(arguments):
+    check_argument_number('persistent-map-keys', arguments, 1, 1)
+    check_type('persistent-map-keys', arguments[0], PersistentMap, 'persistent map')
+
+    return Cons.from_list([key for (_, (key, _)) in arguments[0].value.items()])
+
+
+@define_built_in('persistent-map-values')
+def persistent_map_values(arguments):
+    check_argument_number('persistent-map-values', arguments, 1, 1)
+    check_type('persistent-map-values', arguments[0], PersistentMap, 'persistent map')
+
+    return Cons.from_list([value for (_, (_, value)) in arguments[0].value.items()])
+
+
+@define_built_in('persistent-map->alist')
+def persistent_map_to_alist(arguments):
+    check_argument_number('persistent-map->alist', arguments, 1, 1)
+    check_type('persistent-map->alist', arguments[0], PersistentMap, 'persistent map')
+
+    return Cons.from_list([Cons(key, value)
+                           for (_, (key, value)) in arguments[0].value.items()])
+
+
+# sets
+
+@define_built_in('persistent-set')
+def persistent_set(arguments):
+    return build_set(arguments)
+
+
+@define_built_in('list->persistent-set')
+def list_to_persistent_set(arguments):
+    check_argument_number('list->persistent-set', arguments, 1, 1)
+    check_type('list->persistent-set', arguments[0], (Cons, Nil), 'list')
+
+    return build_set(arguments[0])
+
+
+@define_built_in('persistent-set?')
+def is_persistent_set(arguments):
+    check_argument_number('persistent-set?', arguments, 1, 1)
+
+    return Boolean(isinstance(arguments[0], PersistentSet))
+
+
+@define_built_in('persistent-set-add')
+def persistent_set_add(arguments):
+    check_argument_number('persistent-set-add', arguments, 2, 2)
+    check_type('persistent-set-add', arguments[0], PersistentSet, 'persistent set')
+
+    return PersistentSet(arguments[0].value.set(equal_key(arguments[1]), arguments[1]))
+
+
+@define_built_in('persistent-set-remove')
+def persistent_set_remove(arguments):
+    check_argument_number('persistent-set-remove', arguments, 2, 2)
+    check_type('persistent-set-remove', arguments[0], PersistentSet, 'persistent set')
+
+    return PersistentSet(arguments[0].value.delete(equal_key(arguments[1])))
+
+
+@define_built_in('persistent-set-contains?')
+def persistent_set_contains(arguments):
+    check_argument_number('persistent-set-contains?', arguments, 2, 2)
+    check_type('persistent-set-contains?', arguments[0], PersistentSet, 'persistent set')
+
+    return Boolean(equal_key(arguments[1]) in arguments[0].value)
+
+
+@define_built_in('persistent-set-size')
+def persistent_set_size(arguments):
+    check_argument_number('persistent-set-size', arguments, 1, 1)
+    check_type('persistent-set-size', arguments[0], PersistentSet, 'persistent set')
+
+    return Integer(len(arguments[0]))
+
+
+@define_built_in('persistent-set->list')
+def persistent_set_to_list(arguments):
+    check_argument_number('persistent-set->list', arguments, 1, 1)
+    check_type('persistent-set->list', arguments[0], PersistentSet, 'persistent set')
+
+    return Cons.from_list([item for (_, item) in arguments[0].value.items()])
+
+
+# vectors
+
+@define_built_in('persistent-vector')
+def persistent_vector(arguments):
+    return build_vector(arguments)
+
+
+@define_built_in('list->persistent-vector')
+def list_to_persistent_vector(arguments):
+    check_argument_number('list->persistent-vector', arguments, 1, 1)
+    check_type('list->persistent-vector', arguments[0], (Cons, Nil), 'list')
+
+    return build_vector(arguments[0])
+
+
+@define_built_in('vector->persistent-vector')
+def vector_to_persistent_vector(arguments):
+    check_argument_number('vector->persistent-vector', arguments, 1, 1)
+    check_type('vector->persistent-vector', arguments[0], Vector, 'vector')
+
+    return build_vector(arguments[0].value)
+
+
+@define_built_in('persistent-vector?')
+def is_persistent_vector(arguments):
+    check_argument_number('persistent-vector?', arguments, 1, 1)
+
+    return Boolean(isinstance(arguments[0], PersistentVector))
+
+
+@define_built_in('persistent-vector-ref')
+def persistent_vector_ref(arguments):
+    check_argument_number('persistent-vector-ref', arguments, 2, 2)
+    check_type('persistent-vector-ref', arguments[0], PersistentVector, 'persistent vector')
+    check_index('persistent-vector-ref', arguments[0], arguments[1])
+
+    return arguments[0][arguments[1].value]
+
+
+@define_built_in('persistent-vector-set')
+def persistent_vector_set(arguments):
+    check_argument_number('persistent-vector-set', arguments, 3, 3)
+    check_type('persistent-vector-set', arguments[0], PersistentVector, 'persistent vector')
+    check_index('persistent-vector-set', arguments[0], arguments[1])
+
+    return PersistentVector(arguments[0].value.set(arguments[1].value, arguments[2]))
+
+
+@define_built_in('persistent-vector-push')
+def persistent_vector_push(arguments):
+    """Return a persistent vector with an item added at the end."""
+    check_argument_number('persistent-vector-push', arguments, 2, 2)
+    check_type('persistent-vector-push', arguments[0], PersistentVector, 'persistent vector')
+
+    return PersistentVector(arguments[0].value.append(arguments[1]))
+
+
+@define_built_in('persistent-vector-length')
+def persistent_vector_length(arguments):
+    check_argument_number('persistent-vector-length', arguments, 1, 1)
+    check_type('persistent-vector-length', arguments[0], PersistentVector, 'persistent vector')
+
+    return Integer(len(arguments[0]))
+
+
+@define_built_in('persistent-vector->list')
+def persistent_vector_to_list(arguments):
+    check_argument_number('persistent-vector->list', arguments, 1, 1)
+    check_type('persistent-vector->list', arguments[0], PersistentVector, 'persistent vector')
+
+    return Cons.from_list(list(arguments[0]))
+
+
+@define_built_in('persistent-vector->vector')
+def persistent_vector_to_vector(arguments):
+    check_argument_number('persistent-vector->vector', arguments, 1, 1)
+    check_type('persistent-vector->vector', arguments[0], PersistentVector,
+               'persistent vector')
+
+    return Vector.from_list(list(arguments[0]))
+
+
+# transients
+
+@define_built_in('transient')
+def transient(arguments):
+    """Return a transient copy of a persistent map, set or vector."""
+    check_argument_number('transient', arguments, 1, 1)
+
+    collection = arguments[0]
+
+    if isinstance(collection, PersistentMap):
+        return Transient('map', collection.value.transient())
+    elif isinstance(collection, PersistentSet):
+        return Transient('set', collection.value.transient())
+    elif isinstance(collection, PersistentVector):
+        return Transient('vector', collection.value.transient())
+
+    raise SchemeTypeError("transient requires a persistent map, set or vector, "
+                          "you gave me %s." % collection.get_external_representation())
+
+
+def update_transient(function_name, transient_given, kinds, update):
+    check_type(function_name, transient_given, Transient, 'transient')
+
+    if transient_given.kind not in kinds:
+        raise SchemeTypeError("%s doesn't work on a transient %s."
+                              % (function_name, transient_given.kind))
+
+    try:
+        update(transient_given.value)
+    except TransientError as e:
+        raise InvalidArgument("%s: %s" % (function_name, e))
+
+    return Nil()
+
+
+@define_built_in('transient-set!')
+def transient_set(arguments):
+    """(transient-set! transient key value) sets a key in a transient
+    map, or an index in a transient vector.
+
+    """
+    check_argument_number('transient-set!', arguments, 3, 3)
+
+    (transient_given, key, value) = arguments
+
+    if isinstance(transient_given, Transient) and transient_given.kind == 'vector':
+        check_index('transient-set!', transient_given.value, key, allow_end=True)
+        return update_transient('transient-set!', transient_given, ['vector'],
+                                lambda builder: builder.set(key.value, value))
+
+    return update_transient('transient-set!', transient_given, ['map'],
+                            lambda builder: builder.set(equal_key(key), (key, value)))
+
+
+@define_built_in('transient-add!')
+def transient_add(arguments):
+    """(transient-add! transient item) adds an item to a transient set,
+    or to the end of a transient vector.
+
+    """
+    check_argument_number('transient-add!', arguments, 2, 2)
+
+    (transient_given, item) = arguments
+
+    if isinstance(transient_given, Transient) and transient_given.kind == 'vector':
+        return update_transient('transient-add!', transient_given, ['vector'],
+                                lambda builder: builder.append(item))
+
+    return update_transient('transient-add!', transient_given, ['set'],
+                            lambda builder: builder.set(equal_key(item), item))
+
+
+@define_built_in('transient-delete!')
+def transient_delete(arguments):
+    """Remove a key from a transient map, or an item from a transient set."""
+    check_argument_number('transient-delete!', arguments, 2, 2)
+
+    return update_transient('transient-delete!', arguments[0], ['map', 'set'],
+                            lambda builder: builder.delete(equal_key(arguments[1])))
+
+
+@define_built_in('persistent!')
+def make_persistent(arguments):
+    """Return the persistent collection a transient has built. The
+    transient can't be used afterwards.
+
+    """
+    check_argument_number('persistent!', arguments, 1, 1)
+
+    transient_given = arguments[0]
+    check_type('persistent!', transient_given, Transient, 'transient')
+
+    try:
+        trie = transient_given.value.persistent()
+    except TransientError as e:
+        raise InvalidArgument("persistent!: %s" % e)
+
+    if transient_given.kind == 'map':
+        return PersistentMap(trie)
+    elif transient_given.kind == 'set':
+        return PersistentSet(trie)
+
+    return PersistentVector(trie)
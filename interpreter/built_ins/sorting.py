@@ -0,0 +1,103 @@
+from functools import cmp_to_key
+
+from .base import define_built_in
+from ..utils import check_argument_number, check_procedure, check_list, check_vector
+from ..data_types import (Cons, Nil, Vector, Boolean, Number, String, Character,
+                          BuiltInFunction)
+from ..evaluator import apply_function
+
+
+# If we're sorting with one of these built-ins, and every item has the
+# right type, we can compare the Python values directly rather than
+# calling back into the interpreter. Maps the name of the built-in to
+# (type of items, whether it sorts in descending order).
+FAST_COMPARISONS = {
+    '<': (Number, False),
+    '>': (Number, True),
+    'string<?': (String, False),
+    'string>?': (String, True),
+    'char<?': (Character, False),
+}
+
+
+def sort_items(function_name, items, less_than, environment):
+    """Sort a Python list of Scheme values in place, using the Scheme
+    function less_than. Python's sort is stable, as Scheme requires.
+
+    """
+    check_procedure(function_name, less_than)
+
+    if isinstance(less_than, BuiltInFunction) and less_than.name in FAST_COMPARISONS:
+        (item_type, descending) = FAST_COMPARISONS[less_than.name]
+
+        if all(isinstance(item, item_type) for item in items):
+            # reverse=True keeps equal items in their original order
+            items.sort(key=lambda item: item.value, reverse=descending)
+            return
+
+    # Python's sort only ever asks whether one item is less than
+    # another, so we only need to call less_than once per comparison.
+    def compare(first, second):
+        if apply_function(less_than, [first, second], environment) == Boolean(False):
+            return 0
+
+        return -1
+
+    items.sort(key=cmp_to_key(compare))
+
+
+@define_built_in('sort', uses_environment=True)
+def sort(arguments, environment):
+    """(sort sequence less-than) returns a new sorted list or vector."""
+    check_argument_number('sort', arguments, 2, 2)
+
+    sequence = arguments[0]
+
+    if isinstance(sequence, Vector):
+        items = list(sequence.value)
+        sort_items('sort', items, arguments[1], environment)
+        return Vector.from_list(items)
+
+    check_list('sort', sequence)
+
+    items = list(sequence)
+    sort_items('sort', items, arguments[1], environment)
+    return Cons.from_list(items)
+
+
+@define_built_in('list-sort', uses_environment=True)
+def list_sort(arguments, environment):
+    """(list-sort less-than list), as in SRFI-132."""
+    check_argument_number('list-sort', arguments, 2, 2)
+
+    list_given = arguments[1]
+    check_list('list-sort', list_given)
+
+    items = list(list_given)
+    sort_items('list-sort', items, arguments[0], environment)
+    return Cons.from_list(items)
+
+
+@define_built_in('vector-sort', uses_environment=True)
+def vector_sort(arguments, environment):
+    """(vector-sort less-than vector), as in SRFI-132."""
+    check_argument_number('vector-sort', arguments, 2, 2)
+
+    vector = arguments[1]
+    check_vector('vector-sort', vector)
+
+    items = list(vector.value)
+    sort_items('vector-sort', items, arguments[0], environment)
+    return Vector.from_list(items)
+
+
+@define_built_in('vector-sort!', uses_environment=True)
+def vector_sort_in_place(arguments, environment):
+    """(vector-sort! vector less-than), as in SRFI-132."""
+    check_argument_number('vector-sort!', arguments, 2, 2)
+
+    vector = arguments[0]
+    check_vector('vector-sort!', vector)
+
+    sort_items('vector-sort!', vector.value, arguments[1], environment)
+    return Nil()
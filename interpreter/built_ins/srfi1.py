@@ -0,0 +1,366 @@
+"""A subset of the SRFI-1 list library:
+http://srfi.schemers.org/srfi-1/srfi-1.html
+
+Every operation makes a single pass over its list arguments, and
+returns a shared tail of its input rather than a copy wherever SRFI-1
+allows it.
+
+"""
+from .base import define_built_in
+from .equivalence import is_eqv, is_equal
+from ..immediates import is_false
+from ..utils import check_argument_number, check_procedure, check_list
+from ..data_types import Cons, Nil, Boolean, Integer, FloatingPoint, Number
+from ..errors import SchemeTypeError, InvalidArgument
+from ..evaluator import apply_function
+
+
+def check_index(function_name, index):
+    if not isinstance(index, Integer) or index.value < 0:
+        raise SchemeTypeError("%s requires a non-negative integer index, "
+                              "you gave me %s." % (function_name,
+                                                   index.get_external_representation()))
+
+
+def prepend(python_list, tail):
+    """Return a list of the elements of python_list, followed by tail
+    (which is shared, not copied).
+
+    """
+    result = tail
+    for item in reversed(python_list):
+        result = Cons(item, result)
+
+    return result
+
+
+def filter_list(should_keep, list_given):
+    """Return a list of the elements of list_given for which
+    should_keep returns True. The longest suffix of list_given where
+    every element is kept is shared with the result.
+
+    """
+    kept_items = []
+
+    # the start of the current run of kept elements
+    run_start = None
+    run_start_index = 0
+
+    element = list_given
+    while isinstance(element, Cons):
+        if should_keep(element.head):
+            if run_start is None:
+                run_start = element
+                run_start_index = len(kept_items)
+
+            kept_items.append(element.head)
+        else:
+            run_start = None
+
+        element = element.tail
+
+    if run_start is None:
+        return Cons.from_list(kept_items)
+
+    return prepend(kept_items[:run_start_index], run_start)
+
+
+@define_built_in('append')
+def append(arguments):
+    if not arguments:
+        return Nil()
+
+    lists = list(arguments)
+
+    # the last list is shared, and can be any value
+    result = lists[-1]
+
+    for list_given in reversed(lists[:-1]):
+        check_list('append', list_given)
+        result = prepend(list(list_given), result)
+
+    return result
+
+
+@define_built_in('reverse')
+def reverse(arguments):
+    check_argument_number('reverse', arguments, 1, 1)
+
+    list_given = arguments[0]
+    check_list('reverse', list_given)
+
+    result = Nil()
+    for item in list_given:
+        result = Cons(item, result)
+
+    return result
+
+
+def nth_tail(function_name, list_given, index):
+    check_index(function_name, index)
+
+    for _ in range(index.value):
+        if not isinstance(list_given, Cons):
+            raise InvalidArgument("%s: index %d is out of range." % (function_name,
+                                                                    index.value))
+        list_given = list_given.tail
+
+    return list_given
+
+
+@define_built_in('list-tail')
+def list_tail(arguments):
+    check_argument_number('list-tail', arguments, 2, 2)
+
+    return nth_tail('list-tail', arguments[0], arguments[1])
+
+
+@define_built_in('list-ref')
+def list_ref(arguments):
+    check_argument_number('list-ref', arguments, 2, 2)
+
+    tail = nth_tail('list-ref', arguments[0], arguments[1])
+
+    if not isinstance(tail, Cons):
+        raise InvalidArgument("list-ref: index %d is out of range." % arguments[1].value)
+
+    return tail.head
+
+
+def find_tail(is_match, list_given):
+    """Return the first tail of list_given whose head matches, or #f."""
+    element = list_given
+    while isinstance(element, Cons):
+        if is_match(element.head):
+            return element
+
+        element = element.tail
+
+    return Boolean(False)
+
+
+@define_built_in('memq')
+def memq(arguments):
+    check_argument_number('memq', arguments, 2, 2)
+
+    item = arguments[0]
+    return find_tail(lambda element: is_eqv(item, element), arguments[1])
+
+
+@define_built_in('memv')
+def memv(arguments):
+    check_argument_number('memv', arguments, 2, 2)
+
+    item = arguments[0]
+    return find_tail(lambda element: is_eqv(item, element), arguments[1])
+
+
+@define_built_in('member', uses_environment=True)
+def member(arguments, environment):
+    check_argument_number('member', arguments, 2, 3)
+
+    item = arguments[0]
+
+    if len(arguments) == 3:
+        equality = arguments[2]
+        check_procedure('member', equality)
+        return find_tail(lambda element: not is_false(apply_function(equality,
+                                                                     [item, element],
+                                                                     environment)),
+                         arguments[1])
+
+    return find_tail(lambda element: is_equal(item, element), arguments[1])
+
+
+def find_association(function_name, is_match, alist):
+    """Return the first pair in alist whose car matches, or #f."""
+    element = alist
+    while isinstance(element, Cons):
+        pair = element.head
+
+        if not isinstance(pair, Cons):
+            raise SchemeTypeError("%s requires a list of pairs, "
+                                  "but it contained %s." % (function_name,
+                                                            pair.get_external_representation()))
+
+        if is_match(pair.head):
+            return pair
+
+        element = element.tail
+
+    return Boolean(False)
+
+
+@define_built_in('assq')
+def assq(arguments):
+    check_argument_number('assq', arguments, 2, 2)
+
+    key = arguments[0]
+    return find_association('assq', lambda element: is_eqv(key, element), arguments[1])
+
+
+@define_built_in('assv')
+def assv(arguments):
+    check_argument_number('assv', arguments, 2, 2)
+
+    key = arguments[0]
+    return find_association('assv', lambda element: is_eqv(key, element), arguments[1])
+
+
+@define_built_in('assoc', uses_environment=True)
+def assoc(arguments, environment):
+    check_argument_number('assoc', arguments, 2, 3)
+
+    key = arguments[0]
+
+    if len(arguments) == 3:
+        equality = arguments[2]
+        check_procedure('assoc', equality)
+        return find_association('assoc',
+                                lambda element: not is_false(apply_function(equality,
+                                                                            [key, element],
+                                                                            environment)),
+                                arguments[1])
+
+    return find_association('assoc', lambda element: is_equal(key, element), arguments[1])
+
+
+@define_built_in('filter', uses_environment=True)
+def filter_function(arguments, environment):
+    check_argument_number('filter', arguments, 2, 2)
+
+    predicate = arguments[0]
+    check_procedure('filter', predicate)
+    check_list('filter', arguments[1])
+
+    return filter_list(lambda item: not is_false(apply_function(predicate, [item], environment)),
+                       arguments[1])
+
+
+@define_built_in('delete', uses_environment=True)
+def delete(arguments, environment):
+    check_argument_number('delete', arguments, 2, 3)
+
+    item = arguments[0]
+    check_list('delete', arguments[1])
+
+    if len(arguments) == 3:
+        equality = arguments[2]
+        check_procedure('delete', equality)
+        return filter_list(lambda element: is_false(apply_function(equality, [item, element],
+                                                                   environment)),
+                           arguments[1])
+
+    return filter_list(lambda element: not is_equal(item, element), arguments[1])
+
+
+@define_built_in('reduce', uses_environment=True)
+def reduce_function(arguments, environment):
+    check_argument_number('reduce', arguments, 3, 3)
+
+    function = arguments[0]
+    check_procedure('reduce', function)
+
+    list_given = arguments[2]
+    check_list('reduce', list_given)
+
+    if isinstance(list_given, Nil):
+        return arguments[1]
+
+    # (reduce + 0 '(1 2 3)) is (+ 3 (+ 2 1))
+    accumulator = list_given.head
+    for item in list_given.tail:
+        accumulator = apply_function(function, [item, accumulator], environment)
+
+    return accumulator
+
+
+@define_built_in('fold-left', uses_environment=True)
+def fold_left(arguments, environment):
+    check_argument_number('fold-left', arguments, 3)
+
+    function = arguments[0]
+    check_procedure('fold-left', function)
+
+    # (fold-left f init '(1 2)) is (f (f init 1) 2)
+    accumulator = arguments[1]
+    lists = list(arguments.tail.tail)
+
+    while all(isinstance(list_given, Cons) for list_given in lists):
+        accumulator = apply_function(function,
+                                     [accumulator] + [list_given.head for list_given in lists],
+                                     environment)
+        lists = [list_given.tail for list_given in lists]
+
+    return accumulator
+
+
+@define_built_in('fold-right', uses_environment=True)
+def fold_right(arguments, environment):
+    check_argument_number('fold-right', arguments, 3)
+
+    function = arguments[0]
+    check_procedure('fold-right', function)
+
+    # (fold-right f init '(1 2)) is (f 1 (f 2 init)), so we collect
+    # the rows of arguments first rather than recursing.
+    rows = []
+    lists = list(arguments.tail.tail)
+
+    while all(isinstance(list_given, Cons) for list_given in lists):
+        rows.append([list_given.head for list_given in lists])
+        lists = [list_given.tail for list_given in lists]
+
+    accumulator = arguments[1]
+    for row in reversed(rows):
+        accumulator = apply_function(function, row + [accumulator], environment)
+
+    return accumulator
+
+
+@define_built_in('last-pair')
+def last_pair(arguments):
+    check_argument_number('last-pair', arguments, 1, 1)
+
+    element = arguments[0]
+    if not isinstance(element, Cons):
+        raise SchemeTypeError("last-pair requires a pair, "
+                              "you gave me a %s." % element.__class__)
+
+    if element.is_circular():
+        raise SchemeTypeError("last-pair requires a list that isn't circular.")
+
+    while isinstance(element.tail, Cons):
+        element = element.tail
+
+    return element
+
+
+@define_built_in('iota')
+def iota(arguments):
+    check_argument_number('iota', arguments, 1, 3)
+
+    count = arguments[0]
+    if not isinstance(count, Integer) or count.value < 0:
+        raise SchemeTypeError("iota requires a non-negative integer count, "
+                              "you gave me %s." % count.get_external_representation())
+
+    start = Integer(0)
+    step = Integer(1)
+
+    if len(arguments) >= 2:
+        start = arguments[1]
+    if len(arguments) == 3:
+        step = arguments[2]
+
+    for number in (start, step):
+        if not isinstance(number, Number):
+            raise SchemeTypeError("iota requires numbers, "
+                                  "you gave me %s." % number.get_external_representation())
+
+    if isinstance(start, Integer) and isinstance(step, Integer):
+        return Cons.from_list([Integer(start.value + index * step.value)
+                               for index in range(count.value)])
+
+    return Cons.from_list([FloatingPoint(start.value + index * step.value)
+                           for index in range(count.value)])
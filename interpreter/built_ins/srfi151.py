@@ -0,0 +1,94 @@
+"""Bitwise operations on exact integers, as in SRFI-151:
+https://srfi.schemers.org/srfi-151/srfi-151.html
+
+Integers behave as if they were in two's complement with infinitely
+many sign bits, as Python ints do.
+
+"""
+from .base import define_built_in
+from ..utils import check_argument_number
+from ..data_types import Boolean, Integer, bit_count
+from ..errors import SchemeTypeError, InvalidArgument
+
+
+def check_integer(function_name, value):
+    if not isinstance(value, Integer):
+        raise SchemeTypeError("%s requires an exact integer, you gave me %s."
+                              % (function_name, value.get_external_representation()))
+
+
+def define_bitwise_operation(function_name, operation, identity):
+    @define_built_in(function_name)
+    def bitwise_operation(arguments):
+        result = identity
+
+        for argument in arguments:
+            check_integer(function_name, argument)
+            result = operation(result, argument.value)
+
+        return Integer(result)
+
+
+define_bitwise_operation('bitwise-and', lambda x, y: x & y, -1)
+define_bitwise_operation('bitwise-ior', lambda x, y: x | y, 0)
+define_bitwise_operation('bitwise-or', lambda x, y: x | y, 0)
+define_bitwise_operation('bitwise-xor', lambda x, y: x ^ y, 0)
+
+
+@define_built_in('bitwise-not')
+def bitwise_not(arguments):
+    check_argument_number('bitwise-not', arguments, 1, 1)
+    check_integer('bitwise-not', arguments[0])
+
+    return Integer(~arguments[0].value)
+
+
+@define_built_in('arithmetic-shift')
+def arithmetic_shift(arguments):
+    """(arithmetic-shift i count) shifts i left by count bits, or right
+    if count is negative.
+
+    """
+    check_argument_number('arithmetic-shift', arguments, 2, 2)
+    check_integer('arithmetic-shift', arguments[0])
+    check_integer('arithmetic-shift', arguments[1])
+
+    value = arguments[0].value
+    count = arguments[1].value
+
+    if count >= 0:
+        return Integer(value << count)
+
+    return Integer(value >> -count)
+
+
+@define_built_in('bit-count')
+def count_bits(arguments):
+    """The number of 1 bits in a non-negative integer, or of 0 bits in a
+    negative one.
+
+    """
+    check_argument_number('bit-count', arguments, 1, 1)
+    check_integer('bit-count', arguments[0])
+
+    value = arguments[0].value
+
+    if value < 0:
+        value = ~value
+
+    return Integer(bit_count(value))
+
+
+@define_built_in('bit-set?')
+def is_bit_set(arguments):
+    """(bit-set? index i) is #t if bit index of i is 1."""
+    check_argument_number('bit-set?', arguments, 2, 2)
+    check_integer('bit-set?', arguments[0])
+    check_integer('bit-set?', arguments[1])
+
+    index = arguments[0].value
+    if index < 0:
+        raise InvalidArgument("bit-set? requires a non-negative index, you gave me %d."
+                              % index)
+
+    return Boolean(bool((arguments[1].value >> index) & 1))
@@ -0,0 +1,276 @@
+"""Hash tables, as in SRFI-69:
+http://srfi.schemers.org/srfi-69/srfi-69.html
+
+Tables are Python dicts, so lookups, insertions and deletions are O(1)
+rather than the O(n) of association lists.
+
+"""
+from .base import define_built_in
+from .equivalence import eqv_key, equal_key
+from ..utils import check_argument_number, check_procedure
+from ..data_types import HashTable, Cons, Nil, Boolean, Integer, BuiltInFunction
+from ..errors import SchemeTypeError, InvalidArgument
+from ..evaluator import apply_function
+
+
+# The equality procedures a table can use. Maps the name of the
+# built-in to a function computing hashable keys consistent with it.
+EQUIVALENCES = {
+    'equal?': equal_key,
+    'eqv?': eqv_key,
+    'eq?': eqv_key,
+    'string=?': eqv_key,
+    '=': eqv_key,
+}
+
+
+def check_hash_table(function_name, table):
+    if not isinstance(table, HashTable):
+        raise SchemeTypeError("%s requires a hash table, "
+                              "you gave me a %s." % (function_name, table.__class__))
+
+
+def make_table(function_name, arguments):
+    """Make an empty table from the optional equality and hash
+    procedures given to function_name.
+
+    """
+    if not arguments:
+        return HashTable('equal?', equal_key)
+
+    equality = arguments[0]
+    if not isinstance(equality, BuiltInFunction) or equality.name not in EQUIVALENCES:
+        raise SchemeTypeError("%s: the equality procedure must be one of %s."
+                              % (function_name, ", ".join(sorted(EQUIVALENCES))))
+
+    # we compute our own hashes, which are consistent with the
+    # equality procedure, so we just check the hash procedure is one
+    if len(arguments) == 2:
+        check_procedure(function_name, arguments[1])
+
+    return HashTable(equality.name, EQUIVALENCES[equality.name])
+
+
+@define_built_in('make-hash-table')
+def make_hash_table(arguments):
+    check_argument_number('make-hash-table', arguments, 0, 2)
+
+    return make_table('make-hash-table', list(arguments))
+
+
+@define_built_in('alist->hash-table')
+def alist_to_hash_table(arguments):
+    check_argument_number('alist->hash-table', arguments, 1, 3)
+
+    table = make_table('alist->hash-table', list(arguments.tail))
+
+    # earlier associations take precedence, as with assoc
+    for pair in reversed(list(arguments[0])):
+        if not isinstance(pair, Cons):
+            raise SchemeTypeError("alist->hash-table requires a list of pairs, "
+                                  "but it contained %s." % pair.get_external_representation())
+
+        table.value[table.key_function(pair.head)] = (pair.head, pair.tail)
+
+    return table
+
+
+@define_built_in('hash-table?')
+def is_hash_table(arguments):
+    check_argument_number('hash-table?', arguments, 1, 1)
+
+    if isinstance(arguments[0], HashTable):
+        return Boolean(True)
+
+    return Boolean(False)
+
+
+@define_built_in('hash-table-ref', uses_environment=True)
+def hash_table_ref(arguments, environment):
+    """(hash-table-ref table key [thunk [success]]) returns the value
+    for key (passed to success, if given), or the result of calling
+    thunk if there isn't one.
+
+    """
+    check_argument_number('hash-table-ref', arguments, 2, 4)
+
+    table = arguments[0]
+    check_hash_table('hash-table-ref', table)
+
+    entry = table.value.get(table.key_function(arguments[1]))
+
+    if entry is None:
+        if len(arguments) < 3:
+            raise InvalidArgument("hash-table-ref: no value for key %s."
+                                  % arguments[1].get_external_representation())
+
+        check_procedure('hash-table-ref', arguments[2])
+        return apply_function(arguments[2], [], environment)
+
+    if len(arguments) == 4:
+        check_procedure('hash-table-ref', arguments[3])
+        return apply_function(arguments[3], [entry[1]], environment)
+
+    return entry[1]
+
+
+@define_built_in('hash-table-ref/default')
+def hash_table_ref_default(arguments):
+    check_argument_number('hash-table-ref/default', arguments, 3, 3)
+
+    table = arguments[0]
+    check_hash_table('hash-table-ref/default', table)
+
+    entry = table.value.get(table.key_function(arguments[1]))
+
+    if entry is None:
+        return arguments[2]
+
+    return entry[1]
+
+
+@define_built_in('hash-table-set!')
+def hash_table_set(arguments):
+    check_argument_number('hash-table-set!', arguments, 3, 3)
+
+    table = arguments[0]
+    check_hash_table('hash-table-set!', table)
+
+    table.value[table.key_function(arguments[1])] = (arguments[1], arguments[2])
+    return Nil()
+
+
+@define_built_in('hash-table-delete!')
+def hash_table_delete(arguments):
+    check_argument_number('hash-table-delete!', arguments, 2, 2)
+
+    table = arguments[0]
+    check_hash_table('hash-table-delete!', table)
+
+    table.value.pop(table.key_function(arguments[1]), None)
+    return Nil()
+
+
+def table_contains(function_name, arguments):
+    check_argument_number(function_name, arguments, 2, 2)
+
+    table = arguments[0]
+    check_hash_table(function_name, table)
+
+    return Boolean(table.key_function(arguments[1]) in table.value)
+
+
+@define_built_in('hash-table-exists?')
+def hash_table_exists(arguments):
+    return table_contains('hash-table-exists?', arguments)
+
+
+@define_built_in('hash-table-contains?')
+def hash_table_contains(arguments):
+    return table_contains('hash-table-contains?', arguments)
+
+
+@define_built_in('hash-table-update!', uses_environment=True)
+def hash_table_update(arguments, environment):
+    """(hash-table-update! table key function [thunk]) sets the value
+    for key to the result of calling function on its current value.
+    If there's no current value, we use the result of calling thunk.
+
+    """
+    check_argument_number('hash-table-update!', arguments, 3, 4)
+
+    table = arguments[0]
+    check_hash_table('hash-table-update!', table)
+
+    key = arguments[1]
+    function = arguments[2]
+    check_procedure('hash-table-update!', function)
+
+    hash_key = table.key_function(key)
+    entry = table.value.get(hash_key)
+
+    if entry is None:
+        if len(arguments) < 4:
+            raise InvalidArgument("hash-table-update!: no value for key %s."
+                                  % key.get_external_representation())
+
+        check_procedure('hash-table-update!', arguments[3])
+        current_value = apply_function(arguments[3], [], environment)
+    else:
+        current_value = entry[1]
+
+    table.value[hash_key] = (key, apply_function(function, [current_value], environment))
+    return Nil()
+
+
+@define_built_in('hash-table-update!/default', uses_environment=True)
+def hash_table_update_default(arguments, environment):
+    check_argument_number('hash-table-update!/default', arguments, 4, 4)
+
+    table = arguments[0]
+    check_hash_table('hash-table-update!/default', table)
+
+    key = arguments[1]
+    function = arguments[2]
+    check_procedure('hash-table-update!/default', function)
+
+    hash_key = table.key_function(key)
+    entry = table.value.get(hash_key)
+
+    if entry is None:
+        current_value = arguments[3]
+    else:
+        current_value = entry[1]
+
+    table.value[hash_key] = (key, apply_function(function, [current_value], environment))
+    return Nil()
+
+
+@define_built_in('hash-table-size')
+def hash_table_size(arguments):
+    check_argument_number('hash-table-size', arguments, 1, 1)
+    check_hash_table('hash-table-size', arguments[0])
+
+    return Integer(len(arguments[0]))
+
+
+@define_built_in('hash-table-keys')
+def hash_table_keys(arguments):
+    check_argument_number('hash-table-keys', arguments, 1, 1)
+    check_hash_table('hash-table-keys', arguments[0])
+
+    return Cons.from_list([key for (key, _) in arguments[0].value.values()])
+
+
+@define_built_in('hash-table-values')
+def hash_table_values(arguments):
+    check_argument_number('hash-table-values', arguments, 1, 1)
+    check_hash_table('hash-table-values', arguments[0])
+
+    return Cons.from_list([value for (_, value) in arguments[0].value.values()])
+
+
+@define_built_in('hash-table->alist')
+def hash_table_to_alist(arguments):
+    check_argument_number('hash-table->alist', arguments, 1, 1)
+    check_hash_table('hash-table->alist', arguments[0])
+
+    return Cons.from_list([Cons(key, value) for (key, value) in arguments[0].value.values()])
+
+
+@define_built_in('hash-table-walk', uses_environment=True)
+def hash_table_walk(arguments, environment):
+    """Call function on every key and value in the table."""
+    check_argument_number('hash-table-walk', arguments, 2, 2)
+
+    table = arguments[0]
+    check_hash_table('hash-table-walk', table)
+
+    function = arguments[1]
+    check_procedure('hash-table-walk', function)
+
+    # copy the entries, so function can modify the table
+    for (key, value) in list(table.value.values()):
+        apply_function(function, [key, value], environment)
+
+    return Nil()
@@ -0,0 +1,262 @@
+"""Promises and streams.
+
+delay and delay-force are primitives, since they don't evaluate their
+argument, and their promises are Promise objects (see data_types.py).
+
+A stream is either the empty list, or a pair whose cdr is a promise of
+the rest of the stream, as in SICP: (cons-stream a b) is (cons a (delay
+b)). The procedures here return streams built lazily, computing each
+element only when the stream is forced that far.
+
+A promise remembers its value once forced, so a stream we hold on to
+keeps every pair forced so far. To filter a long stream without doing
+that, the promises we make let go of the pair they continue from as
+soon as they start computing, and we walk along streams in a loop, so
+the pairs we've passed can be freed.
+
+"""
+from .base import define_built_in
+from ..immediates import is_false
+from ..utils import check_argument_number, check_procedure
+from ..data_types import Promise, Cons, Nil, Boolean, Integer
+from ..errors import SchemeTypeError, InvalidArgument
+from ..evaluator import apply_function
+
+
+@define_built_in('force')
+def force(arguments):
+    check_argument_number('force', arguments, 1, 1)
+
+    promise = arguments[0]
+
+    if not isinstance(promise, Promise):
+        # R7RS allows forcing a value that isn't a promise
+        return promise
+
+    return promise.force()
+
+
+@define_built_in('make-promise')
+def make_promise(arguments):
+    check_argument_number('make-promise', arguments, 1, 1)
+
+    if isinstance(arguments[0], Promise):
+        return arguments[0]
+
+    return Promise(value=arguments[0])
+
+
+@define_built_in('promise?')
+def is_promise(arguments):
+    check_argument_number('promise?', arguments, 1, 1)
+
+    return Boolean(isinstance(arguments[0], Promise))
+
+
+def is_stream_pair(stream):
+    return isinstance(stream, Cons) and isinstance(stream.tail, Promise)
+
+
+def check_stream(function_name, stream):
+    if not isinstance(stream, Nil) and not is_stream_pair(stream):
+        raise SchemeTypeError("%s requires a stream, but got a %s."
+                              % (function_name, stream.__class__))
+
+
+def check_stream_pair(function_name, stream):
+    if not is_stream_pair(stream):
+        raise SchemeTypeError("%s requires a non-empty stream, but got a %s."
+                              % (function_name, stream.__class__))
+
+
+def check_count(function_name, count):
+    if not isinstance(count, Integer):
+        raise SchemeTypeError("%s requires an integer count, but got a %s."
+                              % (function_name, count.__class__))
+
+    if count.value < 0:
+        raise InvalidArgument("%s requires a non-negative count, but got %s."
+                              % (function_name, count.value))
+
+
+def stream_cdr_of(function_name, stream):
+    rest = stream.tail.force()
+    check_stream(function_name, rest)
+
+    return rest
+
+
+def promise_of_rest(function, streams, *arguments):
+    """A promise of function applied to the rests of streams (a list),
+    and arguments. The promise doesn't refer to streams once it starts
+    computing, so the pairs it passes can be freed.
+
+    """
+    cursor = [streams]
+
+    def compute():
+        return function(cursor, *arguments)
+
+    return Promise(compute)
+
+
+@define_built_in('stream-pair?')
+def is_stream_pair_built_in(arguments):
+    check_argument_number('stream-pair?', arguments, 1, 1)
+
+    return Boolean(is_stream_pair(arguments[0]))
+
+
+@define_built_in('stream-null?')
+def is_stream_null(arguments):
+    check_argument_number('stream-null?', arguments, 1, 1)
+
+    return Boolean(isinstance(arguments[0], Nil))
+
+
+@define_built_in('stream-car')
+def stream_car(arguments):
+    check_argument_number('stream-car', arguments, 1, 1)
+
+    stream = arguments[0]
+    check_stream_pair('stream-car', stream)
+
+    return stream.head
+
+
+@define_built_in('stream-cdr')
+def stream_cdr(arguments):
+    check_argument_number('stream-cdr', arguments, 1, 1)
+
+    stream = arguments[0]
+    check_stream_pair('stream-cdr', stream)
+
+    return stream_cdr_of('stream-cdr', stream)
+
+
+def map_streams(function, streams, environment):
+    if not all(is_stream_pair(stream) for stream in streams):
+        # we stop at the end of the shortest stream
+        return Nil()
+
+    result = apply_function(function, [stream.head for stream in streams], environment)
+    return Cons(result, promise_of_rest(map_rest, streams, function, environment))
+
+
+def map_rest(cursor, function, environment):
+    streams = [stream_cdr_of('stream-map', stream) for stream in cursor.pop()]
+    return map_streams(function, streams, environment)
+
+
+@define_built_in('stream-map', uses_environment=True)
+def stream_map(arguments, environment):
+    check_argument_number('stream-map', arguments, 2)
+
+    function = arguments[0]
+    check_procedure('stream-map', function)
+
+    streams = list(arguments.tail)
+    for stream in streams:
+        check_stream('stream-map', stream)
+
+    return map_streams(function, streams, environment)
+
+
+def filter_stream(function, cursor, environment):
+    """Return the stream of the elements of the stream in cursor (a list
+    holding just that stream) that satisfy function. We take the stream
+    out of cursor and walk along it in this frame only, so nothing
+    holds the pair we started from, and the pairs we pass before the
+    next match can be freed.
+
+    """
+    stream = cursor.pop()
+
+    while is_stream_pair(stream):
+        if not is_false(apply_function(function, [stream.head], environment)):
+            return Cons(stream.head, promise_of_rest(filter_rest, [stream], function,
+                                                     environment))
+
+        stream = stream_cdr_of('stream-filter', stream)
+
+    return Nil()
+
+
+def filter_rest(cursor, function, environment):
+    # we replace the match in cursor with the pair after it, rather than
+    # keeping either in a local variable for the whole search
+    cursor.append(stream_cdr_of('stream-filter', cursor.pop()[0]))
+    return filter_stream(function, cursor, environment)
+
+
+@define_built_in('stream-filter', uses_environment=True)
+def stream_filter(arguments, environment):
+    check_argument_number('stream-filter', arguments, 2, 2)
+
+    function = arguments[0]
+    check_procedure('stream-filter', function)
+
+    check_stream('stream-filter', arguments[1])
+
+    return filter_stream(function, [arguments[1]], environment)
+
+
+def take_stream(count, stream):
+    if count == 0 or not is_stream_pair(stream):
+        return Nil()
+
+    return Cons(stream.head, promise_of_rest(take_rest, [stream], count - 1))
+
+
+def take_rest(cursor, count):
+    (stream,) = cursor.pop()
+
+    if count == 0:
+        # we don't force any more of the stream than we need
+        return Nil()
+
+    return take_stream(count, stream_cdr_of('stream-take', stream))
+
+
+@define_built_in('stream-take')
+def stream_take(arguments):
+    """Syntax: (stream-take <count> <stream>), as in SRFI-41."""
+    check_argument_number('stream-take', arguments, 2, 2)
+
+    count = arguments[0]
+    check_count('stream-take', count)
+
+    stream = arguments[1]
+    check_stream('stream-take', stream)
+
+    return take_stream(count.value, stream)
+
+
+@define_built_in('stream->list')
+def stream_to_list(arguments):
+    """Syntax: (stream->list [<count>] <stream>), as in SRFI-41. Without
+    a count, the stream must be finite.
+
+    """
+    check_argument_number('stream->list', arguments, 1, 2)
+
+    if len(arguments) == 2:
+        count = arguments[0]
+        check_count('stream->list', count)
+
+        count = count.value
+        stream = arguments[1]
+    else:
+        count = None
+        stream = arguments[0]
+
+    check_stream('stream->list', stream)
+
+    items = []
+    while is_stream_pair(stream) and len(items) != count:
+        items.append(stream.head)
+
+        if len(items) != count:
+            stream = stream_cdr_of('stream->list', stream)
+
+    return Cons.from_list(items)
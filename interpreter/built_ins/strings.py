@@ -1,5 +1,5 @@
 from .base import define_built_in
-from ..utils import check_argument_number
+from ..utils import check_argument_number, check_mutable
 
 from ..data_types import (Boolean, Character, String, Integer)
 from ..errors import SchemeTypeError, InvalidArgument
@@ -91,6 +91,8 @@ def string_set(arguments):
         raise SchemeTypeError("string-set! takes a string as its first argument, "
                               "not a %s." % string_atom.__class__)
 
+    check_mutable('string-set!', string_atom)
+
     char_index_atom = arguments[1]
     if not isinstance(char_index_atom, Integer):
         raise SchemeTypeError("string-set! takes an integer as its second argument, "
@@ -116,3 +118,63 @@ def string_set(arguments):
     string_atom.value = new_string
 
     return None
+
+
+@define_built_in('string-copy')
+def string_copy(arguments):
+    """(string-copy string [start [end]]) returns a new, mutable string.
+    String literals are constants, so this is how to get one we can
+    string-set!.
+
+    """
+    check_argument_number('string-copy', arguments, 1, 3)
+
+    string_atom = arguments[0]
+    if not isinstance(string_atom, String):
+        raise SchemeTypeError("string-copy takes a string as its first argument, "
+                              "not a %s." % string_atom.__class__)
+
+    string = string_atom.value
+    start = 0
+    end = len(string)
+
+    for index_atom in arguments.tail:
+        if not isinstance(index_atom, Integer):
+            raise SchemeTypeError("string-copy takes integer indexes, "
+                                  "not a %s." % index_atom.__class__)
+
+    if len(arguments) > 1:
+        start = arguments[1].value
+    if len(arguments) > 2:
+        end = arguments[2].value
+
+    if not 0 <= start <= end <= len(string):
+        raise InvalidArgument("string-copy: invalid range %d to %d for a string of "
+                              "length %d." % (start, end, len(string)))
+
+    return String(string[start:end])
+
+
+def define_string_comparison(function_name, comparison):
+    @define_built_in(function_name)
+    def string_comparison(arguments):
+        check_argument_number(function_name, arguments, 2)
+
+        for argument in arguments:
+            if not isinstance(argument, String):
+                raise SchemeTypeError("%s takes only string arguments, "
+                                      "got a %s." % (function_name, argument.__class__))
+
+        arguments = list(arguments)
+        for (first, second) in zip(arguments, arguments[1:]):
+            if not comparison(first.value, second.value):
+                return Boolean(False)
+
+        return Boolean(True)
+
+
+define_string_comparison('string=?', lambda x, y: x == y)
+define_string_comparison('string<?', lambda x, y: x < y)
+define_string_comparison('string>?', lambda x, y: x > y)
+define_string_comparison('string<=?', lambda x, y: x <= y)
+define_string_comparison('string>=?', lambda x, y: x >= y)
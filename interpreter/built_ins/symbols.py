@@ -0,0 +1,39 @@
+from .base import define_built_in
+from ..utils import check_argument_number
+from ..data_types import Symbol, String, Boolean
+from ..errors import SchemeTypeError
+
+
+@define_built_in('symbol?')
+def is_symbol(arguments):
+    check_argument_number('symbol?', arguments, 1, 1)
+
+    if isinstance(arguments[0], Symbol):
+        return Boolean(True)
+
+    return Boolean(False)
+
+
+@define_built_in('symbol->string')
+def symbol_to_string(arguments):
+    check_argument_number('symbol->string', arguments, 1, 1)
+
+    symbol = arguments[0]
+    if not isinstance(symbol, Symbol):
+        raise SchemeTypeError("symbol->string requires a symbol, "
+                              "you gave me a %s." % symbol.__class__)
+
+    return String(symbol.value)
+
+
+@define_built_in('string->symbol')
+def string_to_symbol(arguments):
+    check_argument_number('string->symbol', arguments, 1, 1)
+
+    string = arguments[0]
+    if not isinstance(string, String):
+        raise SchemeTypeError("string->symbol requires a string, "
+                              "you gave me a %s." % string.__class__)
+
+    # Symbol returns the interned symbol for this name
+    return Symbol(string.value)
@@ -0,0 +1,31 @@
+"""Time procedures from R7RS, for timing Scheme code."""
+import time
+
+from .base import define_built_in
+from ..utils import check_argument_number
+from ..data_types import Integer, FloatingPoint
+
+
+# a jiffy is a microsecond
+JIFFIES_PER_SECOND = 1000000
+
+
+@define_built_in('current-second')
+def current_second(arguments):
+    check_argument_number('current-second', arguments, 0, 0)
+
+    return FloatingPoint(time.time())
+
+
+@define_built_in('current-jiffy')
+def current_jiffy(arguments):
+    check_argument_number('current-jiffy', arguments, 0, 0)
+
+    return Integer(int(time.perf_counter() * JIFFIES_PER_SECOND))
+
+
+@define_built_in('jiffies-per-second')
+def jiffies_per_second(arguments):
+    check_argument_number('jiffies-per-second', arguments, 0, 0)
+
+    return Integer(JIFFIES_PER_SECOND)
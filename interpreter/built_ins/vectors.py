@@ -1,11 +1,42 @@
 from .base import define_built_in
-from ..utils import check_argument_number
-from ..data_types import Vector, Boolean, Nil, Integer
+from ..utils import check_argument_number, check_procedure, check_list, check_vector
+from ..data_types import Vector, Boolean, Nil, Integer, Cons
+from ..errors import SchemeTypeError, InvalidArgument
+from ..evaluator import apply_function
+
+
+def get_range(function_name, vector, arguments):
+    """Return the (start, end) given in arguments, defaulting to the
+    whole vector, and check they are valid indexes.
+
+    """
+    start = 0
+    end = len(vector.value)
+
+    if arguments:
+        start = arguments[0]
+        if not isinstance(start, Integer):
+            raise SchemeTypeError("%s requires an integer start index, "
+                                  "you gave me a %s." % (function_name, start.__class__))
+        start = start.value
+
+    if len(arguments) > 1:
+        end = arguments[1]
+        if not isinstance(end, Integer):
+            raise SchemeTypeError("%s requires an integer end index, "
+                                  "you gave me a %s." % (function_name, end.__class__))
+        end = end.value
+
+    if not 0 <= start <= end <= len(vector.value):
+        raise InvalidArgument("%s: invalid range %d to %d for a vector of length %d."
+                              % (function_name, start, end, len(vector.value)))
+
+    return (start, end)
 
 
 @define_built_in('vector?')
 def is_vector(arguments):
-    check_argument_number('make-vector', arguments, 1, 1)
+    check_argument_number('vector?', arguments, 1, 1)
 
     if isinstance(arguments[0], Vector):
         return Boolean(True)
@@ -17,18 +48,21 @@ def is_vector(arguments):
 def make_vector(arguments):
     check_argument_number('make-vector', arguments, 1, 2)
 
-    # todo: type check this is an integer
-    vector_length = arguments[0].value
-
-    vector = Vector(vector_length)
+    vector_length = arguments[0]
+    if not isinstance(vector_length, Integer) or vector_length.value < 0:
+        raise SchemeTypeError("make-vector requires a non-negative integer length, "
+                              "you gave me %s." % vector_length.get_external_representation())
 
     # If we're given an initialisation value, use it.
     if len(arguments) == 2:
-        init_value = arguments[1]
-        for i in range(vector_length):
-            vector[i] = init_value
-    
-    return vector
+        return Vector(vector_length.value, arguments[1])
+
+    return Vector(vector_length.value)
+
+
+@define_built_in('vector')
+def vector(arguments):
+    return Vector.from_list(list(arguments))
 
 
 @define_built_in('vector-ref')
@@ -62,3 +96,116 @@ def vector_length(arguments):
     vector = arguments[0]
 
     return Integer(len(vector))
+
+
+@define_built_in('vector->list')
+def vector_to_list(arguments):
+    check_argument_number('vector->list', arguments, 1, 3)
+
+    vector = arguments[0]
+    check_vector('vector->list', vector)
+    (start, end) = get_range('vector->list', vector, list(arguments.tail))
+
+    return Cons.from_list(vector.value[start:end])
+
+
+@define_built_in('list->vector')
+def list_to_vector(arguments):
+    check_argument_number('list->vector', arguments, 1, 1)
+
+    check_list('list->vector', arguments[0])
+
+    return Vector.from_list(list(arguments[0]))
+
+
+@define_built_in('vector-fill!')
+def vector_fill(arguments):
+    check_argument_number('vector-fill!', arguments, 2, 4)
+
+    vector = arguments[0]
+    check_vector('vector-fill!', vector)
+    (start, end) = get_range('vector-fill!', vector, list(arguments.tail.tail))
+
+    vector.value[start:end] = [arguments[1]] * (end - start)
+
+    return Nil()
+
+
+@define_built_in('vector-copy')
+def vector_copy(arguments):
+    check_argument_number('vector-copy', arguments, 1, 3)
+
+    vector = arguments[0]
+    check_vector('vector-copy', vector)
+    (start, end) = get_range('vector-copy', vector, list(arguments.tail))
+
+    return Vector.from_list(vector.value[start:end])
+
+
+@define_built_in('subvector')
+def subvector(arguments):
+    check_argument_number('subvector', arguments, 3, 3)
+
+    vector = arguments[0]
+    check_vector('subvector', vector)
+    (start, end) = get_range('subvector', vector, list(arguments.tail))
+
+    return Vector.from_list(vector.value[start:end])
+
+
+@define_built_in('vector-grow')
+def vector_grow(arguments):
+    check_argument_number('vector-grow', arguments, 2, 2)
+
+    vector = arguments[0]
+    check_vector('vector-grow', vector)
+
+    new_length = arguments[1]
+    if not isinstance(new_length, Integer) or new_length.value < len(vector.value):
+        raise InvalidArgument("vector-grow requires a length of at least %d, "
+                              "you gave me %s." % (len(vector.value),
+                                                   new_length.get_external_representation()))
+
+    new_vector = Vector(new_length.value)
+    new_vector.value[:len(vector.value)] = vector.value
+
+    return new_vector
+
+
+def vector_rows(function_name, vectors):
+    """Return an iterator over tuples of the i-th elements of vectors,
+    for each index up to the length of the shortest vector.
+
+    """
+    for vector in vectors:
+        check_vector(function_name, vector)
+
+    return zip(*[vector.value for vector in vectors])
+
+
+@define_built_in('vector-map', uses_environment=True)
+def vector_map(arguments, environment):
+    check_argument_number('vector-map', arguments, 2)
+
+    function = arguments[0]
+    check_procedure('vector-map', function)
+
+    rows = vector_rows('vector-map', list(arguments.tail))
+
+    return Vector.from_list([apply_function(function, list(row), environment)
+                             for row in rows])
+
+
+@define_built_in('vector-for-each', uses_environment=True)
+def vector_for_each(arguments, environment):
+    check_argument_number('vector-for-each', arguments, 2)
+
+    function = arguments[0]
+    check_procedure('vector-for-each', function)
+
+    rows = vector_rows('vector-for-each', list(arguments.tail))
+
+    for row in rows:
+        apply_function(function, list(row), environment)
+
+    return Nil()
@@ -0,0 +1,336 @@
+"""Static checking of arity and bindings.
+
+When enabled, we check each program before running any of it, and
+report every unbound variable and every call with the wrong number of
+arguments to a function whose arity we know. These are the functions
+the program defines at the top level, including record constructors,
+predicates, accessors and modifiers, and user functions that are
+already defined.
+
+Variables are dynamically scoped, so a function body may use a
+variable that's bound by whoever calls it. We can't tell which
+variables that will be, so an unbound variable in a function body is
+only a warning, printed to stderr. Elsewhere it's an error.
+
+We also rewrite calls in each function body as it's defined. A call
+to a user function with a fixed number of parameters, where we can see
+the call passes that many arguments, becomes a CheckedCall. A
+CheckedCall calls the function without checking its arguments again.
+The name may be rebound, so a CheckedCall checks it's still bound to
+the function it expects. If it isn't, the call checks the new function
+before using it.
+
+Macros are expanded when they're called, so we don't check their
+arguments.
+
+"""
+import sys
+
+from .data_types import Symbol, Cons, UserFunction
+from .errors import SchemeArityError, UndefinedVariable
+from .utils import check_argument_number
+from .walker import CodeWalker, CompiledExpression, external_representation
+
+
+# whether we check programs before running them, and skip runtime
+# arity checks for calls we've checked
+enabled = False
+
+# symbols are interned, so this is the same symbol as primitives.DOT
+DOT = Symbol('.')
+
+
+class CheckedCall(CompiledExpression):
+    """A call to the user function bound to name, with the right number
+    of arguments for function.
+
+    """
+    __slots__ = ('name', 'function', 'arguments', 'call')
+
+    def __init__(self, name, function, arguments, call):
+        self.name = name
+        self.function = function
+        self.arguments = arguments
+        self.call = call
+
+    def evaluate(self, environment):
+        function = environment.get(self.name)
+
+        if function is not self.function:
+            if (function.__class__ is not UserFunction or function.unchecked is None or
+                    len(function.parameters) != len(self.arguments)):
+                # an ordinary call, which checks its arguments
+                return eval_s_expression(self.call, environment)
+
+            self.function = function
+
+        return function.unchecked(self.arguments, environment)
+
+    def subexpressions(self):
+        return list(self.arguments)
+
+    def get_external_representation(self):
+        return external_representation(self.call)
+
+
+def parameter_arity(parameters):
+    """The (minimum, maximum) number of arguments a function with these
+    parameters takes. maximum is None for a variadic function.
+
+    """
+    parameters = list(parameters)
+
+    if DOT in parameters:
+        return (parameters.index(DOT), None)
+
+    return (len(parameters), len(parameters))
+
+
+def is_function_definition(s_expression):
+    return (isinstance(s_expression, Cons) and s_expression.head is Symbol('define') and
+            isinstance(s_expression.tail, Cons) and isinstance(s_expression[1], Cons))
+
+
+def collect_definitions(s_expressions):
+    """Find the names defined at the top level of a program. Returns a
+    tuple (definitions, macros), where definitions maps each name to
+    its arity, or to None if it isn't a function we know the arity of.
+
+    """
+    definitions = {}
+    macros = set()
+
+    for s_expression in s_expressions:
+        if not isinstance(s_expression, Cons) or not isinstance(s_expression.head, Symbol):
+            continue
+
+        form = s_expression.head.value
+        arguments = list(s_expression.tail)
+
+        try:
+            if form == 'define' and isinstance(arguments[0], Symbol):
+                definitions[arguments[0].value] = None
+
+            elif form in ('define', 'define-memoized', 'define-memoized/options'):
+                definitions[arguments[0].head.value] = parameter_arity(arguments[0].tail)
+
+            elif form == 'defmacro':
+                macros.add(arguments[0].value)
+
+            elif form == 'define-record-type':
+                definitions[arguments[0].value] = None
+                field_specs = arguments[3:]
+
+                constructor = arguments[1]
+                if isinstance(constructor, Symbol):
+                    definitions[constructor.value] = (len(field_specs), len(field_specs))
+                else:
+                    definitions[constructor.head.value] = parameter_arity(constructor.tail)
+
+                definitions[arguments[2].value] = (1, 1)
+
+                for field_spec in field_specs:
+                    definitions[field_spec[1].value] = (1, 1)
+
+                    if len(field_spec) == 3:
+                        definitions[field_spec[2].value] = (2, 2)
+
+        except (IndexError, AttributeError, TypeError):
+            # a malformed form, which we leave for the evaluator to
+            # report when it's run
+            pass
+
+    return (definitions, macros)
+
+
+class Checker(CodeWalker):
+    """Find unbound variables and calls with the wrong number of
+    arguments in a program, before it's run.
+
+    """
+    def __init__(self, environment, definitions, macros):
+        super().__init__(environment)
+
+        self.definitions = definitions
+        self.macros = macros
+
+        # a list of (error_class, message) pairs
+        self.problems = []
+        self.warnings = []
+
+        # how many function bodies we're inside
+        self.function_depth = 0
+
+    def report(self, error_class, message):
+        if (error_class, message) not in self.problems:
+            self.problems.append((error_class, message))
+
+    def warn(self, message):
+        if message not in self.warnings:
+            self.warnings.append(message)
+
+    def walk_function_body(self, body, scope):
+        self.function_depth += 1
+        try:
+            return self.walk_body(body, scope)
+        finally:
+            self.function_depth -= 1
+
+    def is_macro(self, name):
+        return name in self.macros or super().is_macro(name)
+
+    def is_bound(self, name, scope):
+        if name in scope or name in self.definitions or name in self.macros:
+            return True
+
+        # look the name up as the evaluator would
+        try:
+            eval_symbol(name, self.environment)
+        except UndefinedVariable:
+            return False
+
+        return True
+
+    def arity(self, name, scope):
+        if name in scope:
+            return None
+
+        if name in self.definitions:
+            return self.definitions[name]
+
+        function = self.environment.get(name)
+        if isinstance(function, UserFunction) and function.parameters is not None:
+            return (len(function.parameters), len(function.parameters))
+
+        return None
+
+    def walk_symbol(self, symbol, scope):
+        if not self.is_bound(symbol.value, scope):
+            if self.function_depth:
+                # the function's caller may bind it
+                self.warn("%s is not defined, so it must be bound by "
+                          "the caller." % symbol.value)
+            else:
+                self.report(UndefinedVariable, "%s has not been defined." % symbol.value)
+
+        return (symbol, None)
+
+    def walk_special_form(self, name, s_expression, scope):
+        defines_function = name == 'lambda' or (
+            name == 'define' and isinstance(s_expression.tail, Cons) and
+            isinstance(s_expression.tail.head, Cons))
+
+        if not defines_function:
+            return super().walk_special_form(name, s_expression, scope)
+
+        self.function_depth += 1
+        try:
+            return super().walk_special_form(name, s_expression, scope)
+        finally:
+            self.function_depth -= 1
+
+    def walk_call(self, s_expression, scope):
+        result = super().walk_call(s_expression, scope)
+
+        head = s_expression.head
+        if isinstance(head, Symbol):
+            arity = self.arity(head.value, scope)
+
+            if arity is not None:
+                try:
+                    check_argument_number(head.value, s_expression.tail, *arity)
+                except SchemeArityError as e:
+                    self.report(SchemeArityError, e.message)
+
+        return result
+
+
+def check_program(s_expressions, environment):
+    """If the program has unbound variables or calls with the wrong
+    number of arguments, raise an error listing every one. The error
+    has the class of the first problem, UndefinedVariable or
+    SchemeArityError. Unbound variables in function bodies are printed
+    as warnings instead.
+
+    """
+    (definitions, macros) = collect_definitions(s_expressions)
+    checker = Checker(environment, definitions, macros)
+
+    for s_expression in s_expressions:
+        if is_function_definition(s_expression):
+            # the function's own name is global, so we check calls to
+            # it too
+            scope = {parameter.value: None for parameter in s_expression[1].tail}
+            checker.walk_function_body(s_expression.tail.tail, scope)
+        else:
+            checker.walk(s_expression, {})
+
+    for message in checker.warnings:
+        print("Warning: %s" % message, file=sys.stderr)
+
+    if checker.problems:
+        (error_class, _) = checker.problems[0]
+        raise error_class("\n".join(message for (_, message) in checker.problems))
+
+
+class CallChecker(CodeWalker):
+    """Rewrite the body of a function, replacing the calls we know pass
+    the right number of arguments with CheckedCalls.
+
+    """
+    def __init__(self, function_name, parameters, environment):
+        super().__init__(environment)
+
+        self.function_name = function_name
+        self.parameters = list(parameters)
+
+        self.count = 0
+
+    def walk_call(self, s_expression, scope):
+        elements = [self.walk(element, scope)[0] for element in s_expression]
+        call = Cons.from_list(elements)
+
+        head = s_expression.head
+        if not isinstance(head, Symbol) or head.value in scope:
+            return (call, None)
+
+        arguments = call.tail
+        function = self.environment.get(head.value)
+
+        if isinstance(function, UserFunction) and function.unchecked is not None:
+            if len(function.parameters) != len(arguments):
+                # leave the error for the call to report
+                return (call, None)
+
+        elif head is self.function_name and DOT not in self.parameters:
+            # a recursive call, to the function we're defining
+            if len(self.parameters) != len(arguments):
+                return (call, None)
+
+            function = None
+
+        else:
+            return (call, None)
+
+        self.count += 1
+        return (CheckedCall(head.value, function, arguments, call), None)
+
+
+def check_function(function_name, parameters, body, environment):
+    """Return body with calls we know have the right number of arguments
+    replaced by CheckedCalls, or body unchanged if there are none.
+
+    """
+    call_checker = CallChecker(function_name, parameters, environment)
+
+    scope = {parameter.value: None for parameter in parameters}
+    (new_body, _) = call_checker.walk_body(body, scope)
+
+    if not call_checker.count:
+        return body
+
+    return Cons.from_list(new_body)
+
+
+# this import has to be at the end to avoid circular import issues
+from .evaluator import eval_s_expression, eval_symbol
@@ -1,9 +1,16 @@
+import collections
 from collections import Sequence
-from .errors import CircularList
+
+import numpy
+
+from .errors import CircularList, SchemeTypeError, InvalidArgument
 
 
 class Atom(object):
     """An abstract class for every base type in Scheme."""
+    # literals in the program text are frozen (and shared) when they're read
+    frozen = False
+
     def __init__(self, value):
         self.value = value
 
@@ -16,8 +23,44 @@ class Atom(object):
 
         return False
 
+    def __hash__(self):
+        # consistent with __eq__, so atoms can be dict keys
+        return hash((self.__class__, self.value))
+
 
 class Symbol(Atom):
+    """Symbols are interned: Symbol(name) always returns the same object
+    for the same name, so symbols compare by identity.
+
+    """
+    # maps every name we've seen to its symbol
+    table = {}
+
+    def __new__(cls, value):
+        symbol = cls.table.get(value)
+
+        if symbol is None:
+            symbol = super(Symbol, cls).__new__(cls)
+            symbol.value = value
+            cls.table[value] = symbol
+
+        return symbol
+
+    def __init__(self, value):
+        # __new__ has already set the value
+        pass
+
+    def __eq__(self, other):
+        return self is other
+
+    __hash__ = object.__hash__
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def get_external_representation(self):
         return self.value
 
@@ -30,6 +73,11 @@ class Number(Atom):
 
         return False
 
+    def __hash__(self):
+        # Python guarantees hash(1) == hash(1.0), so this is
+        # consistent with __eq__
+        return hash(self.value)
+
     def get_external_representation(self):
         return str(self.value)
 
@@ -37,6 +85,13 @@ class Number(Atom):
 class Integer(Number):
     pass
 
+class Rational(Number):
+    """An exact fraction, held as a fractions.Fraction. Arithmetic only
+    produces these for non-integers, so the denominator is never 1.
+
+    """
+    pass
+
 class FloatingPoint(Number):
     pass
 
@@ -62,14 +117,17 @@ class String(Atom):
 
 
 class Cons(Sequence):
+    # quoted lists in the program text are frozen when they're read
+    frozen = False
+
     @staticmethod
     def from_list(python_list):
-        if not python_list:
-            return Nil()
-        else:
-            head = python_list[0]
-            tail = Cons.from_list(python_list[1:])
-            return Cons(head, tail)
+        # build the list from the end, so we don't recurse
+        linked_list = Nil()
+        for item in reversed(python_list):
+            linked_list = Cons(item, linked_list)
+
+        return linked_list
 
     def __init__(self, head, tail=None):
         self.head = head
@@ -106,27 +164,26 @@ class Cons(Sequence):
                 return length + 1
 
     def is_circular(self):
-        tail = self.tail
-        seen_elements = set()
+        """Floyd's cycle detection: if the list is circular, a pointer
+        moving two elements at a time will eventually meet a pointer
+        moving one at a time. This uses constant space.
+
+        """
+        slow = self
+        fast = self
 
         while True:
-            if id(tail) in seen_elements:
-                return True
-            else:
-                # We can't hash our list items, but we're only
-                # interested in checking if it's an item we've seen
-                # before. Using id() is sufficient.
-                seen_elements.add(id(tail))
+            for _ in range(2):
+                fast = fast.tail
 
-            if isinstance(tail, Nil):
-                # Reached the end of the list.
-                return False
-            elif isinstance(tail, Cons):
-                # Not yet at the end of the list.
-                tail = tail.tail
-            else:
-                # At the end of an improper list.
-                return False
+                if not isinstance(fast, Cons):
+                    # Reached the end of a (possibly improper) list.
+                    return False
+
+            slow = slow.tail
+
+            if fast is slow:
+                return True
 
     def is_proper(self):
         """Does this list end with a Nil?"""
@@ -146,6 +203,15 @@ class Cons(Sequence):
                 # At the end of an improper list.
                 return False
                 
+    def __iter__(self):
+        # Sequence would index from the start of the list for every
+        # element, which is quadratic, so we walk the list instead.
+        element = self
+
+        while isinstance(element, Cons):
+            yield element.head
+            element = element.tail
+
     def __getitem__(self, index):
         if index == 0:
             return self.head
@@ -208,6 +274,8 @@ class Cons(Sequence):
 
 
 class Nil(Sequence):
+    frozen = False
+
     def is_circular(self):
         return False
 
@@ -236,14 +304,19 @@ class Nil(Sequence):
             return True
         return False
 
+    def __hash__(self):
+        return hash(Nil)
+
     def get_external_representation(self):
         return "()"
 
 class Vector(Sequence):
-    def __init__(self, length):
-        self.value = []
-        for index in range(length):
-            self.value.append(Nil())
+    def __init__(self, length, fill=None):
+        if fill is None:
+            fill = Nil()
+
+        # every slot refers to the same fill object, as in Scheme
+        self.value = [fill] * length
 
     def __getitem__(self, index):
         return self.value[index]
@@ -267,14 +340,449 @@ class Vector(Sequence):
 
     @classmethod
     def from_list(cls, values):
-        vector = Vector(len(values))
+        vector = Vector(0)
         vector.value = values
 
         return vector
 
 
-"""Function classes. These are currently only used in order to add an
-external representation.
+class NumericVector(Sequence):
+    """A vector of numbers that all have the same type, as in SRFI-4
+    (f64vector, s64vector, u8vector and so on). The numbers are stored
+    unboxed in a NumPy array, so whole-vector operations run natively.
+
+    """
+    # the SRFI-4 tag for each type, and the NumPy type we store it as
+    element_types = {
+        's8': numpy.int8, 'u8': numpy.uint8,
+        's16': numpy.int16, 'u16': numpy.uint16,
+        's32': numpy.int32, 'u32': numpy.uint32,
+        's64': numpy.int64, 'u64': numpy.uint64,
+        'f32': numpy.float32, 'f64': numpy.float64,
+    }
+
+    def __init__(self, tag, array):
+        self.tag = tag
+        self.value = array
+
+    @classmethod
+    def tag_for(cls, array):
+        """Return the tag for the type of array's elements, or None if
+        it isn't a type we support.
+
+        """
+        for (tag, element_type) in cls.element_types.items():
+            if array.dtype == element_type:
+                return tag
+
+        return None
+
+    @classmethod
+    def from_array(cls, array):
+        """Wrap a NumPy array (without copying it), converting to f64 if
+        its type isn't one we support.
+
+        """
+        tag = cls.tag_for(array)
+
+        if tag is None:
+            return NumericVector('f64', array.astype(numpy.float64))
+
+        return NumericVector(tag, array)
+
+    @classmethod
+    def check_element(cls, tag, number):
+        """Raise an error if number can't be stored in a vector of this
+        tag.
+
+        """
+        if not isinstance(number, Number) or \
+           (not isinstance(number, Integer) and not tag.startswith('f')):
+            raise SchemeTypeError("Can't store %s in a %svector."
+                                  % (number.get_external_representation(), tag))
+
+        if not tag.startswith('f'):
+            limits = numpy.iinfo(cls.element_types[tag])
+
+            if not limits.min <= number.value <= limits.max:
+                raise InvalidArgument("%s is out of range for a %svector."
+                                      % (number.get_external_representation(), tag))
+
+    def is_floating_point(self):
+        return self.tag.startswith('f')
+
+    def box(self, number):
+        """Convert a NumPy number from our array to an atom."""
+        if self.is_floating_point():
+            return FloatingPoint(float(number))
+
+        return Integer(int(number))
+
+    def __getitem__(self, index):
+        return self.box(self.value[index])
+
+    def __setitem__(self, index, new_value):
+        NumericVector.check_element(self.tag, new_value)
+        self.value[index] = new_value.value
+
+    def __len__(self):
+        return len(self.value)
+
+    def __eq__(self, other):
+        if isinstance(other, NumericVector) and self.tag == other.tag and \
+           numpy.array_equal(self.value, other.value):
+            return True
+
+        return False
+
+    def get_external_representation(self):
+        item_reprs = [self.box(number).get_external_representation()
+                      for number in self.value]
+        return "#%s(%s)" % (self.tag, " ".join(item_reprs))
+
+
+class Array(object):
+    """A numeric array with two or more dimensions, stored row-major in
+    a NumPy array. Elements have a single type, with the same tags as
+    NumericVector.
+
+    """
+    def __init__(self, tag, array):
+        self.tag = tag
+        self.value = array
+
+    @classmethod
+    def from_array(cls, array):
+        """Wrap a NumPy array (without copying it), converting to f64 if
+        its type isn't one we support.
+
+        """
+        tag = NumericVector.tag_for(array)
+
+        if tag is None:
+            return Array('f64', array.astype(numpy.float64))
+
+        return Array(tag, array)
+
+    def box(self, number):
+        """Convert a NumPy number from our array to an atom."""
+        if self.tag.startswith('f'):
+            return FloatingPoint(float(number))
+
+        return Integer(int(number))
+
+    def __eq__(self, other):
+        if isinstance(other, Array) and self.tag == other.tag and \
+           numpy.array_equal(self.value, other.value):
+            return True
+
+        return False
+
+    def get_external_representation(self):
+        def nested_representation(array):
+            if array.ndim == 0:
+                return self.box(array).get_external_representation()
+
+            return "(%s)" % " ".join(nested_representation(row) for row in array)
+
+        return "#%da%s" % (self.value.ndim, nested_representation(self.value))
+
+
+class Bytevector(Sequence):
+    """A vector of bytes. The storage is a bytearray, a memoryview (for
+    slices that share storage with another bytevector) or a mmap (for
+    bytevectors loaded from files).
+
+    """
+    def __init__(self, storage):
+        self.value = storage
+
+    def __getitem__(self, index):
+        return Integer(self.value[index])
+
+    def __setitem__(self, index, new_value):
+        self.value[index] = new_value.value
+
+    def __len__(self):
+        return len(self.value)
+
+    def __eq__(self, other):
+        if isinstance(other, Bytevector) and \
+           memoryview(self.value) == memoryview(other.value):
+            return True
+
+        return False
+
+    def get_external_representation(self):
+        return "#u8(%s)" % " ".join(str(byte) for byte in memoryview(self.value))
+
+
+class HashTable(object):
+    """A hash table, as in SRFI-69. Scheme values aren't all hashable
+    (lists and vectors are mutable), so we store each entry under a
+    hashable key computed by key_function, which must be consistent
+    with the table's equivalence.
+
+    """
+    def __init__(self, equivalence_name, key_function):
+        self.equivalence_name = equivalence_name
+        self.key_function = key_function
+
+        # dict of hashable key to (Scheme key, Scheme value)
+        self.value = {}
+
+    def __len__(self):
+        return len(self.value)
+
+    def get_external_representation(self):
+        return "#<hash-table %s %d>" % (self.equivalence_name, len(self.value))
+
+
+class PersistentMap(object):
+    """An immutable map, stored in a HashTrie. As with HashTable, each
+    entry is stored under a hashable key consistent with equal?, and
+    holds (Scheme key, Scheme value).
+
+    """
+    def __init__(self, trie):
+        self.value = trie
+
+    def __len__(self):
+        return len(self.value)
+
+    def __eq__(self, other):
+        if not isinstance(other, PersistentMap) or len(self.value) != len(other.value):
+            return False
+
+        for (hash_key, (_, value)) in self.value.items():
+            other_entry = other.value.get(hash_key)
+
+            if other_entry is None or not other_entry[1] == value:
+                return False
+
+        return True
+
+    def get_external_representation(self):
+        entry_reprs = [Cons(key, value).get_external_representation()
+                       for (_, (key, value)) in self.value.items()]
+        return "#map(%s)" % " ".join(entry_reprs)
+
+
+class PersistentSet(object):
+    """An immutable set, stored in a HashTrie from a hashable key
+    consistent with equal? to the Scheme value.
+
+    """
+    def __init__(self, trie):
+        self.value = trie
+
+    def __len__(self):
+        return len(self.value)
+
+    def __eq__(self, other):
+        if not isinstance(other, PersistentSet) or len(self.value) != len(other.value):
+            return False
+
+        return all(hash_key in other.value for (hash_key, _) in self.value.items())
+
+    def get_external_representation(self):
+        item_reprs = [item.get_external_representation() for (_, item) in self.value.items()]
+        return "#set(%s)" % " ".join(item_reprs)
+
+
+class PersistentVector(Sequence):
+    """An immutable vector, stored in a VectorTrie."""
+    def __init__(self, trie):
+        self.value = trie
+
+    def __getitem__(self, index):
+        return self.value[index]
+
+    def __len__(self):
+        return len(self.value)
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __eq__(self, other):
+        if isinstance(other, PersistentVector) and len(self.value) == len(other.value) and \
+           all(item == other_item for (item, other_item) in zip(self.value, other.value)):
+            return True
+
+        return False
+
+    def get_external_representation(self):
+        item_reprs = [item.get_external_representation() for item in self.value]
+        return "#pvector(%s)" % " ".join(item_reprs)
+
+
+class Transient(object):
+    """A mutable builder for a persistent map, set or vector."""
+    def __init__(self, kind, builder):
+        self.kind = kind
+        self.value = builder
+
+    def get_external_representation(self):
+        return "#<transient %s %d>" % (self.kind, len(self.value))
+
+
+class Deque(object):
+    """A double-ended queue, stored in a collections.deque."""
+    def __init__(self, items=()):
+        self.value = collections.deque(items)
+
+    def __len__(self):
+        return len(self.value)
+
+    def get_external_representation(self):
+        item_reprs = [item.get_external_representation() for item in self.value]
+        return "#<deque%s>" % "".join(" " + item_repr for item_repr in item_reprs)
+
+
+class GrowableVector(object):
+    """A vector that can grow, with amortized O(1) appends. The storage
+    is a Python list.
+
+    """
+    def __init__(self, items=()):
+        self.value = list(items)
+
+    def __len__(self):
+        return len(self.value)
+
+    def get_external_representation(self):
+        item_reprs = [item.get_external_representation() for item in self.value]
+        return "#<gvector%s>" % "".join(" " + item_repr for item_repr in item_reprs)
+
+
+class PriorityQueue(object):
+    """A min-heap of items, ordered by the result of calling key on
+    each item (or by the items themselves, if key is None). The heap is
+    a list of (key value, insertion number, item), so items with equal
+    keys come out in the order they were added.
+
+    """
+    def __init__(self, key=None):
+        self.key = key
+        self.value = []
+        self.insertions = 0
+
+    def __len__(self):
+        return len(self.value)
+
+    def get_external_representation(self):
+        return "#<priority-queue %d>" % len(self.value)
+
+
+class Bitset(object):
+    """A set of non-negative integers, stored as the bits of a Python
+    int: n is in the set if bit n is set. Set operations are then
+    single bitwise operations on the whole int.
+
+    """
+    def __init__(self, bits=0):
+        self.value = bits
+
+    def __len__(self):
+        return bit_count(self.value)
+
+    def members(self):
+        """The members of this set, in increasing order."""
+        # reading the binary digits is linear, whereas repeatedly
+        # clearing the lowest bit would copy the int each time
+        binary_digits = bin(self.value)[:1:-1]
+        return [index for (index, digit) in enumerate(binary_digits) if digit == '1']
+
+    def get_external_representation(self):
+        return "#<bitset%s>" % "".join(" %d" % member for member in self.members())
+
+
+def bit_count(bits):
+    """The number of 1 bits in a non-negative int."""
+    if hasattr(bits, 'bit_count'):
+        # Python 3.10 and later
+        return bits.bit_count()
+
+    return bin(bits).count('1')
+
+
+class Promise(object):
+    """A value computed when it's first forced, then remembered.
+
+    state is a list [done, value, lazy]. Until the promise is done,
+    value is a Python function that computes it. If lazy (from
+    delay-force), the function returns another promise, and forcing
+    this one forces that. We do this iteratively, as in R7RS: we copy
+    the other promise's state into ours and then share it, so a long
+    chain of delay-forces runs in constant stack and the promises we've
+    passed through can be freed.
+
+    """
+    def __init__(self, compute=None, value=None, lazy=False):
+        if compute is None:
+            self.state = [True, value, False]
+        else:
+            self.state = [False, compute, lazy]
+
+    def is_done(self):
+        return self.state[0]
+
+    def force(self):
+        while not self.state[0]:
+            (_, compute, lazy) = self.state
+            result = compute()
+
+            if self.state[0]:
+                # computing our value forced us, so we keep the value
+                # that was computed first
+                break
+
+            if lazy:
+                self.state[:] = result.state
+                result.state = self.state
+            else:
+                self.state[:] = [True, result, False]
+
+        return self.state[1]
+
+    def get_external_representation(self):
+        return "#<promise>"
+
+
+class RecordType(object):
+    """A record type made by define-record-type. Each record type has
+    its own Python class, with one slot per field, so a record is a
+    single compact object and reading a field is a slot read.
+
+    """
+    def __init__(self, name, field_names):
+        self.name = name
+        self.field_names = field_names
+
+        # slot names must be Python identifiers, so we number them
+        slots = tuple("field%d" % index for index in range(len(field_names)))
+        self.record_class = type("Record", (Record,),
+                                 {'__slots__': slots, 'record_type': self})
+
+        # the slot descriptors, in the same order as field_names
+        self.slots = [self.record_class.__dict__[slot] for slot in slots]
+
+    def get_external_representation(self):
+        return "#<record-type %s>" % self.name.strip("<>")
+
+
+class Record(object):
+    __slots__ = ()
+
+    def get_external_representation(self):
+        field_reprs = ["%s=%s" % (field_name, slot.__get__(self).get_external_representation())
+                       for (field_name, slot) in zip(self.record_type.field_names,
+                                                     self.record_type.slots)]
+        return "#<%s>" % " ".join([self.record_type.name.strip("<>")] + field_reprs)
+
+
+"""Function classes. These add an external representation, and let the
+optimisation passes recognise what a name is bound to.
 
 """
 
@@ -298,6 +806,17 @@ class PrimitiveFunction(Function):
 
 
 class UserFunction(Function):
+    def __init__(self, func, name, parameters=None, body=None, unchecked=None):
+        super().__init__(func, name)
+
+        # the source of a function with a fixed number of parameters,
+        # which the inliner may substitute at call sites
+        self.parameters = parameters
+        self.body = body
+
+        # the same function, without checking the number of arguments
+        self.unchecked = unchecked
+
     def get_external_representation(self):
         return "#<user function %s>" % self.name
     
@@ -308,3 +827,15 @@ class LambdaFunction(Function):
 
     def get_external_representation(self):
         return "#<anonymous function>"
+
+
+class MemoizedFunction(Function):
+    def __init__(self, func, name, memoized, cache):
+        super().__init__(func, name)
+
+        # the function whose results we cache, and its cache
+        self.memoized = memoized
+        self.cache = cache
+
+    def get_external_representation(self):
+        return "#<memoized function %s>" % self.name
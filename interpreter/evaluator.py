@@ -1,27 +1,55 @@
 from .scheme_parser import parser
-from .data_types import Atom, Symbol, BuiltInFunction
+from .data_types import Atom, Symbol, Cons, BuiltInFunction
+from . import immediates
+from .immediates import box, unbox, UNBOXED_TYPES, BOXED_TYPES
+from .walker import CompiledExpression, external_representation
 from .errors import (UndefinedVariable, SchemeTypeError, SchemeStackOverflow,
                     SchemeSyntaxError)
-from .built_ins import built_ins
-from copy import deepcopy
 
-def load_built_ins(environment):
+# a built-in differs from primitives: it always has all its arguments evaluated
+# it also doesn't usually need the global scope, so we don't pass it for code brevity
+def arguments_evaluated(function, uses_environment=False, unboxed_function=None):
+    """Wrap function so it's called with its arguments evaluated.
+
+    When evaluating unboxed, we call unboxed_function (if given) with a
+    Python list of the raw arguments. Otherwise we box the arguments
+    for function and unbox its result.
+
+    """
+    def decorated_function(arguments, _environment):
+        # evaluate the arguments into a new list (so we don't
+        # modify the program), then pass them to the function
+        evaluated_arguments = []
+        for argument in arguments:
+            (result, _environment) = eval_s_expression(argument, _environment)
+            evaluated_arguments.append(result)
+
+        if immediates.unboxed:
+            if unboxed_function is not None:
+                return (unboxed_function(evaluated_arguments), _environment)
+
+            boxed_arguments = Cons.from_list([box(argument) for argument in evaluated_arguments])
 
-    # a built-in differs from primitives: it always has all its arguments evaluated
-    # it also doesn't need the global scope, so we don't pass it for code brevity
-    def arguments_evaluated(function):
-        def decorated_function(arguments, _environment):
-            arguments = deepcopy(arguments)
-            # evaluate the arguments, then pass them to the function
-            for i in range(len(arguments)):
-                (arguments[i], _environment) = eval_s_expression(arguments[i], _environment)
+            if uses_environment:
+                return (unbox(function(boxed_arguments, _environment)), _environment)
 
-            return (function(arguments), _environment)
+            return (unbox(function(boxed_arguments)), _environment)
 
-        return decorated_function
+        if uses_environment:
+            return (function(Cons.from_list(evaluated_arguments), _environment),
+                    _environment)
 
+        return (function(Cons.from_list(evaluated_arguments)), _environment)
+
+    return decorated_function
+
+
+def load_built_ins(environment):
     for (function_name, function) in built_ins.items():
-        built_in_function = BuiltInFunction(arguments_evaluated(function),
+        uses_environment = function_name in built_ins_using_environment
+        unboxed_function = unboxed_built_ins.get(function_name)
+        built_in_function = BuiltInFunction(arguments_evaluated(function, uses_environment,
+                                                                unboxed_function),
                                             function_name)
         
         environment[function_name] = built_in_function
@@ -49,17 +77,29 @@ def eval_program(program, initial_environment):
     if not s_expressions:
         return (None, environment)
 
+    if check.enabled:
+        # report problems before we run anything
+        check.check_program(s_expressions, environment)
+
     result = None
 
     for s_expression in s_expressions:
         result, environment = eval_s_expression(s_expression, environment)
 
+    if immediates.unboxed and result is not None:
+        result = box(result)
+
     return (result, environment)
 
 
 def eval_s_expression(s_expression, environment):
     if isinstance(s_expression, Atom):
         return eval_atom(s_expression, environment)
+    elif s_expression.__class__ in UNBOXED_TYPES:
+        # a raw value, e.g. from a macro expansion, evaluates to itself
+        return (s_expression, environment)
+    elif isinstance(s_expression, CompiledExpression):
+        return s_expression.evaluate(environment)
     else:
         try:
             return eval_list(s_expression, environment)
@@ -70,6 +110,16 @@ def eval_s_expression(s_expression, environment):
                 raise e
 
 
+def check_callable(function):
+    """Raise SchemeTypeError unless function is something we can call,
+    naming the value we were given, e.g. #<record-type point>.
+
+    """
+    if not callable(function):
+        raise SchemeTypeError("You can only call functions, but you gave me %s."
+                              % external_representation(box(function)))
+
+
 def eval_list(linked_list, environment):
     if not linked_list:
         raise SchemeSyntaxError("() is not syntactically valid.")
@@ -77,9 +127,7 @@ def eval_list(linked_list, environment):
     # find the function/primitive we are calling
     function, environment = eval_s_expression(linked_list[0], environment)
 
-    if isinstance(function, Atom):
-        raise SchemeTypeError("You can only call functions, but "
-                              "you gave me a %s." % function.__class__)
+    check_callable(function)
 
     # call it (internally we require the function to decide whether or
     # not to evaluate the arguments)
@@ -89,6 +137,8 @@ def eval_atom(atom, environment):
     # with the exception of symbols, atoms evaluate to themselves
     if isinstance(atom, Symbol):
         return eval_symbol(atom.value, environment)
+    elif immediates.unboxed and atom.__class__ in BOXED_TYPES:
+        return (atom.value, environment)
     else:
         return (atom, environment)
 
@@ -107,5 +157,28 @@ def eval_symbol(symbol_string, environment):
     else:
         raise UndefinedVariable('%s has not been defined (environment: %s).' % (symbol_string, sorted(environment.keys())))
 
-# this import has to be after eval_s_expression to avoid circular import issues
-from .primitives import primitives
+def apply_function(function, arguments, environment):
+    """Call a Scheme function with a Python list of arguments that
+    have already been evaluated, and return its result.
+
+    """
+    check_callable(function)
+
+    # functions evaluate their arguments, so we quote them
+    quoted_arguments = Cons.from_list([Cons(QUOTE, Cons(argument))
+                                       for argument in arguments])
+
+    result, _ = function(quoted_arguments, environment)
+
+    # our caller is a built-in, which expects boxed values
+    if immediates.unboxed:
+        return box(result)
+
+    return result
+
+
+# these imports have to be after eval_s_expression to avoid circular import issues
+from .primitives import primitives, QUOTE
+from . import check
+from .built_ins import built_ins
+from .built_ins.base import built_ins_using_environment, unboxed_built_ins
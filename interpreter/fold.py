@@ -0,0 +1,249 @@
+"""Constant folding of function bodies.
+
+When enabled, we look for calls in the body of each function as it's
+defined that would compute the same value every time the function
+runs: calls to pure built-ins, such as arithmetic, whose arguments are
+all constants. (* 60 60 24) is replaced by its value, 86400. An if
+whose condition is constant is replaced by the branch it would take.
+
+A user may rebind a built-in with set! at any time, so every folded
+call is a FoldedExpression that checks the built-ins it used are still
+bound before returning its value. If one isn't, we evaluate the
+original expression. We don't fold calls to names that are local
+variables, or to built-ins that have already been rebound.
+
+Macros are expanded when they're called, so we leave their arguments
+alone.
+
+"""
+from . import immediates
+from .data_types import (Atom, Symbol, Cons, Number, Boolean, Character,
+                         BuiltInFunction)
+from .walker import CodeWalker, CompiledExpression, QUOTE, external_representation
+
+
+# whether we fold constants in function bodies as they're defined
+enabled = False
+
+# how many calls and branches we've folded since we started
+statistics = {
+    'calls': 0,
+    'branches': 0,
+}
+
+# built-ins that always return the same value, and have no side
+# effects, when given the same arguments
+PURE_BUILT_INS = frozenset([
+    '+', '-', '*', '/', '=', '<', '<=', '>', '>=',
+    'quotient', 'remainder', 'modulo', 'exp', 'log',
+    'exact', 'inexact', 'numerator', 'denominator',
+    'number?', 'rational?', 'real?', 'complex?', 'exact?', 'inexact?',
+    'eq?', 'eqv?', 'equal?',
+    'char?', 'char=?', 'char<?', 'string?', 'symbol?', 'string-length',
+    'bitwise-and', 'bitwise-ior', 'bitwise-or', 'bitwise-xor', 'bitwise-not',
+    'arithmetic-shift', 'bit-count', 'bit-set?',
+])
+
+# the values we fold calls into. These are immutable, so sharing one
+# value between every run of a function is safe.
+FOLDABLE_RESULTS = (Number, Boolean, Character)
+
+
+class FoldedExpression(CompiledExpression):
+    """An expression we've replaced by a simpler one, which is only
+    valid while each of guards, a list of (name, built_in) pairs, is
+    still bound.
+
+    """
+    __slots__ = ('replacement', 'guards', 'original')
+
+    def __init__(self, replacement, guards, original):
+        self.replacement = replacement
+        self.guards = guards
+        self.original = original
+
+    def evaluate(self, environment):
+        for (name, built_in) in self.guards:
+            if environment.get(name) is not built_in:
+                return eval_s_expression(self.original, environment)
+
+        return eval_s_expression(self.replacement, environment)
+
+    def subexpressions(self):
+        return [self.replacement, self.original]
+
+    def get_external_representation(self):
+        return external_representation(self.replacement)
+
+
+def constant_value(s_expression):
+    """Return the value of s_expression, if it's a literal or a quoted
+    datum, otherwise None.
+
+    """
+    if isinstance(s_expression, Symbol):
+        return None
+
+    if isinstance(s_expression, Atom):
+        return s_expression
+
+    if (isinstance(s_expression, Cons) and s_expression.head is QUOTE and
+            isinstance(s_expression.tail, Cons) and not s_expression.tail.tail):
+        return s_expression.tail.head
+
+    return None
+
+
+def merge_guards(*guard_lists):
+    guards = []
+
+    for guard_list in guard_lists:
+        for guard in guard_list:
+            if guard not in guards:
+                guards.append(guard)
+
+    return guards
+
+
+class Folder(CodeWalker):
+    """Rewrite the body of a function, folding constant expressions.
+    The info for an expression is a tuple (value, guards) if it's
+    constant.
+
+    """
+    def __init__(self, environment):
+        super().__init__(environment)
+
+        self.calls = 0
+        self.branches = 0
+
+    def variable_info(self, info):
+        # local variables may be assigned, so we don't assume their
+        # values
+        return None
+
+    def walk_symbol(self, symbol, scope):
+        return (symbol, None)
+
+    def walk_literal(self, atom):
+        return (atom, (atom, []))
+
+    def walk_compiled(self, compiled_expression, scope):
+        if (isinstance(compiled_expression, FoldedExpression) and
+                isinstance(compiled_expression.replacement, FOLDABLE_RESULTS)):
+            return (compiled_expression, (compiled_expression.replacement,
+                                          compiled_expression.guards))
+
+        return (compiled_expression, None)
+
+    def walk_special_form(self, name, s_expression, scope):
+        if name == 'quote':
+            value = constant_value(s_expression)
+
+            if value is not None:
+                return (s_expression, (value, []))
+
+        return super().walk_special_form(name, s_expression, scope)
+
+    def walk_call(self, s_expression, scope):
+        rewritten = [self.walk(element, scope) for element in s_expression]
+        new_s_expression = Cons.from_list([element for (element, _) in rewritten])
+
+        head = s_expression.head
+        if not isinstance(head, Symbol) or head.value not in PURE_BUILT_INS:
+            return (new_s_expression, None)
+
+        name = head.value
+        built_in = self.environment.get(name)
+
+        if name in scope or built_in.__class__ is not BuiltInFunction or built_in.name != name:
+            # shadowed or rebound, so not the built-in we know about
+            return (new_s_expression, None)
+
+        arguments = [info for (_, info) in rewritten[1:]]
+        if None in arguments:
+            return (new_s_expression, None)
+
+        # the built-in evaluates its arguments, so we quote any that
+        # aren't self-evaluating
+        argument_expressions = []
+        for (value, _) in arguments:
+            if isinstance(value, Symbol) or not isinstance(value, Atom):
+                value = Cons(QUOTE, Cons(value))
+
+            argument_expressions.append(value)
+
+        try:
+            (result, _) = built_in(Cons.from_list(argument_expressions), self.environment)
+        except Exception:
+            # e.g. (/ 1 0), or (log 0) which raises a Python error, and
+            # which we leave to fail when it's run
+            return (new_s_expression, None)
+
+        result = immediates.box(result)
+        if not isinstance(result, FOLDABLE_RESULTS):
+            return (new_s_expression, None)
+
+        guards = merge_guards([(name, built_in)], *[guards for (_, guards) in arguments])
+
+        self.calls += 1
+        return (FoldedExpression(result, guards, s_expression), (result, guards))
+
+    def walk_if(self, s_expression, scope):
+        rewritten = [self.walk(argument, scope) for argument in s_expression.tail]
+        new_s_expression = Cons(s_expression.head,
+                                Cons.from_list([argument for (argument, _) in rewritten]))
+
+        if len(rewritten) not in (2, 3) or rewritten[0][1] is None:
+            return (new_s_expression, None)
+
+        (condition, guards) = rewritten[0][1]
+
+        if not immediates.is_false(condition):
+            (branch, branch_info) = rewritten[1]
+        elif len(rewritten) == 3:
+            (branch, branch_info) = rewritten[2]
+        else:
+            # (if #f x) has no value we could replace it with
+            return (new_s_expression, None)
+
+        self.branches += 1
+
+        if branch_info is not None:
+            (value, branch_guards) = branch_info
+            branch_info = (value, merge_guards(guards, branch_guards))
+
+        if not guards:
+            # the condition was a literal, so there's nothing to check
+            return (branch, branch_info)
+
+        return (FoldedExpression(branch, guards, new_s_expression), branch_info)
+
+
+def fold_function(parameters, body, environment):
+    """Return body with its constant expressions folded, or body
+    unchanged if there's nothing we can fold.
+
+    """
+    folder = Folder(environment)
+
+    scope = {parameter.value: None for parameter in parameters}
+    (new_body, _) = folder.walk_body(body, scope)
+
+    if not folder.calls and not folder.branches:
+        return body
+
+    statistics['calls'] += folder.calls
+    statistics['branches'] += folder.branches
+
+    return Cons.from_list(new_body)
+
+
+def report():
+    """Describe how much we've folded, for the REPL."""
+    return ("Constant folding: %d calls folded, %d branches pruned."
+            % (statistics['calls'], statistics['branches']))
+
+
+# this import has to be at the end to avoid circular import issues
+from .evaluator import eval_s_expression
@@ -0,0 +1,63 @@
+"""Unboxed evaluation.
+
+Normally every number, boolean and character is an Atom, so every
+arithmetic result allocates a wrapper object. When unboxed is set, the
+evaluator passes these around as plain Python values instead: ints,
+Fractions and floats for numbers, bools for booleans and
+one-character strs for characters.
+
+Built-ins with an unboxed implementation work on the raw values
+directly. Every other built-in is a boundary: its arguments are boxed
+before it's called, and its result is unboxed again. Data structures
+(lists, vectors and so on) always hold boxed values.
+
+"""
+from fractions import Fraction
+
+from .data_types import Integer, Rational, FloatingPoint, Boolean, Character
+
+
+# whether the evaluator passes immediate values around unboxed
+unboxed = False
+
+# the Atom class for each type of raw value. Note that bool is not
+# int here, since we look up the exact class.
+BOXES = {
+    int: Integer,
+    Fraction: Rational,
+    float: FloatingPoint,
+    bool: Boolean,
+    str: Character,
+}
+
+UNBOXED_TYPES = frozenset(BOXES)
+BOXED_TYPES = frozenset(BOXES.values())
+
+
+def box(value):
+    """Wrap a raw value in its Atom class. Anything else is returned
+    unchanged.
+
+    """
+    box_type = BOXES.get(value.__class__)
+
+    if box_type is None:
+        return value
+
+    return box_type(value)
+
+
+def unbox(value):
+    """Return the raw value of a number, boolean or character. Anything
+    else is returned unchanged.
+
+    """
+    if value.__class__ in BOXED_TYPES:
+        return value.value
+
+    return value
+
+
+def is_false(value):
+    """Is value #f, boxed or not? Everything else counts as true."""
+    return value is False or (value.__class__ is Boolean and not value.value)
@@ -0,0 +1,254 @@
+"""Inlining of small functions.
+
+When enabled, calls in the body of each function to small user
+functions, such as zero? or abs in the standard library, are replaced
+by the body of the function being called. This saves the cost of a
+call: checking the number of arguments, and building a new environment
+(which copies every variable in scope).
+
+We only inline a function whose body is a single expression built from
+if, quote, calls to first-order built-ins and calls to other functions
+we can inline, and which fits in INLINE_BUDGET once those calls are inlined
+too. Functions run in their caller's environment with their parameters
+added, so an inlined body looks up every other variable just as the
+function would have. The parameters are held by the InlinedCall, and
+each use of one in the body is an InlinedParameter.
+
+A function may be rebound with set! at any time, or shadowed by a
+local variable, so an InlinedCall checks its name is still bound to
+the function it inlined. If it isn't, we make the call as written.
+
+"""
+from .data_types import Atom, Symbol, Cons, BuiltInFunction, UserFunction
+from .fold import PURE_BUILT_INS
+from .walker import CodeWalker, CompiledExpression, QUOTE, external_representation
+
+
+# whether we inline calls in function bodies as they're defined
+enabled = False
+
+# the largest body we inline, counted in atoms, after inlining any
+# calls it makes
+INLINE_BUDGET = 20
+
+# built-ins that never call a function they're given. A built-in such
+# as map or sort may call a user function, which would run in the
+# environment of the inlined call, where the parameters of the
+# function we inlined aren't bound.
+FIRST_ORDER_BUILT_INS = PURE_BUILT_INS | frozenset([
+    'car', 'cdr', 'cons', 'pair?', 'null?', 'list?', 'list', 'length',
+    'vector?', 'vector-ref', 'vector-length', 'string-ref', 'procedure?',
+    'symbol->string', 'string->symbol',
+])
+
+# symbols are interned, so this is the same symbol as primitives.IF
+IF = Symbol('if')
+
+
+class InlinedCall(CompiledExpression):
+    """A call to the function bound to name, replaced by the function's
+    body. values holds the arguments of the call being evaluated.
+
+    """
+    __slots__ = ('name', 'function', 'arguments', 'body', 'original', 'values')
+
+    def __init__(self, name, function, arguments, original):
+        self.name = name
+        self.function = function
+        self.arguments = arguments
+        self.original = original
+
+        # set once we've built it, since it refers back to this call
+        self.body = None
+        self.values = None
+
+    def evaluate(self, environment):
+        if environment.get(self.name) is not self.function:
+            # deoptimise: the name has been rebound
+            return eval_s_expression(self.original, environment)
+
+        values = []
+        for argument in self.arguments:
+            (value, environment) = eval_s_expression(argument, environment)
+            values.append(value)
+
+        # the body may call a built-in that calls back into the
+        # function containing us, so we restore our caller's values
+        # afterwards
+        outer_values = self.values
+        self.values = values
+
+        try:
+            return eval_s_expression(self.body, environment)
+        finally:
+            self.values = outer_values
+
+    def subexpressions(self):
+        return self.arguments + [self.body]
+
+    def get_external_representation(self):
+        return external_representation(self.original)
+
+
+class InlinedParameter(CompiledExpression):
+    """A use of a parameter in the body of an InlinedCall."""
+    __slots__ = ('call', 'index', 'name')
+
+    def __init__(self, call, index, name):
+        self.call = call
+        self.index = index
+        self.name = name
+
+    def evaluate(self, environment):
+        return (self.call.values[self.index], environment)
+
+    def subexpressions(self):
+        # the argument was evaluated by our call
+        return []
+
+    def get_external_representation(self):
+        return self.name
+
+
+class NotInlinable(Exception):
+    pass
+
+
+class Inliner(CodeWalker):
+    """Rewrite the body of a function, inlining calls to small
+    functions.
+
+    """
+    def __init__(self, environment):
+        super().__init__(environment)
+
+        self.count = 0
+
+    def walk_call(self, s_expression, scope):
+        elements = [self.walk(element, scope)[0] for element in s_expression]
+        new_s_expression = Cons.from_list(elements)
+
+        head = s_expression.head
+        if not isinstance(head, Symbol) or head.value in scope:
+            return (new_s_expression, None)
+
+        try:
+            inlined_call = self.inline(head.value, elements[1:], s_expression, [])
+        except NotInlinable:
+            return (new_s_expression, None)
+
+        self.count += 1
+        return (inlined_call, None)
+
+    def inline(self, name, arguments, original, callers):
+        """Return an InlinedCall of the function bound to name, or raise
+        NotInlinable. callers are the functions whose bodies we're
+        already inlining.
+
+        """
+        function = self.environment.get(name)
+
+        if not isinstance(function, UserFunction) or function.body is None:
+            raise NotInlinable()
+
+        if function in callers or len(arguments) != len(function.parameters):
+            # recursive, or an arity error for the call to report
+            raise NotInlinable()
+
+        body = list(function.body)
+        if len(body) != 1:
+            raise NotInlinable()
+
+        inlined_call = InlinedCall(name, function, arguments, original)
+
+        parameters = {}
+        for (index, parameter) in enumerate(function.parameters):
+            parameters[parameter.value] = InlinedParameter(inlined_call, index,
+                                                           parameter.value)
+
+        size = [0]
+        inlined_call.body = self.substitute(body[0], parameters, callers + [function], size)
+
+        return inlined_call
+
+    def substitute(self, s_expression, parameters, callers, size):
+        """Return s_expression from the body of a function we're
+        inlining, with its parameters replaced by InlinedParameters.
+
+        """
+        size[0] += 1
+        if size[0] > INLINE_BUDGET:
+            raise NotInlinable()
+
+        if isinstance(s_expression, Symbol):
+            return parameters.get(s_expression.value, s_expression)
+
+        if isinstance(s_expression, Atom):
+            return s_expression
+
+        if not isinstance(s_expression, Cons) or not s_expression.is_proper():
+            # e.g. an expression we've already compiled
+            raise NotInlinable()
+
+        head = s_expression.head
+        if not isinstance(head, Symbol) or head.value in parameters:
+            # a function we'd call with the parameters in scope, which
+            # it could see
+            raise NotInlinable()
+
+        if head is QUOTE:
+            return s_expression
+
+        arguments = [self.substitute(argument, parameters, callers, size)
+                     for argument in s_expression.tail]
+
+        if head is IF:
+            return Cons(head, Cons.from_list(arguments))
+
+        function = self.environment.get(head.value)
+
+        if isinstance(function, BuiltInFunction):
+            if head.value not in FIRST_ORDER_BUILT_INS or function.name != head.value:
+                raise NotInlinable()
+
+            return Cons(head, Cons.from_list(arguments))
+
+        # anything else must be inlined too, since a user function
+        # could see our parameters
+        inlined_call = self.inline(head.value, arguments, s_expression, callers)
+        size[0] += count_atoms(inlined_call.body)
+
+        if size[0] > INLINE_BUDGET:
+            raise NotInlinable()
+
+        return inlined_call
+
+
+def count_atoms(s_expression):
+    if isinstance(s_expression, InlinedCall):
+        return count_atoms(s_expression.body)
+
+    if isinstance(s_expression, Cons):
+        return sum(count_atoms(element) for element in s_expression)
+
+    return 1
+
+
+def inline_function(parameters, body, environment):
+    """Return body with calls to small functions inlined, or body
+    unchanged if there's nothing we can inline.
+
+    """
+    inliner = Inliner(environment)
+
+    scope = {parameter.value: None for parameter in parameters}
+    (new_body, _) = inliner.walk_body(body, scope)
+
+    if not inliner.count:
+        return body
+
+    return Cons.from_list(new_body)
+
+
+# this import has to be at the end to avoid circular import issues
+from .evaluator import eval_s_expression
@@ -0,0 +1,519 @@
+"""Persistent collections, which are never modified. Updating one
+returns a new collection that shares all but O(log32 n) of its nodes
+with the original, as in Clojure:
+
+* HashTrie is a hash array mapped trie (HAMT) from hashable Python
+  keys to values. Every node holds up to 32 children, indexed by five
+  bits of the key's hash, and a bitmap of which children are present.
+
+* VectorTrie is a bit-partitioned vector trie. Every node holds up to
+  32 children, indexed by five bits of the index, and the last (up to
+  32) items are kept in a separate tail so appending is usually O(1).
+
+Both have transient versions for building large collections. A
+transient owns the nodes it creates, and updates those in place rather
+than copying them, until it is made persistent again.
+
+"""
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+# we use 32 bits of each hash, so a trie is at most seven levels deep
+HASH_MASK = 0xffffffff
+
+MISSING = object()
+
+
+def bit_count(number):
+    return bin(number).count('1')
+
+
+class TransientError(Exception):
+    pass
+
+
+class HashNode(object):
+    """A HAMT node. Each item is either a (hash, key, value) tuple or a
+    child node.
+
+    """
+    __slots__ = ('bitmap', 'items', 'edit')
+
+    def __init__(self, bitmap, items, edit):
+        self.bitmap = bitmap
+        self.items = items
+        self.edit = edit
+
+    def editable(self, edit):
+        if edit is not None and self.edit is edit:
+            return self
+
+        return HashNode(self.bitmap, list(self.items), edit)
+
+    def get(self, shift, key_hash, key):
+        node = self
+
+        while True:
+            if isinstance(node, CollisionNode):
+                return node.get(shift, key_hash, key)
+
+            bit = 1 << ((key_hash >> shift) & MASK)
+            if not node.bitmap & bit:
+                return MISSING
+
+            item = node.items[bit_count(node.bitmap & (bit - 1))]
+
+            if isinstance(item, tuple):
+                if item[0] == key_hash and item[1] == key:
+                    return item[2]
+
+                return MISSING
+
+            node = item
+            shift += BITS
+
+    def assoc(self, shift, key_hash, key, value, edit):
+        """Return (node with key set to value, whether key was added)."""
+        bit = 1 << ((key_hash >> shift) & MASK)
+        index = bit_count(self.bitmap & (bit - 1))
+
+        if not self.bitmap & bit:
+            node = self.editable(edit)
+            node.bitmap |= bit
+            node.items.insert(index, (key_hash, key, value))
+            return (node, True)
+
+        item = self.items[index]
+
+        if isinstance(item, tuple):
+            if item[0] == key_hash and item[1] == key:
+                if item[2] is value:
+                    return (self, False)
+
+                replacement = (key_hash, key, value)
+                added = False
+            else:
+                replacement = make_node(shift + BITS, item, (key_hash, key, value), edit)
+                added = True
+        else:
+            (replacement, added) = item.assoc(shift + BITS, key_hash, key, value, edit)
+
+            if replacement is item:
+                return (self, added)
+
+        node = self.editable(edit)
+        node.items[index] = replacement
+        return (node, added)
+
+    def without(self, shift, key_hash, key, edit):
+        """Return (node without key, whether key was removed). The node
+        is None if removing key leaves it empty.
+
+        """
+        bit = 1 << ((key_hash >> shift) & MASK)
+        if not self.bitmap & bit:
+            return (self, False)
+
+        index = bit_count(self.bitmap & (bit - 1))
+        item = self.items[index]
+
+        if isinstance(item, tuple):
+            if not (item[0] == key_hash and item[1] == key):
+                return (self, False)
+
+            replacement = None
+        else:
+            (replacement, removed) = item.without(shift + BITS, key_hash, key, edit)
+
+            if not removed:
+                return (self, False)
+
+            # a child with a single entry is replaced by the entry
+            if replacement is not None and len(replacement.items) == 1 and \
+               isinstance(replacement.items[0], tuple):
+                replacement = replacement.items[0]
+
+        if replacement is None:
+            if len(self.items) == 1:
+                return (None, True)
+
+            node = self.editable(edit)
+            node.bitmap &= ~bit
+            del node.items[index]
+            return (node, True)
+
+        node = self.editable(edit)
+        node.items[index] = replacement
+        return (node, True)
+
+    def entries(self):
+        for item in self.items:
+            if isinstance(item, tuple):
+                yield item
+            else:
+                for entry in item.entries():
+                    yield entry
+
+
+class CollisionNode(object):
+    """A HAMT node for keys whose hashes are all the same."""
+    __slots__ = ('key_hash', 'items', 'edit')
+
+    def __init__(self, key_hash, items, edit):
+        self.key_hash = key_hash
+        self.items = items
+        self.edit = edit
+
+    def editable(self, edit):
+        if edit is not None and self.edit is edit:
+            return self
+
+        return CollisionNode(self.key_hash, list(self.items), edit)
+
+    def find(self, key):
+        for (index, item) in enumerate(self.items):
+            if item[1] == key:
+                return index
+
+        return None
+
+    def get(self, shift, key_hash, key):
+        if key_hash == self.key_hash:
+            index = self.find(key)
+
+            if index is not None:
+                return self.items[index][2]
+
+        return MISSING
+
+    def assoc(self, shift, key_hash, key, value, edit):
+        if key_hash != self.key_hash:
+            # nest this node in a bitmap node, so we can add key beside it
+            bit = 1 << ((self.key_hash >> shift) & MASK)
+            return HashNode(bit, [self], edit).assoc(shift, key_hash, key, value, edit)
+
+        index = self.find(key)
+        node = self.editable(edit)
+
+        if index is None:
+            node.items.append((key_hash, key, value))
+            return (node, True)
+
+        node.items[index] = (key_hash, key, value)
+        return (node, False)
+
+    def without(self, shift, key_hash, key, edit):
+        index = self.find(key) if key_hash == self.key_hash else None
+        if index is None:
+            return (self, False)
+
+        if len(self.items) == 1:
+            return (None, True)
+
+        node = self.editable(edit)
+        del node.items[index]
+        return (node, True)
+
+    def entries(self):
+        return iter(self.items)
+
+
+def make_node(shift, first_entry, second_entry, edit):
+    """Make a node holding two entries with different keys."""
+    if first_entry[0] == second_entry[0]:
+        return CollisionNode(first_entry[0], [first_entry, second_entry], edit)
+
+    node = HashNode(0, [], edit)
+    (node, _) = node.assoc(shift, *first_entry, edit=edit)
+    (node, _) = node.assoc(shift, *second_entry, edit=edit)
+    return node
+
+
+class HashTrie(object):
+    """A persistent dict."""
+    __slots__ = ('root', 'count')
+
+    def __init__(self, root=None, count=0):
+        self.root = root
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def get(self, key, default=None):
+        if self.root is None:
+            return default
+
+        value = self.root.get(0, hash(key) & HASH_MASK, key)
+        if value is MISSING:
+            return default
+
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def set(self, key, value):
+        root = self.root or HashNode(0, [], None)
+        (root, added) = root.assoc(0, hash(key) & HASH_MASK, key, value, None)
+
+        if root is self.root:
+            return self
+
+        return HashTrie(root, self.count + 1 if added else self.count)
+
+    def delete(self, key):
+        if self.root is None:
+            return self
+
+        (root, removed) = self.root.without(0, hash(key) & HASH_MASK, key, None)
+        if not removed:
+            return self
+
+        return HashTrie(root, self.count - 1)
+
+    def items(self):
+        if self.root is None:
+            return
+
+        for (_, key, value) in self.root.entries():
+            yield (key, value)
+
+    def transient(self):
+        return TransientHashTrie(self.root, self.count)
+
+
+class TransientHashTrie(object):
+    """A dict that shares nodes with a HashTrie, and updates the nodes
+    it owns in place.
+
+    """
+    def __init__(self, root, count):
+        # nodes created by this transient are marked with edit
+        self.edit = object()
+        self.root = root
+        self.count = count
+
+    def check_editable(self):
+        if self.edit is None:
+            raise TransientError("Can't update a transient after making it persistent.")
+
+    def __len__(self):
+        return self.count
+
+    def get(self, key, default=None):
+        return HashTrie(self.root, self.count).get(key, default)
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def set(self, key, value):
+        self.check_editable()
+
+        root = self.root or HashNode(0, [], self.edit)
+        (self.root, added) = root.assoc(0, hash(key) & HASH_MASK, key, value, self.edit)
+
+        if added:
+            self.count += 1
+
+    def delete(self, key):
+        self.check_editable()
+
+        if self.root is None:
+            return
+
+        (self.root, removed) = self.root.without(0, hash(key) & HASH_MASK, key, self.edit)
+        if removed:
+            self.count -= 1
+
+    def persistent(self):
+        self.check_editable()
+        self.edit = None
+
+        return HashTrie(self.root, self.count)
+
+
+class VectorNode(object):
+    __slots__ = ('items', 'edit')
+
+    def __init__(self, items, edit):
+        self.items = items
+        self.edit = edit
+
+    def editable(self, edit):
+        if edit is not None and self.edit is edit:
+            return self
+
+        return VectorNode(list(self.items), edit)
+
+
+def new_path(level, node, edit):
+    """Return node, wrapped in enough parents to sit at level."""
+    while level > 0:
+        node = VectorNode([node], edit)
+        level -= BITS
+
+    return node
+
+
+class VectorTrie(object):
+    """A persistent list."""
+    __slots__ = ('count', 'shift', 'root', 'tail')
+
+    def __init__(self, count=0, shift=BITS, root=None, tail=None):
+        self.count = count
+        self.shift = shift
+        self.root = root if root is not None else VectorNode([], None)
+        self.tail = tail if tail is not None else []
+
+    def __len__(self):
+        return self.count
+
+    def tail_offset(self):
+        return self.count - len(self.tail)
+
+    def leaf_for(self, index):
+        """Return the list of up to 32 items that holds index."""
+        if index >= self.tail_offset():
+            return self.tail
+
+        node = self.root
+        for level in range(self.shift, 0, -BITS):
+            node = node.items[(index >> level) & MASK]
+
+        return node.items
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+
+        return self.leaf_for(index)[index & MASK]
+
+    def __iter__(self):
+        for leaf_start in range(0, self.count, WIDTH):
+            for item in self.leaf_for(leaf_start):
+                yield item
+
+    def set(self, index, value):
+        if index == self.count:
+            return self.append(value)
+
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+
+        if index >= self.tail_offset():
+            tail = list(self.tail)
+            tail[index & MASK] = value
+            return VectorTrie(self.count, self.shift, self.root, tail)
+
+        root = assoc_in_tree(self.shift, self.root, index, value, None)
+        return VectorTrie(self.count, self.shift, root, self.tail)
+
+    def append(self, value):
+        if len(self.tail) < WIDTH:
+            return VectorTrie(self.count + 1, self.shift, self.root, self.tail + [value])
+
+        (shift, root) = push_tail(self.count, self.shift, self.root,
+                                  VectorNode(self.tail, None), None)
+        return VectorTrie(self.count + 1, shift, root, [value])
+
+    def transient(self):
+        return TransientVectorTrie(self.count, self.shift, self.root, list(self.tail))
+
+
+def assoc_in_tree(level, node, index, value, edit):
+    node = node.editable(edit)
+
+    if level == 0:
+        node.items[index & MASK] = value
+    else:
+        child_index = (index >> level) & MASK
+        node.items[child_index] = assoc_in_tree(level - BITS, node.items[child_index],
+                                                index, value, edit)
+
+    return node
+
+
+def push_tail(count, shift, root, tail_node, edit):
+    """Add a full tail of a vector with count items to its tree.
+    Return the new (shift, root).
+
+    """
+    if (count >> BITS) > (1 << shift):
+        # the tree is full, so add a level
+        return (shift + BITS, VectorNode([root, new_path(shift, tail_node, edit)], edit))
+
+    def push(level, parent):
+        parent = parent.editable(edit)
+        child_index = ((count - 1) >> level) & MASK
+
+        if level == BITS:
+            child = tail_node
+        elif child_index < len(parent.items):
+            child = push(level - BITS, parent.items[child_index])
+        else:
+            child = new_path(level - BITS, tail_node, edit)
+
+        if child_index < len(parent.items):
+            parent.items[child_index] = child
+        else:
+            parent.items.append(child)
+
+        return parent
+
+    return (shift, push(shift, root))
+
+
+class TransientVectorTrie(object):
+    """A list that shares nodes with a VectorTrie, and updates the
+    nodes it owns in place.
+
+    """
+    def __init__(self, count, shift, root, tail):
+        self.edit = object()
+        self.count = count
+        self.shift = shift
+        self.root = root
+        self.tail = tail
+
+    def check_editable(self):
+        if self.edit is None:
+            raise TransientError("Can't update a transient after making it persistent.")
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return VectorTrie(self.count, self.shift, self.root, self.tail)[index]
+
+    def set(self, index, value):
+        self.check_editable()
+
+        if index == self.count:
+            return self.append(value)
+
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+
+        if index >= self.count - len(self.tail):
+            self.tail[index & MASK] = value
+        else:
+            self.root = assoc_in_tree(self.shift, self.root, index, value, self.edit)
+
+    def append(self, value):
+        self.check_editable()
+
+        if len(self.tail) == WIDTH:
+            (self.shift, self.root) = push_tail(self.count, self.shift, self.root,
+                                                VectorNode(self.tail, self.edit), self.edit)
+            self.tail = []
+
+        self.tail.append(value)
+        self.count += 1
+
+    def persistent(self):
+        self.check_editable()
+        self.edit = None
+
+        return VectorTrie(self.count, self.shift, self.root, self.tail)
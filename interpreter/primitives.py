@@ -1,12 +1,27 @@
-from .evaluator import eval_s_expression
+from .evaluator import eval_s_expression, arguments_evaluated
 from .errors import (SchemeTypeError, RedefinedVariable, SchemeSyntaxError, UndefinedVariable,
-                    SchemeArityError)
-from .data_types import Nil, Cons, Atom, Symbol, Boolean, UserFunction, LambdaFunction
-from copy import deepcopy
+                    SchemeArityError, InterpreterException)
+from .data_types import (Nil, Cons, Atom, Symbol, Boolean,
+                         UserFunction, LambdaFunction, BuiltInFunction, RecordType,
+                         Promise)
 from .utils import check_argument_number
+from .immediates import box, is_false
+from .walker import CompiledExpression
+from .built_ins.equivalence import is_eqv
+from . import check, fold, inline, specialise
 
 primitives = {}
 
+# symbols are interned, so we can recognise special forms by identity
+QUOTE = Symbol('quote')
+UNQUOTE = Symbol('unquote')
+UNQUOTE_SPLICING = Symbol('unquote-splicing')
+IF = Symbol('if')
+BEGIN = Symbol('begin')
+CASE = Symbol('case')
+ELSE = Symbol('else')
+DOT = Symbol('.')
+
 # a decorator for creating a primitive function object and giving it a name
 def define_primitive(function_name):
     def define_primitive_decorator(function):
@@ -80,22 +95,35 @@ def define_normal_function(arguments, environment):
     function_parameters = function_name_with_parameters.tail
 
     function_body = arguments.tail
-    
-    # a function with a fixed number of arguments
-    def named_function(_arguments, _environment):
-        check_argument_number(function_name.value, _arguments,
-                              len(function_parameters), len(function_parameters))
 
+    if fold.enabled:
+        function_body = fold.fold_function(function_parameters, function_body, environment)
+
+    if inline.enabled:
+        function_body = inline.inline_function(function_parameters, function_body, environment)
+
+    if specialise.enabled:
+        function_body = specialise.specialise_function(function_name, function_parameters,
+                                                       function_body, environment)
+
+    if check.enabled:
+        function_body = check.check_function(function_name, function_parameters,
+                                             function_body, environment)
+
+    # a function with a fixed number of arguments, for callers that
+    # have already checked they're passing the right number
+    def unchecked_function(_arguments, _environment):
         local_environment = {}
 
         # evaluate arguments
-        _arguments = deepcopy(_arguments)
-        for i in range(len(_arguments)):
-            (_arguments[i], _environment) = eval_s_expression(_arguments[i], _environment)
+        evaluated_arguments = []
+        for argument in _arguments:
+            (result, _environment) = eval_s_expression(argument, _environment)
+            evaluated_arguments.append(result)
 
         # assign to parameters
         for (parameter_name, parameter_value) in zip(function_parameters,
-                                                     _arguments):
+                                                     evaluated_arguments):
             local_environment[parameter_name.value] = parameter_value
 
         # create new environment, where local variables mask globals
@@ -112,9 +140,17 @@ def define_normal_function(arguments, environment):
 
         return (result, _environment)
 
+    def named_function(_arguments, _environment):
+        check_argument_number(function_name.value, _arguments,
+                              len(function_parameters), len(function_parameters))
+
+        return unchecked_function(_arguments, _environment)
+
     # assign this function to this name
     environment[function_name.value] = UserFunction(named_function,
-                                                    function_name.value)
+                                                    function_name.value,
+                                                    function_parameters, arguments.tail,
+                                                    unchecked_function)
 
     return (None, environment)
 
@@ -126,7 +162,7 @@ def define_variadic_function(arguments, environment):
 
     function_body = arguments.tail
     
-    dot_position = function_parameters.index(Symbol('.'))
+    dot_position = function_parameters.index(DOT)
 
     if dot_position < len(function_parameters) - 2:
         raise SchemeSyntaxError("You can only have one improper list "
@@ -134,24 +170,24 @@ def define_variadic_function(arguments, environment):
     if dot_position == len(function_parameters) - 1:
         raise SchemeSyntaxError("Must name an improper list parameter after '.'.")
 
-    def named_variadic_function(_arguments, _environment):
-        # a function that takes a variable number of arguments
-        if dot_position == 0:
-            explicit_parameters = Nil()
-        else:
-            explicit_parameters = deepcopy(function_parameters)
+    # the names of the parameters before the dot, and the one after
+    # it, which we only need to find once
+    explicit_parameters = [parameter.value for parameter in
+                           list(function_parameters)[:dot_position]]
+    improper_list_parameter = function_parameters[dot_position + 1]
 
-            # create a linked list holding all the parameters before the dot
-            current_head = explicit_parameters
+    if fold.enabled:
+        function_body = fold.fold_function(function_parameters, function_body, environment)
 
-            # find the position in the list just before the dot
-            for i in range(dot_position - 2):
-                current_head = current_head.tail
+    if inline.enabled:
+        function_body = inline.inline_function(function_parameters, function_body, environment)
 
-            # then remove the rest of the list
-            current_head.tail = Nil()
+    if check.enabled:
+        function_body = check.check_function(function_name, function_parameters,
+                                             function_body, environment)
 
-        improper_list_parameter = function_parameters[dot_position + 1]
+    def named_variadic_function(_arguments, _environment):
+        # a function that takes a variable number of arguments
 
         # check we have been given sufficient arguments for our explicit parameters
         check_argument_number(function_name.value, _arguments,
@@ -160,21 +196,20 @@ def define_variadic_function(arguments, environment):
         local_environment = {}
 
         # evaluate arguments
-        _arguments = deepcopy(_arguments)
-        for i in range(len(_arguments)):
-            (_arguments[i], _environment) = eval_s_expression(_arguments[i], _environment)
+        evaluated_arguments = []
+        for argument in _arguments:
+            (result, _environment) = eval_s_expression(argument, _environment)
+            evaluated_arguments.append(result)
 
         # assign parameters
         for (parameter, parameter_value) in zip(explicit_parameters,
-                                                _arguments):
+                                                evaluated_arguments):
             local_environment[parameter] = parameter_value
 
         # put the remaining arguments in our improper parameter
-        remaining_arguments = _arguments
-        for i in range(len(explicit_parameters)):
-            remaining_arguments = remaining_arguments.tail
-
-        local_environment[improper_list_parameter.value] = remaining_arguments
+        remaining_arguments = evaluated_arguments[len(explicit_parameters):]
+        local_environment[improper_list_parameter.value] = Cons.from_list(
+            [box(argument) for argument in remaining_arguments])
 
         new_environment = dict(_environment, **local_environment)
 
@@ -221,7 +256,7 @@ def if_function(arguments, environment):
     condition, environment = eval_s_expression(arguments[0], environment)
 
     # everything except an explicit false boolean is true
-    if not condition == Boolean(False):
+    if not is_false(condition):
         then_expression = arguments[1]
         return eval_s_expression(then_expression, environment)
     else:
@@ -244,6 +279,19 @@ def make_lambda_function(arguments, environment):
         if not isinstance(parameter, Symbol):
             raise SchemeTypeError("Parameters of lambda functions must be symbols, not %s." % parameter.__class__)
 
+    if fold.enabled:
+        function_body = fold.fold_function(parameter_list, function_body, environment)
+
+    if inline.enabled:
+        function_body = inline.inline_function(parameter_list, function_body, environment)
+
+    if specialise.enabled:
+        function_body = specialise.specialise_function(None, parameter_list,
+                                                       function_body, environment)
+
+    if check.enabled:
+        function_body = check.check_function(None, parameter_list, function_body, environment)
+
     def lambda_function(_arguments, _environment):
         check_argument_number('(anonymous function)', _arguments,
                               len(parameter_list), len(parameter_list))
@@ -287,6 +335,48 @@ def evaluate_sequence(arguments, environment):
     return (result, environment)
 
 
+@define_primitive('delay')
+def delay(arguments, environment):
+    """Return a promise to evaluate the argument in this environment
+    when it's first forced.
+
+    """
+    check_argument_number('delay', arguments, 1, 1)
+
+    expression = arguments[0]
+
+    def compute_value():
+        (result, _) = eval_s_expression(expression, environment)
+
+        # promises hold boxed values, like lists
+        return box(result)
+
+    return (Promise(compute_value), environment)
+
+
+@define_primitive('delay-force')
+def delay_force(arguments, environment):
+    """Like delay, but the argument evaluates to another promise, which
+    we force in its place. Forcing a chain of these doesn't use any
+    stack, see Promise.force.
+
+    """
+    check_argument_number('delay-force', arguments, 1, 1)
+
+    expression = arguments[0]
+
+    def compute_promise():
+        (result, _) = eval_s_expression(expression, environment)
+
+        if not isinstance(result, Promise):
+            raise SchemeTypeError("delay-force requires an expression that evaluates "
+                                  "to a promise, but got a %s." % result.__class__)
+
+        return result
+
+    return (Promise(compute_promise, lazy=True), environment)
+
+
 @define_primitive('quasiquote')
 def quasiquote(arguments, environment):
     """Returns the arguments unevaluated, except for any occurrences
@@ -307,9 +397,12 @@ def quasiquote(arguments, environment):
         elif isinstance(s_expression, Nil):
             return (s_expression, _environment)
 
-        elif s_expression[0] == Symbol("unquote"):
+        elif s_expression[0] is UNQUOTE:
             check_argument_number('unquote', arguments, 1, 1)
-            return eval_s_expression(s_expression[1], _environment)
+            (result, _environment) = eval_s_expression(s_expression[1], _environment)
+
+            # we're building data, which holds boxed values
+            return (box(result), _environment)
 
         else:
             # return a list of s_expressions that have been
@@ -318,7 +411,7 @@ def quasiquote(arguments, environment):
 
             for element in s_expression:
                 if isinstance(element, Cons) and \
-                        element[0] == Symbol('unquote-splicing'):
+                        element[0] is UNQUOTE_SPLICING:
                     check_argument_number('unquote-splicing', element.tail, 1, 1)
 
                     (result, _environment) = eval_s_expression(element[1], _environment)
@@ -365,8 +458,8 @@ def defmacro(arguments, environment):
     
     replacement_body = arguments[2]
 
-    def expand_then_eval(arguments, _environment):
-        """Expand this macro once, then continue evaluation."""
+    def expand(arguments, _environment):
+        """Expand this macro once, returning the new s-expression."""
         if is_variadic:
             if len(arguments) < len(macro_arguments):
                 raise SchemeArityError("Macro %s takes at least %d arguments, but got %d."
@@ -398,9 +491,673 @@ def defmacro(arguments, environment):
             if variable_name not in macro_arguments:
                 _environment[variable_name] = new_environment[variable_name]
 
+        return s_expression_after_expansion
+
+    def expand_then_eval(arguments, _environment):
+        """Expand this macro once, then continue evaluation."""
+        s_expression_after_expansion = expand(arguments, _environment)
+
         # continue evaluation where we left off
         return eval_s_expression(s_expression_after_expansion, _environment)
 
+    # so named let can find tail calls in the expansion
+    expand_then_eval.expand = expand
+
     environment[macro_name] = expand_then_eval
 
     return (None, environment)
+
+
+@define_primitive('let')
+def let(arguments, environment):
+    """Bind variables locally, then evaluate the body.
+
+    Syntax:
+    let <bindings> <body>
+    let <name> <bindings> <body>
+
+    The second form is a named let, which we run as a loop where
+    possible.
+
+    """
+    check_argument_number('let', arguments, 2)
+
+    if isinstance(arguments[0], Symbol):
+        return named_let(arguments, environment)
+
+    bindings = arguments[0]
+    body = arguments.tail
+
+    local_environment = {}
+
+    for (variable_name, value_expression) in parse_bindings('let', bindings):
+        local_environment[variable_name], environment = eval_s_expression(value_expression, environment)
+
+    new_environment = dict(environment, **local_environment)
+
+    result = None
+    for s_exp in body:
+        result, new_environment = eval_s_expression(s_exp, new_environment)
+
+    # update any global variables that weren't masked
+    for variable_name in environment:
+        if variable_name not in local_environment:
+            environment[variable_name] = new_environment[variable_name]
+
+    return (result, environment)
+
+
+def named_let(arguments, environment):
+    check_argument_number('let', arguments, 3)
+
+    loop_name = arguments[0]
+    bindings = parse_bindings('let', arguments[1])
+    body = list(arguments.tail.tail)
+
+    variable_names = [variable_name for (variable_name, _) in bindings]
+
+    if any(mentions_symbol(s_exp, loop_name) for s_exp in body[:-1]) or \
+       not only_tail_calls(body[-1], loop_name, environment, variable_names):
+        # The body uses the loop name as a normal function, so we have
+        # to define it and recurse.
+        return named_let_as_function(loop_name, bindings, arguments.tail.tail,
+                                     environment)
+
+    local_environment = {}
+    for (variable_name, value_expression) in bindings:
+        local_environment[variable_name], environment = eval_s_expression(value_expression, environment)
+
+    new_environment = dict(environment, **local_environment)
+
+    while True:
+        for s_exp in body[:-1]:
+            _, new_environment = eval_s_expression(s_exp, new_environment)
+
+        loop_arguments, result, new_environment = eval_loop_tail(body[-1], loop_name,
+                                                                 new_environment)
+
+        if loop_arguments is None:
+            break
+
+        loop_arguments = list(loop_arguments)
+        check_argument_number(loop_name.value, loop_arguments,
+                              len(variable_names), len(variable_names))
+
+        # Evaluate every argument before assigning any of them, then
+        # rebind the loop variables in place.
+        values = []
+        for argument in loop_arguments:
+            value, new_environment = eval_s_expression(argument, new_environment)
+            values.append(value)
+
+        for (variable_name, value) in zip(variable_names, values):
+            new_environment[variable_name] = value
+
+    # update any global variables that weren't masked
+    for variable_name in environment:
+        if variable_name not in local_environment:
+            environment[variable_name] = new_environment[variable_name]
+
+    return (result, environment)
+
+
+def named_let_as_function(loop_name, bindings, body, environment):
+    """Evaluate a named let by defining a local function called
+    loop_name, then calling it with the initial values.
+
+    """
+    parameters = Cons.from_list([Symbol(variable_name)
+                                 for (variable_name, _) in bindings])
+    initial_values = Cons.from_list([value_expression
+                                     for (_, value_expression) in bindings])
+
+    local_environment = dict(environment)
+    define_normal_function(Cons(Cons(loop_name, parameters), body),
+                           local_environment)
+
+    result, local_environment = eval_s_expression(Cons(loop_name, initial_values),
+                                                  local_environment)
+
+    # update any global variables that weren't masked
+    for variable_name in environment:
+        if variable_name != loop_name.value:
+            environment[variable_name] = local_environment[variable_name]
+
+    return (result, environment)
+
+
+def macro_expander(s_expression, environment, local_names=()):
+    """If s_expression is a call to a macro, return the function that
+    expands it, otherwise None. local_names are variables that will
+    shadow the environment when s_expression is run.
+
+    """
+    head = s_expression.head
+
+    if not isinstance(head, Symbol) or head.value in primitives or \
+       head.value in local_names:
+        return None
+
+    return getattr(environment.get(head.value), 'expand', None)
+
+
+def expand_macro_call(expand, s_expression, environment):
+    """Expand a call to a macro. As with case, we store the expansion on
+    the form itself, so a loop only expands it once, unless the macro
+    is rebound.
+
+    """
+    cached = getattr(s_expression, 'macro_expansion', None)
+    if cached is not None and cached[0] is expand:
+        return cached[1]
+
+    expansion = expand(s_expression.tail, environment)
+    s_expression.macro_expansion = (expand, expansion)
+
+    return expansion
+
+
+def eval_loop_tail(s_expression, loop_name, environment):
+    """Evaluate s_expression, which is in tail position in the body of
+    a named let. If we reach a call to the loop, return its
+    (unevaluated) arguments instead of calling it. Macros such as cond
+    are expanded, so we can look for tail calls in their expansion.
+
+    Returns a tuple (loop_arguments, result, environment), where
+    loop_arguments is None if the loop has finished.
+
+    """
+    while True:
+        if not isinstance(s_expression, Cons):
+            result, environment = eval_s_expression(s_expression, environment)
+            return (None, result, environment)
+
+        head = s_expression.head
+
+        if head is loop_name:
+            return (s_expression.tail, None, environment)
+
+        elif head is IF:
+            if_arguments = list(s_expression.tail)
+            check_argument_number('if', if_arguments, 2, 3)
+            condition, environment = eval_s_expression(if_arguments[0], environment)
+
+            if not is_false(condition):
+                s_expression = if_arguments[1]
+            elif len(if_arguments) == 3:
+                s_expression = if_arguments[2]
+            else:
+                return (None, None, environment)
+
+        elif head is BEGIN:
+            expressions = list(s_expression.tail)
+
+            if not expressions:
+                return (None, None, environment)
+
+            for s_exp in expressions[:-1]:
+                _, environment = eval_s_expression(s_exp, environment)
+
+            s_expression = expressions[-1]
+
+        elif head is CASE:
+            body, environment = select_case_body(s_expression.tail, environment)
+
+            if not body:
+                return (None, None, environment)
+
+            for s_exp in body[:-1]:
+                _, environment = eval_s_expression(s_exp, environment)
+
+            s_expression = body[-1]
+
+        else:
+            expand = macro_expander(s_expression, environment)
+
+            if expand is None:
+                result, environment = eval_s_expression(s_expression, environment)
+                return (None, result, environment)
+
+            s_expression = expand_macro_call(expand, s_expression, environment)
+
+
+def only_tail_calls(s_expression, loop_name, environment, local_names):
+    """Return True if every reference to loop_name in s_expression is a
+    call in tail position (as understood by eval_loop_tail).
+
+    We expand macros as eval_loop_tail will, treating local_names as
+    variables rather than macros.
+
+    """
+    if isinstance(s_expression, CompiledExpression):
+        # eval_loop_tail evaluates these as a whole, so a call inside
+        # one is never in tail position
+        return not mentions_symbol(s_expression, loop_name)
+
+    if not isinstance(s_expression, Cons):
+        return s_expression is not loop_name
+
+    head = s_expression.head
+
+    if head is loop_name:
+        return not mentions_symbol(s_expression.tail, loop_name)
+
+    elif head is IF:
+        if len(s_expression) not in (3, 4):
+            return False
+
+        return not mentions_symbol(s_expression[1], loop_name) and \
+            all(only_tail_calls(branch, loop_name, environment, local_names)
+                for branch in s_expression.tail.tail)
+
+    elif head is BEGIN:
+        expressions = list(s_expression.tail)
+
+        if not expressions:
+            return True
+
+        return not any(mentions_symbol(s_exp, loop_name)
+                       for s_exp in expressions[:-1]) and \
+            only_tail_calls(expressions[-1], loop_name, environment, local_names)
+
+    elif head is CASE:
+        if not isinstance(s_expression.tail, Cons) or \
+           mentions_symbol(s_expression[1], loop_name):
+            return False
+
+        for clause in s_expression.tail.tail:
+            if not isinstance(clause, Cons):
+                return False
+
+            body = list(clause.tail)
+            if body and (any(mentions_symbol(s_exp, loop_name) for s_exp in body[:-1]) or
+                         not only_tail_calls(body[-1], loop_name, environment,
+                                             local_names)):
+                return False
+
+        return True
+
+    expand = macro_expander(s_expression, environment, local_names)
+    if expand is not None and mentions_symbol(s_expression.tail, loop_name):
+        try:
+            expansion = expand_macro_call(expand, s_expression, environment)
+        except InterpreterException:
+            # the error is reported when the loop runs
+            return False
+
+        return only_tail_calls(expansion, loop_name, environment, local_names)
+
+    return not mentions_symbol(s_expression, loop_name)
+
+
+def mentions_symbol(s_expression, symbol):
+    """Does symbol occur anywhere in s_expression, outside of quoted data?"""
+    if isinstance(s_expression, Symbol):
+        return s_expression is symbol
+
+    if isinstance(s_expression, CompiledExpression):
+        subexpressions = s_expression.subexpressions()
+
+        if subexpressions is None:
+            # we can't see inside it, so assume it does
+            return True
+
+        return any(mentions_symbol(s_exp, symbol) for s_exp in subexpressions)
+
+    if not isinstance(s_expression, Cons):
+        return False
+
+    if s_expression.head is QUOTE:
+        return False
+
+    element = s_expression
+    while isinstance(element, Cons):
+        if mentions_symbol(element.head, symbol):
+            return True
+        element = element.tail
+
+    return mentions_symbol(element, symbol)
+
+
+@define_primitive('do')
+def do_loop(arguments, environment):
+    """Iterate until a test is true, updating variables on each step.
+
+    Syntax:
+    do ((<variable> <init> <step>) ...) (<test> <expression> ...) <command> ...
+
+    Variables are rebound in place on each iteration, so we run in
+    constant space.
+
+    """
+    check_argument_number('do', arguments, 2)
+
+    variable_specs = arguments[0]
+    exit_clause = arguments[1]
+    commands = list(arguments.tail.tail)
+
+    if not isinstance(exit_clause, Cons):
+        raise SchemeSyntaxError("do requires a list containing a test as its second argument.")
+
+    test = exit_clause.head
+    exit_expressions = list(exit_clause.tail)
+
+    local_environment = {}
+    steps = []
+
+    for variable_spec in variable_specs:
+        if not isinstance(variable_spec, Cons) or len(variable_spec) not in (2, 3):
+            raise SchemeSyntaxError("Each do variable must be of the form "
+                                    "(<variable> <init>) or (<variable> <init> <step>).")
+
+        variable_name = variable_spec[0]
+        if not isinstance(variable_name, Symbol):
+            raise SchemeTypeError("do variables must be symbols, not %s." % variable_name.__class__)
+
+        local_environment[variable_name.value], environment = eval_s_expression(variable_spec[1], environment)
+
+        if len(variable_spec) == 3:
+            steps.append((variable_name.value, variable_spec[2]))
+
+    new_environment = dict(environment, **local_environment)
+
+    while True:
+        condition, new_environment = eval_s_expression(test, new_environment)
+
+        if not is_false(condition):
+            break
+
+        for command in commands:
+            _, new_environment = eval_s_expression(command, new_environment)
+
+        # evaluate every step before assigning any of them
+        values = []
+        for (variable_name, step) in steps:
+            value, new_environment = eval_s_expression(step, new_environment)
+            values.append(value)
+
+        for ((variable_name, _), value) in zip(steps, values):
+            new_environment[variable_name] = value
+
+    result = None
+    for s_exp in exit_expressions:
+        result, new_environment = eval_s_expression(s_exp, new_environment)
+
+    # update any global variables that weren't masked
+    for variable_name in environment:
+        if variable_name not in local_environment:
+            environment[variable_name] = new_environment[variable_name]
+
+    return (result, environment)
+
+
+@define_primitive('case')
+def case(arguments, environment):
+    """Evaluate the body of the clause whose datums contain the key.
+
+    Syntax:
+    case <key> ((<datum> ...) <expression> ...) ... (else <expression> ...)
+
+    The clauses are compiled once into a dict from datum to clause
+    body, so dispatch doesn't depend on the number of clauses.
+
+    """
+    body, environment = select_case_body(arguments, environment)
+
+    result = None
+    for s_exp in body:
+        result, environment = eval_s_expression(s_exp, environment)
+
+    return (result, environment)
+
+
+def select_case_body(arguments, environment):
+    """Evaluate the key of a case form, and return the list of
+    expressions in the matching clause.
+
+    """
+    check_argument_number('case', arguments, 1)
+
+    key, environment = eval_s_expression(arguments[0], environment)
+    # the datums are quoted, so they're boxed
+    key = box(key)
+
+    # We store the compiled table on the form itself, so it lives as
+    # long as the code does.
+    compiled_case = getattr(arguments, 'compiled_case', None)
+    if compiled_case is None:
+        compiled_case = compile_case(arguments.tail)
+        arguments.compiled_case = compiled_case
+
+    (dispatch_table, unhashable_datums, else_body) = compiled_case
+
+    dispatch_key = case_dispatch_key(key)
+    if dispatch_key is not None and dispatch_key in dispatch_table:
+        return (dispatch_table[dispatch_key], environment)
+
+    for (datum, body) in unhashable_datums:
+        if is_eqv(datum, key):
+            return (body, environment)
+
+    return (else_body, environment)
+
+
+def compile_case(clauses):
+    """Build a dispatch table for the clauses of a case form.
+
+    Returns a tuple (dispatch_table, unhashable_datums, else_body). We
+    can only look up atoms in dispatch_table, so other datums are
+    kept in a list of (datum, body) pairs and compared in order.
+    An else clause must come last.
+
+    """
+    dispatch_table = {}
+    unhashable_datums = []
+    else_body = []
+
+    clauses = list(clauses)
+
+    for (index, clause) in enumerate(clauses):
+        if not isinstance(clause, Cons):
+            raise SchemeSyntaxError("Each case clause must be of the form "
+                                    "((<datum> ...) <expression> ...).")
+
+        datums = clause.head
+        body = list(clause.tail)
+
+        if datums is ELSE:
+            if index != len(clauses) - 1:
+                raise SchemeSyntaxError("The else clause of case must be the last clause.")
+
+            else_body = body
+            break
+
+        if isinstance(datums, Atom):
+            raise SchemeSyntaxError("case clauses must start with a list of datums, "
+                                    "not %s." % datums.__class__)
+
+        for datum in datums:
+            dispatch_key = case_dispatch_key(datum)
+
+            if dispatch_key is None:
+                unhashable_datums.append((datum, body))
+            elif dispatch_key not in dispatch_table:
+                # if a datum is repeated, the first clause wins
+                dispatch_table[dispatch_key] = body
+
+    return (dispatch_table, unhashable_datums, else_body)
+
+
+def case_dispatch_key(value):
+    """Return a hashable key for value that matches exactly when eqv?
+    does, or None if we can't hash this value.
+
+    Atoms compare and hash consistently with is_eqv (so 1 matches 1.0,
+    and strings match by contents), so an atom is its own key.
+
+    """
+    if isinstance(value, (Atom, Nil)):
+        try:
+            hash(value)
+        except TypeError:
+            return None
+
+        return value
+
+    return None
+
+
+def parse_bindings(form_name, bindings):
+    """Convert ((<variable> <init>) ...) to a list of (name, init) pairs."""
+    if isinstance(bindings, Atom):
+        raise SchemeSyntaxError("%s requires a list of bindings." % form_name)
+
+    parsed_bindings = []
+
+    for binding in bindings:
+        if not isinstance(binding, Cons) or len(binding) != 2:
+            raise SchemeSyntaxError("Each %s binding must be of the form "
+                                    "(<variable> <init>)." % form_name)
+
+        if not isinstance(binding[0], Symbol):
+            raise SchemeTypeError("%s variables must be symbols, not %s." % (form_name, binding[0].__class__))
+
+        parsed_bindings.append((binding[0].value, binding[1]))
+
+    return parsed_bindings
+
+
+@define_primitive('define-record-type')
+def define_record_type(arguments, environment):
+    """Define a record type, with a constructor, a predicate, and
+    procedures to read and modify fields.
+
+    Syntax:
+    define-record-type <name> (<constructor> <field> ...) <predicate>
+        (<field> <accessor>) | (<field> <accessor> <modifier>) ...
+
+    The constructor may also be a bare name, in which case it takes
+    every field in order.
+
+    """
+    check_argument_number('define-record-type', arguments, 3)
+
+    type_name = arguments[0]
+    if not isinstance(type_name, Symbol):
+        raise SchemeTypeError("Record type names must be symbols, not %s." % type_name.__class__)
+
+    field_specs = list(arguments.tail.tail.tail)
+    for field_spec in field_specs:
+        if not isinstance(field_spec, Cons) or len(field_spec) not in (2, 3) or \
+           not all(isinstance(name, Symbol) for name in field_spec):
+            raise SchemeSyntaxError("Each record field must be of the form "
+                                    "(<field> <accessor>) or (<field> <accessor> <modifier>).")
+
+    field_names = [field_spec[0].value for field_spec in field_specs]
+    record_type = RecordType(type_name.value, field_names)
+    record_class = record_type.record_class
+
+    procedures = {}
+
+    # the constructor
+    constructor_spec = arguments[1]
+    if isinstance(constructor_spec, Symbol):
+        constructor_name = constructor_spec.value
+        constructor_fields = field_names
+    elif isinstance(constructor_spec, Cons) and \
+         all(isinstance(name, Symbol) for name in constructor_spec):
+        constructor_name = constructor_spec.head.value
+        constructor_fields = [name.value for name in constructor_spec.tail]
+    else:
+        raise SchemeSyntaxError("A record constructor must be a name, "
+                                "or of the form (<constructor> <field> ...).")
+
+    for field_name in constructor_fields:
+        if field_name not in field_names:
+            raise SchemeSyntaxError("%s is not a field of %s." % (field_name, type_name.value))
+
+    procedures[constructor_name] = make_record_constructor(
+        constructor_name, record_type, [field_names.index(field_name)
+                                        for field_name in constructor_fields])
+
+    # the predicate
+    predicate_name = arguments[2]
+    if not isinstance(predicate_name, Symbol):
+        raise SchemeTypeError("Record predicate names must be symbols, "
+                              "not %s." % predicate_name.__class__)
+
+    def predicate(arguments):
+        check_argument_number(predicate_name.value, arguments, 1, 1)
+        return Boolean(type(arguments[0]) is record_class)
+
+    procedures[predicate_name.value] = predicate
+
+    # accessors and modifiers
+    for (field_spec, slot) in zip(field_specs, record_type.slots):
+        procedures[field_spec[1].value] = make_record_accessor(field_spec[1].value,
+                                                               record_type, slot)
+
+        if len(field_spec) == 3:
+            procedures[field_spec[2].value] = make_record_modifier(field_spec[2].value,
+                                                                   record_type, slot)
+
+    for name in [type_name.value] + list(procedures):
+        if name in environment:
+            raise RedefinedVariable("Cannot define %s, as it has already been defined." % name)
+
+    environment[type_name.value] = record_type
+
+    for (name, procedure) in procedures.items():
+        environment[name] = BuiltInFunction(arguments_evaluated(procedure), name)
+
+    return (None, environment)
+
+
+def make_record_constructor(constructor_name, record_type, field_indexes):
+    record_class = record_type.record_class
+    slots = [record_type.slots[index] for index in field_indexes]
+
+    # fields that the constructor doesn't set are #f
+    unset_slots = [slot for slot in record_type.slots if slot not in slots]
+
+    def constructor(arguments):
+        check_argument_number(constructor_name, arguments, len(slots), len(slots))
+
+        record = record_class()
+        for (slot, value) in zip(slots, arguments):
+            slot.__set__(record, value)
+
+        for slot in unset_slots:
+            slot.__set__(record, Boolean(False))
+
+        return record
+
+    return constructor
+
+
+def check_record(function_name, record_type, record):
+    if type(record) is not record_type.record_class:
+        raise SchemeTypeError("%s requires a record of type %s, you gave me %s."
+                              % (function_name, record_type.name,
+                                 record.get_external_representation()))
+
+
+def make_record_accessor(accessor_name, record_type, slot):
+    def accessor(arguments):
+        check_argument_number(accessor_name, arguments, 1, 1)
+        check_record(accessor_name, record_type, arguments[0])
+
+        return slot.__get__(arguments[0])
+
+    return accessor
+
+
+def make_record_modifier(modifier_name, record_type, slot):
+    def modifier(arguments):
+        check_argument_number(modifier_name, arguments, 2, 2)
+        check_record(modifier_name, record_type, arguments[0])
+
+        slot.__set__(arguments[0], arguments[1])
+        return Nil()
+
+    return modifier
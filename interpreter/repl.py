@@ -4,6 +4,11 @@ import sys
 import os
 import cmd
 
+import check
+import fold
+import immediates
+import inline
+import specialise
 from evaluator import eval_program, load_standard_library, load_built_ins
 from errors import InterpreterException, SchemeSyntaxError, SchemeTypeError
 
@@ -40,6 +45,26 @@ class Repl(cmd.Cmd):
 
 
 if __name__ == '__main__':
+    if '--unboxed' in sys.argv:
+        sys.argv.remove('--unboxed')
+        immediates.unboxed = True
+
+    if '--specialise' in sys.argv:
+        sys.argv.remove('--specialise')
+        specialise.enabled = True
+
+    if '--fold' in sys.argv:
+        sys.argv.remove('--fold')
+        fold.enabled = True
+
+    if '--inline' in sys.argv:
+        sys.argv.remove('--inline')
+        inline.enabled = True
+
+    if '--check' in sys.argv:
+        sys.argv.remove('--check')
+        check.enabled = True
+
     environment = {}
     environment = load_built_ins(environment)
     environment = load_standard_library(environment)
@@ -58,6 +83,9 @@ if __name__ == '__main__':
         except InterpreterException as e:
             print("Error: %s" % e.message)
 
+        if fold.enabled:
+            print(fold.report(), file=sys.stderr)
+
     else:
         # interactive mode
         Repl(environment).cmdloop()
@@ -1,3 +1,5 @@
+import weakref
+
 import ply.yacc
 
 from .lexer import tokens
@@ -29,6 +31,70 @@ atom : SYMBOL | NUMBER | BOOLEAN | CHARACTER | STRING
 
 """
 
+# Literal constants (quoted data and self-evaluating atoms) are frozen
+# as we read them, and identical constants are hash-consed to a single
+# shared instance. Evaluating a literal then just returns that
+# instance, and nothing needs to copy it to protect the program text.
+
+# every constant we've read, keyed by its contents. An entry goes away
+# once no program refers to the constant.
+constants = weakref.WeakValueDictionary()
+
+QUOTE = Symbol("quote")
+
+
+def constant_key(constant):
+    if isinstance(constant, Cons):
+        # the head and tail are already shared, so identity suffices
+        return (Cons, id(constant.head), id(constant.tail))
+    elif isinstance(constant, Nil):
+        return (Nil,)
+    else:
+        # repr distinguishes 0.0 from -0.0, which are equal
+        return (constant.__class__, repr(constant.value))
+
+
+def share(constant):
+    """Return the shared instance of constant, whose children are
+    already shared.
+
+    """
+    key = constant_key(constant)
+    shared_constant = constants.get(key)
+
+    if shared_constant is None:
+        constant.frozen = True
+        constants[key] = shared_constant = constant
+
+    return shared_constant
+
+
+def freeze(s_expression):
+    """Return the frozen, shared instance of the literal s_expression."""
+    if isinstance(s_expression, Symbol) or s_expression.frozen:
+        # symbols are interned already
+        return s_expression
+
+    if isinstance(s_expression, Cons):
+        # walk along the list rather than recursing, so long lists
+        # are fine, then share from the end backwards
+        pairs = []
+        while isinstance(s_expression, Cons) and not s_expression.frozen:
+            pairs.append(s_expression)
+            s_expression = s_expression.tail
+
+        frozen_list = freeze(s_expression)
+
+        for pair in reversed(pairs):
+            pair.head = freeze(pair.head)
+            pair.tail = frozen_list
+            frozen_list = share(pair)
+
+        return frozen_list
+
+    return share(s_expression)
+
+
 # now, parse an expression and build a parse tree:
 
 def p_program(p):
@@ -49,12 +115,17 @@ def p_sexpression_list(p):
 
 def p_list(p):
     "list : LPAREN listarguments RPAREN"
-    p[0] = p[2]
+    arguments = p[2]
+
+    if arguments and arguments.head is QUOTE and arguments.tail:
+        arguments.tail.head = freeze(arguments.tail.head)
+
+    p[0] = arguments
 
 def p_list_quotesugar(p):
     "list : QUOTESUGAR sexpression"
     # convert 'foo to (quote foo)
-    p[0] = Cons(Symbol("quote"), Cons(p[2]))
+    p[0] = Cons(QUOTE, Cons(freeze(p[2])))
 
 def p_list_quasiquotesugar(p):
     "list : QUASIQUOTESUGAR sexpression"
@@ -86,23 +157,23 @@ def p_atom_symbol(p):
 
 def p_atom_number(p):
     "atom : INTEGER"
-    p[0] = Integer(p[1])
+    p[0] = freeze(Integer(p[1]))
 
 def p_atom_floating_point(p):
     "atom : FLOATING_POINT"
-    p[0] = FloatingPoint(p[1])
+    p[0] = freeze(FloatingPoint(p[1]))
 
 def p_atom_boolean(p):
     "atom : BOOLEAN"
-    p[0] = Boolean(p[1])
+    p[0] = freeze(Boolean(p[1]))
 
 def p_atom_character(p):
     "atom : CHARACTER"
-    p[0] = Character(p[1])
+    p[0] = freeze(Character(p[1]))
 
 def p_atom_string(p):
     "atom : STRING"
-    p[0] = String(p[1])
+    p[0] = freeze(String(p[1]))
 
 def p_error(p):
     raise SchemeSyntaxError("Parse error.")
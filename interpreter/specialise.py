@@ -0,0 +1,307 @@
+"""Type specialisation of arithmetic in function bodies.
+
+When enabled, we analyse the body of each function as it's defined,
+inferring whether local variables hold fixnums (integers), flonums
+(floats) or something unknown. Parameters are speculated from how
+they're used: n in (- n 1) is probably a fixnum. Calls to the function
+itself are speculated to return the type its body returns, if that's
+consistent.
+
+Two-argument calls to +, -, *, the comparisons, quotient, remainder
+and modulo whose operand types we know are replaced by a
+SpecialisedOperation. This computes the result directly, skipping the
+built-in calling convention and the generic type dispatch in
+numbers.py. Our types are only speculation, so every operation guards
+its assumptions at runtime: if the operator has been rebound or an
+operand has an unexpected type, we fall back to an ordinary call.
+
+"""
+import math
+import operator
+
+from . import immediates
+from .data_types import (Symbol, Cons, Integer, FloatingPoint, Boolean,
+                         BuiltInFunction)
+from .fold import FoldedExpression
+from .walker import CodeWalker, CompiledExpression, QUOTE, external_representation
+
+
+# whether we specialise function bodies as they're defined
+enabled = False
+
+FIXNUM = 'fixnum'
+FLONUM = 'flonum'
+BOOLEAN = 'boolean'
+
+# the classes a value of each type may have, boxed or not. True means
+# the value is raw.
+GUARDS = {
+    FIXNUM: {Integer: False, int: True},
+    FLONUM: {FloatingPoint: False, float: True},
+}
+
+BOXES = {
+    FIXNUM: Integer,
+    FLONUM: FloatingPoint,
+    BOOLEAN: Boolean,
+}
+
+
+def quotient(dividend, divisor):
+    # consistent with the quotient built-in
+    return math.trunc(dividend / divisor)
+
+
+def remainder(dividend, divisor):
+    # consistent with the remainder built-in
+    return dividend - (math.trunc(dividend / divisor) * divisor)
+
+
+ARITHMETIC = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+}
+
+# these are only defined on integers, and need a non-zero divisor
+INTEGER_DIVISION = {
+    'quotient': quotient,
+    'remainder': remainder,
+    'modulo': operator.mod,
+}
+
+COMPARISONS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '=': operator.eq,
+}
+
+class SpecialisedOperation(CompiledExpression):
+    """A call (name first second) to a numeric built-in, where we expect
+    first and second to have the types first_type and second_type.
+
+    """
+    __slots__ = ('name', 'operation', 'first', 'second', 'first_guard',
+                 'second_guard', 'result_type', 'result_box', 'needs_divisor')
+
+    def __init__(self, name, first, second, first_type, second_type, result_type):
+        self.name = name
+        self.first = first
+        self.second = second
+        self.first_guard = GUARDS[first_type]
+        self.second_guard = GUARDS[second_type]
+        self.result_type = result_type
+        self.result_box = BOXES[result_type]
+
+        self.needs_divisor = name in INTEGER_DIVISION
+        self.operation = (ARITHMETIC.get(name) or INTEGER_DIVISION.get(name) or
+                          COMPARISONS[name])
+
+    def evaluate(self, environment):
+        first, environment = eval_s_expression(self.first, environment)
+        second, environment = eval_s_expression(self.second, environment)
+
+        function = environment.get(self.name)
+
+        # guard our assumptions: the operator is still the built-in,
+        # and the operands have the types we expected
+        if function.__class__ is BuiltInFunction and function.name == self.name:
+            first_is_raw = self.first_guard.get(first.__class__)
+            second_is_raw = self.second_guard.get(second.__class__)
+
+            if first_is_raw is not None and second_is_raw is not None:
+                first_value = first if first_is_raw else first.value
+                second_value = second if second_is_raw else second.value
+
+                if not self.needs_divisor or second_value:
+                    result = self.operation(first_value, second_value)
+
+                    if immediates.unboxed:
+                        return (result, environment)
+
+                    return (self.result_box(result), environment)
+
+        return self.fall_back(function, first, second, environment)
+
+    def fall_back(self, function, first, second, environment):
+        """Call whatever the operator is bound to now, as the evaluator
+        would have done.
+
+        """
+        if function is None:
+            function, environment = eval_symbol(self.name, environment)
+
+        check_callable(function)
+
+        # the operands are already evaluated, so we quote them
+        quoted_operands = Cons.from_list([Cons(QUOTE, Cons(first)),
+                                          Cons(QUOTE, Cons(second))])
+        return function(quoted_operands, environment)
+
+    def subexpressions(self):
+        return [self.first, self.second]
+
+    def get_external_representation(self):
+        return "(%s %s %s)" % (self.name, external_representation(self.first),
+                               external_representation(self.second))
+
+
+def join(first_type, second_type):
+    """The type of a value that may have come from either type."""
+    if first_type == second_type:
+        return first_type
+
+    return None
+
+
+def literal_type(s_expression):
+    if s_expression.__class__ is Integer:
+        return FIXNUM
+    elif s_expression.__class__ is FloatingPoint:
+        return FLONUM
+
+    return None
+
+
+class Specialiser(CodeWalker):
+    """Rewrite the body of a function, specialising the numeric
+    operations we can infer types for. The info for each expression is
+    its type.
+
+    """
+    def __init__(self, function_name, environment):
+        super().__init__(environment)
+        self.function_name = function_name
+
+        # the type we speculate calls to function_name return
+        self.return_type = None
+
+        # for each local variable of unknown type, the set of types it
+        # has been combined with in arithmetic
+        self.votes = {}
+
+        self.count = 0
+
+    def walk_literal(self, atom):
+        return (atom, literal_type(atom))
+
+    def walk_compiled(self, compiled_expression, scope):
+        if isinstance(compiled_expression, SpecialisedOperation):
+            return (compiled_expression, compiled_expression.result_type)
+
+        if isinstance(compiled_expression, FoldedExpression):
+            # a constant, whose guards we keep
+            return (compiled_expression, literal_type(compiled_expression.replacement))
+
+        return (compiled_expression, None)
+
+    def walk_call(self, s_expression, scope):
+        head = s_expression.head
+
+        if isinstance(head, Symbol) and head.value not in scope:
+            name = head.value
+
+            if name in ARITHMETIC or name in INTEGER_DIVISION or name in COMPARISONS:
+                return self.specialise_operation(name, s_expression, scope)
+
+        elements = [self.walk(element, scope)[0] for element in s_expression]
+        result_type = None
+
+        if head is self.function_name and self.function_name.value not in scope:
+            result_type = self.return_type
+
+        return (Cons.from_list(elements), result_type)
+
+    def specialise_operation(self, name, s_expression, scope):
+        operands = list(s_expression.tail)
+        rewritten = [self.walk(operand, scope) for operand in operands]
+        elements = [s_expression.head] + [new_operand for (new_operand, _) in rewritten]
+
+        if len(operands) != 2:
+            return (Cons.from_list(elements), None)
+
+        ((first, first_type), (second, second_type)) = rewritten
+
+        # record how local variables of unknown type are used
+        for (operand, operand_type, other_type) in [(first, first_type, second_type),
+                                                    (second, second_type, first_type)]:
+            if isinstance(operand, Symbol) and operand_type is None and other_type in GUARDS:
+                self.votes.setdefault(operand.value, set()).add(other_type)
+
+        # speculate that an unknown operand matches the known one
+        if first_type not in GUARDS:
+            first_type = second_type
+        if second_type not in GUARDS:
+            second_type = first_type
+
+        if first_type not in GUARDS or second_type not in GUARDS:
+            return (Cons.from_list(elements), None)
+
+        if name in INTEGER_DIVISION and (first_type, second_type) != (FIXNUM, FIXNUM):
+            return (Cons.from_list(elements), None)
+
+        if name in COMPARISONS:
+            result_type = BOOLEAN
+        elif FLONUM in (first_type, second_type):
+            result_type = FLONUM
+        else:
+            result_type = FIXNUM
+
+        self.count += 1
+        return (SpecialisedOperation(name, first, second, first_type, second_type,
+                                     result_type),
+                result_type)
+
+    def walk_if(self, s_expression, scope):
+        rewritten = [self.walk(argument, scope) for argument in s_expression.tail]
+        elements = [new_argument for (new_argument, _) in rewritten]
+
+        if len(rewritten) == 3:
+            result_type = join(rewritten[1][1], rewritten[2][1])
+        else:
+            result_type = None
+
+        return (Cons(s_expression.head, Cons.from_list(elements)), result_type)
+
+
+def specialise_function(function_name, parameters, body, environment):
+    """Return body with its numeric operations specialised, or body
+    unchanged if there's nothing we can specialise.
+
+    """
+    specialiser = Specialiser(function_name, environment)
+
+    # first, see how the parameters are used
+    scope = {parameter.value: None for parameter in parameters}
+    specialiser.walk_body(body, dict(scope))
+
+    for parameter in parameters:
+        votes = specialiser.votes.get(parameter.value)
+
+        if votes is not None and len(votes) == 1:
+            scope[parameter.value] = votes.pop()
+
+    # then speculate about what we return: if assuming a type for
+    # recursive calls gives the body that type, it's consistent
+    for return_type in [FIXNUM, FLONUM]:
+        specialiser.return_type = return_type
+        (_, body_type) = specialiser.walk_body(body, dict(scope))
+
+        if body_type == return_type:
+            break
+    else:
+        specialiser.return_type = None
+
+    specialiser.count = 0
+    (new_body, _) = specialiser.walk_body(body, dict(scope))
+
+    if not specialiser.count:
+        return body
+
+    return Cons.from_list(new_body)
+
+
+# this import has to be at the end to avoid circular import issues
+from .evaluator import eval_s_expression, eval_symbol, check_callable
@@ -2,13 +2,23 @@
 
 import unittest
 import sys
+import os
+import tempfile
+import tracemalloc
+from fractions import Fraction
 from io import StringIO
 
+import numpy
+
 from .evaluator import eval_program, load_standard_library, load_built_ins
+from . import check, fold, immediates, inline, specialise
+from .scheme_parser import parser
+from .built_ins.base import unboxed_built_ins
 from .errors import (SchemeTypeError, SchemeStackOverflow, SchemeSyntaxError,
-                    SchemeArityError)
-from .data_types import (Vector, Cons, Nil, Integer, Boolean, String,
-                        Character, FloatingPoint)
+                    SchemeArityError, InvalidArgument, UndefinedVariable)
+from .data_types import (Vector, Cons, Nil, Integer, Boolean, String, Symbol,
+                        Character, FloatingPoint, Rational, NumericVector, Array,
+                        Bytevector, Bitset)
 
 
 class InterpreterTest(unittest.TestCase):
@@ -133,6 +143,11 @@ class EvaluatorTest(InterpreterTest):
         program = "(define (g . everything) everything) (g (+ 2 3))"
         self.assertEvaluatesTo(program, Cons(Integer(5)))
 
+        # test explicit parameters before the dot
+        program = "(define (h a b . rest) (list a b rest)) (h 1 2 3)"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(2),
+                                                        Cons(Integer(3))]))
+
     def test_lambda(self):
         program = "((lambda (x) (+ x x)) 4)"
         self.assertEvaluatesTo(program, Integer(8))
@@ -151,6 +166,106 @@ class EvaluatorTest(InterpreterTest):
         program = "(begin (define x 1) (+ x 3))"
         self.assertEvaluatesTo(program, Integer(4))
 
+    def test_let(self):
+        program = "(let ((x 1) (y 2)) (+ x y))"
+        self.assertEvaluatesTo(program, Integer(3))
+
+        program = "(define x 1) (let ((x 2)) (set! x 3)) x"
+        self.assertEvaluatesTo(program, Integer(1))
+
+    def test_named_let(self):
+        program = "(let loop ((i 0) (total 0)) (if (< i 5) (loop (+ i 1) (+ total i)) total))"
+        self.assertEvaluatesTo(program, Integer(10))
+
+        # the loop variables are rebound in place, so this must not overflow
+        program = "(let loop ((i 0)) (if (< i 2000) (loop (+ i 1)) i))"
+        self.assertEvaluatesTo(program, Integer(2000))
+
+    def test_named_let_in_macros(self):
+        # tail calls in the expansion of a macro are loops too
+        program = "(let loop ((i 0)) (and (< i 2000) (loop (+ i 1))))"
+        self.assertEvaluatesTo(program, Boolean(False))
+
+        program = "(let loop ((i 0)) (or (= i 2000) (loop (+ i 1))))"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+        program = "(let loop ((i 0)) (cond (((= i 2000) i) (else (loop (+ i 1))))))"
+        self.assertEvaluatesTo(program, Integer(2000))
+
+        # not a tail call, so we recurse
+        program = "(let loop ((i 0)) (or (and (< i 3) (loop (+ i 1))) i))"
+        self.assertEvaluatesTo(program, Integer(3))
+
+    def test_and_evaluates_once(self):
+        program = "(define count 0) (and #t (begin (set! count (+ count 1)) count)) count"
+        self.assertEvaluatesTo(program, Integer(1))
+
+    def test_named_let_non_tail_call(self):
+        program = "(let factorial ((n 5)) (if (= n 0) 1 (* n (factorial (- n 1)))))"
+        self.assertEvaluatesTo(program, Integer(120))
+
+    def test_named_let_updates_globals(self):
+        program = """(define total 0)
+        (let loop ((i 0))
+          (if (< i 4)
+              (begin (set! total (+ total i)) (loop (+ i 1)))))
+        total"""
+        self.assertEvaluatesTo(program, Integer(6))
+
+    def test_do(self):
+        program = "(do ((i 0 (+ i 1)) (total 0 (+ total i))) ((= i 5) total))"
+        self.assertEvaluatesTo(program, Integer(10))
+
+        program = "(do ((i 0 (+ i 1))) ((= i 2000) i))"
+        self.assertEvaluatesTo(program, Integer(2000))
+
+    def test_do_commands(self):
+        program = """(define v (make-vector 3))
+        (do ((i 0 (+ i 1))) ((= i 3)) (vector-set! v i i))
+        v"""
+        self.assertEvaluatesAs(program, Vector.from_list([Integer(0), Integer(1), Integer(2)]))
+
+    def test_case(self):
+        program = "(case (* 2 3) ((2 3 5 7) 'prime) ((1 4 6 8 9) 'composite))"
+        self.assertEvaluatesTo(program, Symbol('composite'))
+
+        program = "(case #\\b ((#\\a) 1) ((#\\b) 2))"
+        self.assertEvaluatesTo(program, Integer(2))
+
+        program = "(case 'x ((x) 1 2))"
+        self.assertEvaluatesTo(program, Integer(2))
+
+    def test_case_else(self):
+        program = "(case (car '(c d)) ((a e i o u) 'vowel) ((w y) 'semivowel) (else 'consonant))"
+        self.assertEvaluatesTo(program, Symbol('consonant'))
+
+    def test_case_matches_like_eqv(self):
+        program = "(case 1 ((1.0) 'float) (else 'integer))"
+        self.assertEvaluatesTo(program, Symbol('float'))
+
+        program = "(case \"b\" ((\"a\") 1) ((\"b\") 2))"
+        self.assertEvaluatesTo(program, Integer(2))
+
+        program = "(case (list 1) (((1)) 'same) (else 'different))"
+        self.assertEvaluatesTo(program, Symbol('different'))
+
+    def test_case_else_must_be_last(self):
+        program = "(case 1 (else 2) ((1) 3))"
+        with self.assertRaises(SchemeSyntaxError):
+            self.evaluate(program)
+
+    def test_case_no_match(self):
+        program = "(case 3 ((1 2) 'small))"
+        self.assertEvaluatesTo(program, None)
+
+    def test_case_in_named_let(self):
+        program = """(let loop ((i 0) (total 0))
+          (case i
+            ((2000) total)
+            ((1 2) (loop (+ i 1) (+ total 10)))
+            (else (loop (+ i 1) total))))"""
+        self.assertEvaluatesTo(program, Integer(20))
+
     def test_comment(self):
         program = "; 1"
 
@@ -222,6 +337,49 @@ class EquivalenceTest(InterpreterTest):
         program = "(eq? (quote foo) (quote foo))"
         self.assertEvaluatesTo(program, Boolean(True))
 
+    def test_equal(self):
+        program = "(equal? (list 1 (vector 2)) (list 1 (vector 2)))"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+        program = "(equal? (list 1 2) (list 1 3))"
+        self.assertEvaluatesTo(program, Boolean(False))
+
+    def test_equal_deeply_nested(self):
+        # build the lists in Python, as the interpreter would overflow
+        first = Nil()
+        second = Nil()
+        for _ in range(100000):
+            first = Cons(first)
+            second = Cons(second)
+
+        self.environment['first'] = first
+        self.environment['second'] = second
+        self.assertEvaluatesTo("(equal? first second)", Boolean(True))
+
+    def test_equal_cyclic(self):
+        # (1 . #0#) and (1 1 . #0#) unroll to the same infinite list
+        program = "(define x (list 1)) (set-cdr! x x) " \
+                  "(define y (list 1 1)) (set-cdr! (cdr y) y) " \
+                  "(define z (list 2)) (set-cdr! z z) " \
+                  "(list (equal? x y) (equal? x z) (= (equal-hash x) (equal-hash y)))"
+        self.assertEvaluatesTo(program, Cons.from_list([Boolean(True), Boolean(False),
+                                                        Boolean(True)]))
+
+    def test_equal_hash(self):
+        program = "(= (equal-hash (list 1 (vector 2 3))) (equal-hash (list 1 (vector 2 3))))"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+        program = "(< (equal-hash (list 1 2) 10) 10)"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+        program = "(= (hash \"abc\" 7) (equal-hash \"abc\" 7))"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+        with self.assertRaises(SchemeTypeError) as context:
+            self.evaluate("(hash 1 0)")
+        self.assertIn("hash requires", str(context.exception))
+        self.assertNotIn("equal-hash", str(context.exception))
+
 
 class ListTest(InterpreterTest):
     def test_car(self):
@@ -249,6 +407,16 @@ class ListTest(InterpreterTest):
         program = "(cddr '((1 3) 2))"
         self.assertEvaluatesTo(program, Nil())
 
+        program = "(caddr '(1 2 3))"
+        self.assertEvaluatesTo(program, Integer(3))
+
+        program = "(cadadr '(1 (2 3)))"
+        self.assertEvaluatesTo(program, Integer(3))
+
+        program = "(cdddr '(1 2))"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
     def test_set_car(self):
         program = "(define x (list 4 5 6)) (set-car! x 1) x"
         self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(5), Integer(6)]))
@@ -282,6 +450,12 @@ class ListTest(InterpreterTest):
         program = "(list? 1)"
         self.assertEvaluatesTo(program, Boolean(False))
 
+        program = "(list? (cons 1 2))"
+        self.assertEvaluatesTo(program, Boolean(False))
+
+        program = "(define x (list 1 2)) (set-cdr! (cdr x) x) (list? x)"
+        self.assertEvaluatesTo(program, Boolean(False))
+
     def test_list(self):
         program = "(list)"
         self.assertEvaluatesTo(program, Nil())
@@ -296,6 +470,12 @@ class ListTest(InterpreterTest):
         program = "(length (cons 2 (cons 3 '())))"
         self.assertEvaluatesTo(program, Integer(2))
 
+    def test_length_long_list(self):
+        self.environment['long-list'] = Cons.from_list([Integer(i) for i in range(100000)])
+
+        program = "(length long-list)"
+        self.assertEvaluatesTo(program, Integer(100000))
+
     def test_pair(self):
         program = "(pair? (quote (a b)))"
         self.assertEvaluatesTo(program, Boolean(True))
@@ -307,6 +487,129 @@ class ListTest(InterpreterTest):
         self.assertEvaluatesTo(program, Boolean(False))
 
 
+class ListLibraryTest(InterpreterTest):
+    """Test the SRFI-1 list operations."""
+    def test_append(self):
+        program = "(append)"
+        self.assertEvaluatesTo(program, Nil())
+
+        program = "(append '(1 2) '() '(3))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(2), Integer(3)]))
+
+        program = "(append '(1) 2)"
+        self.assertEvaluatesTo(program, Cons(Integer(1), Integer(2)))
+
+    def test_append_shares_last_list(self):
+        program = "(define x '(2 3)) (eq? (cdr (append '(1) x)) x)"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+    def test_reverse(self):
+        program = "(reverse '(1 2 3))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(3), Integer(2), Integer(1)]))
+
+        program = "(reverse '())"
+        self.assertEvaluatesTo(program, Nil())
+
+    def test_list_tail(self):
+        program = "(define x '(1 2 3)) (eq? (list-tail x 1) (cdr x))"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+        program = "(list-tail '(1 2) 3)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_list_ref(self):
+        program = "(list-ref '(a b c) 2)"
+        self.assertEvaluatesTo(program, Symbol('c'))
+
+    def test_memq(self):
+        program = "(memq 'c '(a b c d))"
+        self.assertEvaluatesTo(program, Cons.from_list([Symbol('c'), Symbol('d')]))
+
+        program = "(memq 'e '(a b c d))"
+        self.assertEvaluatesTo(program, Boolean(False))
+
+    def test_member(self):
+        program = "(member '(1) '((0) (1) (2)))"
+        self.assertEvaluatesTo(program, Cons.from_list([Cons(Integer(1)), Cons(Integer(2))]))
+
+        program = "(member 2.0 '(1 2 3) =)"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(2), Integer(3)]))
+
+    def test_assq(self):
+        program = "(assq 'b '((a 1) (b 2)))"
+        self.assertEvaluatesTo(program, Cons.from_list([Symbol('b'), Integer(2)]))
+
+        program = "(assq 'c '((a 1) (b 2)))"
+        self.assertEvaluatesTo(program, Boolean(False))
+
+    def test_errors_name_the_procedure(self):
+        for name in ['memq', 'memv', 'assq', 'assv']:
+            with self.assertRaises(SchemeArityError) as context:
+                self.evaluate("(%s 1)" % name)
+
+            self.assertTrue(context.exception.message.startswith(name + " "))
+
+        with self.assertRaises(SchemeTypeError) as context:
+            self.evaluate("(assq 1 '(2))")
+
+        self.assertTrue(context.exception.message.startswith("assq "))
+
+    def test_assoc(self):
+        program = "(assoc '(b) '(((a) 1) ((b) 2)))"
+        self.assertEvaluatesTo(program, Cons.from_list([Cons(Symbol('b')), Integer(2)]))
+
+    def test_filter(self):
+        program = "(filter odd? '(1 2 3 4 5))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(3), Integer(5)]))
+
+    def test_filter_shares_tail(self):
+        program = "(define x '(2 3 5)) (eq? (filter odd? x) (cdr x))"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+    def test_delete(self):
+        program = "(delete 2 '(1 2 3 2))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(3)]))
+
+    def test_reduce(self):
+        program = "(reduce + 0 '(1 2 3))"
+        self.assertEvaluatesTo(program, Integer(6))
+
+        program = "(reduce + 0 '())"
+        self.assertEvaluatesTo(program, Integer(0))
+
+        program = "(reduce - 0 '(1 2 3))"
+        self.assertEvaluatesTo(program, Integer(2))
+
+    def test_fold_left(self):
+        program = "(fold-left - 0 '(1 2 3))"
+        self.assertEvaluatesTo(program, Integer(-6))
+
+        program = "(fold-left (lambda (total x y) (+ total (* x y))) 0 '(1 2) '(3 4))"
+        self.assertEvaluatesTo(program, Integer(11))
+
+    def test_fold_right(self):
+        program = "(fold-right cons '() '(1 2 3))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(2), Integer(3)]))
+
+        program = "(fold-right - 0 '(1 2 3))"
+        self.assertEvaluatesTo(program, Integer(2))
+
+    def test_last_pair(self):
+        program = "(last-pair '(1 2 3))"
+        self.assertEvaluatesTo(program, Cons(Integer(3)))
+
+    def test_iota(self):
+        program = "(iota 3)"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(0), Integer(1), Integer(2)]))
+
+        program = "(iota 3 1 2)"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(3), Integer(5)]))
+
+        program = "(iota 2 0 0.5)"
+        self.assertEvaluatesTo(program, Cons.from_list([FloatingPoint(0.0), FloatingPoint(0.5)]))
+
+
 class ControlTest(InterpreterTest):
     def test_is_procedure(self):
         program = "(procedure? car)"
@@ -322,6 +625,17 @@ class ControlTest(InterpreterTest):
         program = "(map (lambda (x) (+ x 1)) '(2 3))"
         self.assertEvaluatesTo(program, Cons(Integer(3), Cons(Integer(4))))
 
+        program = "(map car '((1 2) (3 4)))"
+        self.assertEvaluatesTo(program, Cons(Integer(1), Cons(Integer(3))))
+
+    def test_map_multiple_lists(self):
+        program = "(map + '(1 2 3) '(10 20 30))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(11), Integer(22), Integer(33)]))
+
+        # we stop at the end of the shortest list
+        program = "(map (lambda (x y) (* x y)) '(1 2 3) '(4 5))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(4), Integer(10)]))
+
     def test_for_each(self):
         program = """(let ((total 0))
      (for-each
@@ -330,6 +644,12 @@ class ControlTest(InterpreterTest):
      total)"""
         self.assertEvaluatesTo(program, Integer(6))
 
+    def test_for_each_multiple_lists(self):
+        program = """(define total 0)
+        (for-each (lambda (x y) (set! total (+ total (* x y)))) '(1 2) '(3 4))
+        total"""
+        self.assertEvaluatesTo(program, Integer(11))
+
 
 class MathsTest(InterpreterTest):
     def test_addition(self):
@@ -367,10 +687,51 @@ class MathsTest(InterpreterTest):
 
     def test_division(self):
         program = "(/ 8)"
-        self.assertEvaluatesTo(program, FloatingPoint(0.125))
+        self.assertEvaluatesTo(program, Rational(Fraction(1, 8)))
 
         program = "(/ 12 3 2)"
         self.assertEvaluatesTo(program, Integer(2))
+        self.assertIsInstance(self.evaluate(program), Integer)
+
+        program = "(/ 1.0 4)"
+        self.assertEvaluatesTo(program, FloatingPoint(0.25))
+
+        program = "(/ 1 0)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_rationals(self):
+        program = "(+ (/ 1 3) (/ 2 3))"
+        self.assertEvaluatesTo(program, Integer(1))
+        self.assertIsInstance(self.evaluate(program), Integer)
+
+        program = "(* (/ 1 3) 3 (/ 1 2))"
+        self.assertEvaluatesTo(program, Rational(Fraction(1, 2)))
+
+        program = "(+ (/ 1 2) 0.25)"
+        self.assertIsInstance(self.evaluate(program), FloatingPoint)
+
+        program = "(list (exact? (/ 1 3)) (< (/ 1 3) 0.34 (/ 1 2)))"
+        self.assertEvaluatesTo(program, Cons.from_list([Boolean(True), Boolean(True)]))
+
+        program = "(list (numerator (/ 6 4)) (denominator (/ 6 4)))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(3), Integer(2)]))
+
+    def test_exact_inexact(self):
+        program = "(exact 0.5)"
+        self.assertEvaluatesTo(program, Rational(Fraction(1, 2)))
+
+        program = "(inexact (/ 1 4))"
+        self.assertEvaluatesTo(program, FloatingPoint(0.25))
+
+    def test_arithmetic_type_errors(self):
+        program = "(+ 1 #t)"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+        program = "(< 1 2 #\\a)"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
 
     def test_less_than(self):
         program = "(< 1 1)"
@@ -622,9 +983,36 @@ class StringTest(InterpreterTest):
         self.assertEvaluatesTo(program, Character('c'))
 
     def test_string_set(self):
-        program = '(define s "abc") (string-set! s 0 #\z) s'
+        program = '(define s (string-copy "abc")) (string-set! s 0 #\\z) s'
         self.assertEvaluatesTo(program, String('zbc'))
 
+        # string literals are constants
+        program = '(define t "abc") (string-set! t 0 #\\z)'
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_string_copy(self):
+        program = '(string-copy "abcde" 1 3)'
+        self.assertEvaluatesTo(program, String('bc'))
+
+        program = '(string-copy "abc" 2 1)'
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_string_comparison(self):
+        program = '(string=? "abc" "abc")'
+        self.assertEvaluatesTo(program, Boolean(True))
+
+        program = '(string<? "abc" "abd" "b")'
+        self.assertEvaluatesTo(program, Boolean(True))
+
+        program = '(string>? "abc" "abd")'
+        self.assertEvaluatesTo(program, Boolean(False))
+
+        program = '(string<=? "b" 1)'
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
 
 class BooleanTest(InterpreterTest):
     def test_not(self):
@@ -712,6 +1100,1463 @@ class VectorTest(InterpreterTest):
             program,
             Vector.from_list([Integer(5)]))
 
+        program = "(let ((v (make-vector 3 0))) (vector-fill! v 5 1) v)"
+        self.assertEvaluatesAs(
+            program,
+            Vector.from_list([Integer(0), Integer(5), Integer(5)]))
+
+    def test_long_vector_to_list(self):
+        self.environment['long-vector'] = Vector.from_list([Integer(i) for i in range(100000)])
+
+        program = "(length (vector->list long-vector))"
+        self.assertEvaluatesTo(program, Integer(100000))
+
+    def test_vector_copy(self):
+        program = "(define v (vector 1 2 3)) (define w (vector-copy v)) (vector-set! w 0 4) v"
+        self.assertEvaluatesAs(program, Vector.from_list([Integer(1), Integer(2), Integer(3)]))
+
+        program = "(vector-copy (vector 1 2 3) 1)"
+        self.assertEvaluatesAs(program, Vector.from_list([Integer(2), Integer(3)]))
+
+    def test_subvector(self):
+        program = "(subvector (vector 1 2 3 4) 1 3)"
+        self.assertEvaluatesAs(program, Vector.from_list([Integer(2), Integer(3)]))
+
+        program = "(subvector (vector 1 2 3 4) 3 5)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_vector_grow(self):
+        program = "(vector-length (vector-grow (vector 1 2) 5))"
+        self.assertEvaluatesTo(program, Integer(5))
+
+        program = "(vector-ref (vector-grow (vector 1 2) 5) 1)"
+        self.assertEvaluatesTo(program, Integer(2))
+
+    def test_vector_map(self):
+        program = "(vector-map + (vector 1 2) (vector 10 20 30))"
+        self.assertEvaluatesAs(program, Vector.from_list([Integer(11), Integer(22)]))
+
+    def test_vector_for_each(self):
+        program = """(define total 0)
+        (vector-for-each (lambda (x) (set! total (+ total x))) (vector 1 2 3))
+        total"""
+        self.assertEvaluatesTo(program, Integer(6))
+
+    def test_vector_map_type_error(self):
+        for function_name in ['vector-map', 'vector-for-each']:
+            with self.assertRaises(SchemeTypeError) as context:
+                self.evaluate("(%s 1 (vector))" % function_name)
+            self.assertIn(function_name, str(context.exception))
+
+
+class SortTest(InterpreterTest):
+    def test_sort_list(self):
+        program = "(sort '(3 1 2) <)"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(2), Integer(3)]))
+
+        program = "(sort '(3 1.5 2) >)"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(3), Integer(2), FloatingPoint(1.5)]))
+
+    def test_sort_vector(self):
+        program = '(sort (vector "b" "c" "a") string<?)'
+        self.assertEvaluatesAs(program, Vector.from_list([String("a"), String("b"), String("c")]))
+
+    def test_sort_is_stable(self):
+        program = "(sort '((2 a) (1 b) (2 c) (1 d)) (lambda (x y) (< (car x) (car y))))"
+        self.assertEvaluatesTo(program, Cons.from_list([
+            Cons.from_list([Integer(1), Symbol('b')]),
+            Cons.from_list([Integer(1), Symbol('d')]),
+            Cons.from_list([Integer(2), Symbol('a')]),
+            Cons.from_list([Integer(2), Symbol('c')])]))
+
+    def test_list_sort(self):
+        program = "(list-sort (lambda (x y) (> x y)) '(1 3 2))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(3), Integer(2), Integer(1)]))
+
+    def test_vector_sort(self):
+        program = "(define v (vector 3 1 2)) (vector-sort < v)"
+        self.assertEvaluatesAs(program, Vector.from_list([Integer(1), Integer(2), Integer(3)]))
+
+        # vector-sort returns a new vector
+        program = "v"
+        self.assertEvaluatesAs(program, Vector.from_list([Integer(3), Integer(1), Integer(2)]))
+
+    def test_vector_sort_in_place(self):
+        program = "(define v (vector #\\c #\\a #\\b)) (vector-sort! v char<?) v"
+        self.assertEvaluatesAs(program, Vector.from_list([Character('a'), Character('b'), Character('c')]))
+
+    def test_sort_type_error(self):
+        program = "(sort 1 <)"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+        program = "(sort '(1 2) 1)"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+
+class NumericVectorTest(InterpreterTest):
+    def test_constructors(self):
+        program = "(f64vector 1 2.5)"
+        self.assertEvaluatesTo(program, NumericVector('f64', numpy.array([1.0, 2.5])))
+
+        program = "(make-u8vector 2 7)"
+        self.assertEvaluatesTo(program, NumericVector('u8', numpy.array([7, 7], dtype=numpy.uint8)))
+
+        program = "(list->s64vector '(1 2))"
+        self.assertEvaluatesTo(program, NumericVector('s64', numpy.array([1, 2])))
+
+    def test_element_types_are_checked(self):
+        program = "(u8vector 256)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+        program = "(s64vector 1.5)"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+        program = "(u8vector (/ 1 2))"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+        program = "(define v (s64vector 1)) (s64vector-set! v 0 (/ 7 2))"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+        program = "(f64vector (/ 1 2))"
+        self.assertEvaluatesTo(program, NumericVector('f64', numpy.array([0.5])))
+
+    def test_predicate(self):
+        program = "(f64vector? (f64vector 1))"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+        program = "(f64vector? (s64vector 1))"
+        self.assertEvaluatesTo(program, Boolean(False))
+
+    def test_ref_and_set(self):
+        program = "(define v (s64vector 1 2 3)) (s64vector-set! v 1 5) (s64vector-ref v 1)"
+        self.assertEvaluatesTo(program, Integer(5))
+
+    def test_generic_vector_access(self):
+        program = "(define v (f64vector 1 2 3)) (vector-set! v 0 4.5) (vector-ref v 0)"
+        self.assertEvaluatesTo(program, FloatingPoint(4.5))
+
+        program = "(vector-length (f64vector 1 2 3))"
+        self.assertEvaluatesTo(program, Integer(3))
+
+    def test_to_list(self):
+        program = "(f64vector->list (f64vector 1 2))"
+        self.assertEvaluatesTo(program, Cons.from_list([FloatingPoint(1.0), FloatingPoint(2.0)]))
+
+    def test_elementwise_arithmetic(self):
+        program = "(numeric-vector+ (s64vector 1 2) (s64vector 10 20))"
+        self.assertEvaluatesTo(program, NumericVector('s64', numpy.array([11, 22])))
+
+        program = "(numeric-vector* (s64vector 1 2) 3)"
+        self.assertEvaluatesTo(program, NumericVector('s64', numpy.array([3, 6])))
+
+        program = "(numeric-vector/ (s64vector 1 2) 2)"
+        self.assertEvaluatesTo(program, NumericVector('f64', numpy.array([0.5, 1.0])))
+
+        program = "(numeric-vector- (s64vector 1 2) (s64vector 1 2 3))"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_integer_overflow(self):
+        program = "(numeric-vector+ (u8vector 200) (u8vector 10))"
+        self.assertEvaluatesTo(program, NumericVector('u8', numpy.array([210], dtype=numpy.uint8)))
+
+        program = "(numeric-vector+ (u8vector 200) (u8vector 100))"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+        program = "(numeric-vector+ (u8vector 1) 300)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+        program = "(numeric-vector* (s64vector 9223372036854775807) 2)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+        program = "(numeric-vector-dot (u8vector 200) (u8vector 200))"
+        self.assertEvaluatesTo(program, Integer(40000))
+
+        program = "(numeric-vector-sum (s64vector 9223372036854775807 1))"
+        self.assertEvaluatesTo(program, Integer(9223372036854775808))
+
+    def test_division_by_zero(self):
+        program = "(numeric-vector/ (s64vector 1) (s64vector 0))"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+        program = "(numeric-vector-map modulo (s64vector 1) (s64vector 0))"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_reductions(self):
+        program = "(numeric-vector-sum (s64vector 1 2 3))"
+        self.assertEvaluatesTo(program, Integer(6))
+
+        program = "(numeric-vector-dot (f64vector 1 2) (f64vector 3 4))"
+        self.assertEvaluatesTo(program, FloatingPoint(11.0))
+
+        program = "(numeric-vector-min (s64vector 3 1 2))"
+        self.assertEvaluatesTo(program, Integer(1))
+
+        program = "(numeric-vector-max (s64vector 3 1 2))"
+        self.assertEvaluatesTo(program, Integer(3))
+
+    def test_map(self):
+        program = "(numeric-vector-map - (s64vector 1 2))"
+        self.assertEvaluatesTo(program, NumericVector('s64', numpy.array([-1, -2])))
+
+        # integer results are s64, whatever the type of the vector
+        program = "(numeric-vector-map - (u8vector 1))"
+        self.assertEvaluatesTo(program, NumericVector('s64', numpy.array([-1])))
+
+        program = "(numeric-vector-map (lambda (x) (* x x)) (s64vector 1 2))"
+        self.assertEvaluatesTo(program, NumericVector('s64', numpy.array([1, 4])))
+
+    def test_slice_is_a_view(self):
+        program = """(define v (s64vector 1 2 3 4))
+        (define w (numeric-vector-slice v 1 3))
+        (s64vector-set! w 0 9)
+        v"""
+        self.assertEvaluatesTo(program, NumericVector('s64', numpy.array([1, 9, 3, 4])))
+
+    def test_external_representation(self):
+        program = "(s64vector 1 2)"
+        self.assertEqual(self.evaluate(program).get_external_representation(), "#s64(1 2)")
+
+
+class ArrayTest(InterpreterTest):
+    def test_make_array(self):
+        program = "(make-array '(2 3) 1)"
+        self.assertEvaluatesTo(program, Array('s64', numpy.ones((2, 3), dtype=numpy.int64)))
+
+        program = "(make-array '(2 2))"
+        self.assertEvaluatesTo(program, Array('f64', numpy.zeros((2, 2))))
+
+    def test_list_to_array(self):
+        program = "(list->array '((1 2) (3 4.5)))"
+        self.assertEvaluatesTo(program, Array('f64', numpy.array([[1, 2], [3, 4.5]])))
+
+        program = "(list->array '((1 2) (3)))"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_vector_to_array(self):
+        program = "(vector->array (vector (vector 1 2) (vector 3 4)))"
+        self.assertEvaluatesTo(program, Array('s64', numpy.array([[1, 2], [3, 4]])))
+
+    def test_array_to_list(self):
+        program = "(array->list (list->array '((1 2) (3 4))))"
+        self.assertEvaluatesTo(program, Cons.from_list([
+            Cons.from_list([Integer(1), Integer(2)]),
+            Cons.from_list([Integer(3), Integer(4)])]))
+
+    def test_shape(self):
+        program = "(array-shape (make-array '(2 3 4)))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(2), Integer(3), Integer(4)]))
+
+        program = "(array-rank (make-array '(2 3 4)))"
+        self.assertEvaluatesTo(program, Integer(3))
+
+        program = "(array-dimension (make-array '(2 3)) 1)"
+        self.assertEvaluatesTo(program, Integer(3))
+
+    def test_ref_and_set(self):
+        program = "(define a (make-array '(2 2) 0)) (array-set! a 1 0 5) (array-ref a 1 0)"
+        self.assertEvaluatesTo(program, Integer(5))
+
+        program = "(array-ref a 2 0)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+        program = "(array-ref a 0)"
+        with self.assertRaises(SchemeArityError):
+            self.evaluate(program)
+
+    def test_matrix_multiply(self):
+        program = "(define a (list->array '((1 2) (3 4)))) (matrix-multiply a a)"
+        self.assertEvaluatesTo(program, Array('s64', numpy.array([[7, 10], [15, 22]])))
+
+        program = "(matrix-multiply a (s64vector 1 1))"
+        self.assertEvaluatesTo(program, NumericVector('s64', numpy.array([3, 7])))
+
+        program = "(matrix-multiply a (make-array '(3 3)))"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_transpose_is_a_view(self):
+        program = """(define a (list->array '((1 2) (3 4))))
+        (define t (transpose a))
+        (array-set! t 0 1 9)
+        a"""
+        self.assertEvaluatesTo(program, Array('s64', numpy.array([[1, 2], [9, 4]])))
+
+    def test_rows_and_columns_are_views(self):
+        program = """(define a (list->array '((1 2) (3 4))))
+        (s64vector-set! (array-row a 0) 1 8)
+        (s64vector-set! (array-column a 0) 1 9)
+        a"""
+        self.assertEvaluatesTo(program, Array('s64', numpy.array([[1, 8], [9, 4]])))
+
+    def test_reductions(self):
+        program = "(define a (list->array '((1 2) (3 4)))) (array-sum a)"
+        self.assertEvaluatesTo(program, Integer(10))
+
+        program = "(array-sum a 0)"
+        self.assertEvaluatesTo(program, NumericVector('s64', numpy.array([4, 6])))
+
+        program = "(array-max a 1)"
+        self.assertEvaluatesTo(program, NumericVector('s64', numpy.array([2, 4])))
+
+        program = "(array-min a)"
+        self.assertEvaluatesTo(program, Integer(1))
+
+    def test_integer_overflow(self):
+        program = "(define big (list->array '((9223372036854775807 1) (0 1)))) (array-sum big)"
+        self.assertEvaluatesTo(program, Integer(9223372036854775809))
+
+        program = "(array-sum big 0)"
+        self.assertEvaluatesTo(program, NumericVector('s64', numpy.array([9223372036854775807,
+                                                                          2])))
+
+        for program in ["(array-sum big 1)",
+                        "(matrix-multiply (list->array '((4611686018427387904 0) (0 1))) "
+                        "(list->array '((4 0) (0 1))))",
+                        "(list->array '((99999999999999999999 1) (0 1)))"]:
+            with self.assertRaises(InvalidArgument):
+                self.evaluate(program)
+
+    def test_external_representation(self):
+        program = "(list->array '((1 2) (3 4)))"
+        self.assertEqual(self.evaluate(program).get_external_representation(),
+                         "#2a((1 2) (3 4))")
+
+
+class BytevectorTest(InterpreterTest):
+    def test_make_bytevector(self):
+        program = "(make-bytevector 3 7)"
+        self.assertEvaluatesTo(program, Bytevector(bytearray([7, 7, 7])))
+
+        program = "(bytevector 1 2 256)"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+    def test_bytevector_ref_set(self):
+        program = "(define bv (bytevector 1 2 3)) (bytevector-u8-set! bv 1 9) bv"
+        self.assertEvaluatesTo(program, Bytevector(bytearray([1, 9, 3])))
+
+        program = "(bytevector-u8-ref (bytevector 1 2 3) 2)"
+        self.assertEvaluatesTo(program, Integer(3))
+
+        program = "(bytevector-u8-ref (bytevector 1 2 3) 3)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_bytevector_copy(self):
+        program = "(define a (bytevector 1 2 3 4)) (define b (bytevector-copy a 1 3)) " \
+                  "(bytevector-u8-set! b 0 9) (list a b)"
+        self.assertEvaluatesTo(program, Cons.from_list([
+            Bytevector(bytearray([1, 2, 3, 4])), Bytevector(bytearray([9, 3]))]))
+
+        program = "(define c (bytevector 1 2 3 4 5)) (bytevector-copy! c 1 c 0 3) c"
+        self.assertEvaluatesTo(program, Bytevector(bytearray([1, 1, 2, 3, 5])))
+
+    def test_bytevector_append(self):
+        program = "(bytevector-append (bytevector 1) (bytevector) (bytevector 2 3))"
+        self.assertEvaluatesTo(program, Bytevector(bytearray([1, 2, 3])))
+
+    def test_bytevector_slice_shares_storage(self):
+        program = "(define a (bytevector 1 2 3 4)) (define b (bytevector-slice a 1 3)) " \
+                  "(bytevector-u8-set! b 0 9) a"
+        self.assertEvaluatesTo(program, Bytevector(bytearray([1, 9, 3, 4])))
+
+    def test_utf8(self):
+        program = '(utf8->string (string->utf8 "hello"))'
+        self.assertEvaluatesTo(program, String("hello"))
+
+        program = "(utf8->string (bytevector 104 105 33) 0 2)"
+        self.assertEvaluatesTo(program, String("hi"))
+
+        program = "(utf8->string (bytevector 255))"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_file_to_bytevector(self):
+        (handle, path) = tempfile.mkstemp()
+        os.write(handle, b"abc")
+        os.close(handle)
+
+        try:
+            self.environment['path'] = String(path)
+            program = "(define bv (file->bytevector path)) (bytevector-u8-set! bv 0 65) bv"
+            self.assertEvaluatesTo(program, Bytevector(bytearray(b"Abc")))
+
+            # writing to the bytevector doesn't change the file
+            with open(path, 'rb') as binary_file:
+                self.assertEqual(binary_file.read(), b"abc")
+        finally:
+            os.remove(path)
+
+
+class HashTableTest(InterpreterTest):
+    def test_set_and_ref(self):
+        program = "(define h (make-hash-table)) (hash-table-set! h 'a 1) " \
+                  "(hash-table-set! h 'a 2) (hash-table-ref h 'a)"
+        self.assertEvaluatesTo(program, Integer(2))
+
+        program = "(hash-table-ref (make-hash-table) 'a)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+        program = "(hash-table-ref (make-hash-table) 'a (lambda () 3))"
+        self.assertEvaluatesTo(program, Integer(3))
+
+        program = "(hash-table-ref/default (make-hash-table) 'a 4)"
+        self.assertEvaluatesTo(program, Integer(4))
+
+    def test_equal_keys(self):
+        program = "(define h (make-hash-table)) (hash-table-set! h (list 1 \"a\" #\\b) 1) " \
+                  "(hash-table-ref h (list 1 \"a\" #\\b))"
+        self.assertEvaluatesTo(program, Integer(1))
+
+        program = "(define x (list 1)) (set-cdr! x x) (hash-table-set! h x 2) " \
+                  "(define y (list 1 1)) (set-cdr! (cdr y) y) (hash-table-ref h y)"
+        self.assertEvaluatesTo(program, Integer(2))
+
+    def test_eqv_keys(self):
+        program = "(define h (make-hash-table eqv?)) (hash-table-set! h (list 1) 1) " \
+                  "(hash-table-exists? h (list 1))"
+        self.assertEvaluatesTo(program, Boolean(False))
+
+        program = "(define h2 (make-hash-table eqv?)) (hash-table-set! h2 1 'one) " \
+                  "(hash-table-ref h2 1)"
+        self.assertEvaluatesTo(program, Symbol('one'))
+
+    def test_contains(self):
+        program = "(define h (make-hash-table)) (hash-table-set! h 'a 1) " \
+                  "(list (hash-table-contains? h 'a) (hash-table-exists? h 'b))"
+        self.assertEvaluatesTo(program, Cons.from_list([Boolean(True), Boolean(False)]))
+
+        with self.assertRaises(SchemeTypeError) as context:
+            self.evaluate("(hash-table-contains? 1 'a)")
+        self.assertIn('hash-table-contains?', str(context.exception))
+
+    def test_mutated_string_keys(self):
+        # the entry stays under the contents the key had when it was added
+        program = "(define s (string-copy \"abc\")) (define h (make-hash-table)) " \
+                  "(hash-table-set! h s 1) (string-set! s 0 #\\z) " \
+                  "(list (hash-table-ref/default h s 'none) " \
+                  "(hash-table-ref/default h \"abc\" 'none) (hash-table-size h))"
+        self.assertEvaluatesTo(program, Cons.from_list([Symbol('none'), Integer(1),
+                                                        Integer(1)]))
+
+        program = "(define h2 (make-hash-table string=?)) (hash-table-set! h2 s 2) " \
+                  "(string-set! s 0 #\\y) (hash-table-ref/default h2 \"zbc\" 'none)"
+        self.assertEvaluatesTo(program, Integer(2))
+
+    def test_delete(self):
+        program = "(define h (make-hash-table)) (hash-table-set! h 1 1) " \
+                  "(hash-table-delete! h 1) (hash-table-size h)"
+        self.assertEvaluatesTo(program, Integer(0))
+
+    def test_update(self):
+        program = "(define h (make-hash-table)) " \
+                  "(hash-table-update!/default h 'a (lambda (x) (+ x 1)) 0) " \
+                  "(hash-table-update! h 'a (lambda (x) (* x 10))) " \
+                  "(hash-table-ref h 'a)"
+        self.assertEvaluatesTo(program, Integer(10))
+
+    def test_keys_and_alist(self):
+        program = "(hash-table-keys (alist->hash-table (list (cons 'a 1) (cons 'b 2))))"
+        self.assertEvaluatesTo(program, Cons.from_list([Symbol('b'), Symbol('a')]))
+
+        program = "(hash-table->alist (alist->hash-table (list (cons 'a 1) (cons 'a 2))))"
+        self.assertEvaluatesTo(program, Cons.from_list([Cons(Symbol('a'), Integer(1))]))
+
+    def test_walk(self):
+        program = "(define total 0) (define h (alist->hash-table (list (cons 'a 1) (cons 'b 2)))) " \
+                  "(hash-table-walk h (lambda (key value) (set! total (+ total value)))) total"
+        self.assertEvaluatesTo(program, Integer(3))
+
+
+class PersistentCollectionTest(InterpreterTest):
+    def test_map(self):
+        program = "(define m (persistent-map 'a 1)) (define m2 (persistent-map-set m 'b 2)) " \
+                  "(list (persistent-map-size m) (persistent-map-ref m2 'b) " \
+                  "(persistent-map-ref m 'b 0))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(2), Integer(0)]))
+
+        program = "(persistent-map-ref (persistent-map) 'a)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_map_equal_keys(self):
+        program = "(persistent-map-ref (persistent-map (list 1 2) 'x) (list 1 2))"
+        self.assertEvaluatesTo(program, Symbol('x'))
+
+    def test_map_delete(self):
+        program = "(define m (persistent-map 'a 1 'b 2)) (define m2 (persistent-map-delete m 'a)) " \
+                  "(list (persistent-map-contains? m 'a) (persistent-map-contains? m2 'a))"
+        self.assertEvaluatesTo(program, Cons.from_list([Boolean(True), Boolean(False)]))
+
+    def test_map_update(self):
+        program = "(persistent-map-ref (persistent-map-update (persistent-map 'a 1) 'a " \
+                  "(lambda (x) (+ x 1))) 'a)"
+        self.assertEvaluatesTo(program, Integer(2))
+
+    def test_map_equality(self):
+        program = "(equal? (persistent-map 'a 1 'b 2) (persistent-map 'b 2 'a 1))"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+    def test_set(self):
+        program = "(define s (persistent-set 1 2 2)) (define s2 (persistent-set-remove s 1)) " \
+                  "(list (persistent-set-size s) (persistent-set-contains? s 1) " \
+                  "(persistent-set-contains? s2 1))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(2), Boolean(True),
+                                                        Boolean(False)]))
+
+    def test_vector(self):
+        program = "(define v (persistent-vector 1 2 3)) (define v2 (persistent-vector-set v 0 9)) " \
+                  "(list (persistent-vector-ref v 0) (persistent-vector-ref v2 0) " \
+                  "(persistent-vector-length (persistent-vector-push v 4)))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(9), Integer(4)]))
+
+        program = "(persistent-vector-ref (persistent-vector 1) 1)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_large_vector(self):
+        # enough items for the trie to have several levels
+        program = "(define v (list->persistent-vector (iota 2000))) " \
+                  "(define v2 (persistent-vector-set v 1500 (quote x))) " \
+                  "(list (persistent-vector-ref v 1500) (persistent-vector-ref v2 1500) " \
+                  "(persistent-vector-ref v2 1999))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1500), Symbol('x'),
+                                                        Integer(1999)]))
+
+    def test_transient(self):
+        program = "(define v (persistent-vector 1)) (define t (transient v)) " \
+                  "(transient-add! t 2) (transient-set! t 0 3) (list v (persistent! t))"
+        self.assertEvaluatesTo(program, Cons.from_list([
+            self.evaluate("(persistent-vector 1)"), self.evaluate("(persistent-vector 3 2)")]))
+
+        program = "(transient-add! t 4)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_transient_map(self):
+        program = "(define t (transient (persistent-map))) (transient-set! t 'a 1) " \
+                  "(transient-set! t 'b 2) (transient-delete! t 'a) " \
+                  "(persistent-map->alist (persistent! t))"
+        self.assertEvaluatesTo(program, Cons.from_list([Cons(Symbol('b'), Integer(2))]))
+
+
+class ContainerTest(InterpreterTest):
+    def test_deque(self):
+        program = "(define d (list->deque (list 2 3))) (deque-push-front! d 1) " \
+                  "(deque-push-back! d 4) " \
+                  "(list (deque-pop-front! d) (deque-pop-back! d) (deque->list d))"
+        self.assertEvaluatesTo(program, Cons.from_list([
+            Integer(1), Integer(4), Cons.from_list([Integer(2), Integer(3)])]))
+
+        program = "(deque-pop-front! (make-deque))"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_deque_vector_conversion(self):
+        program = "(deque->vector (vector->deque (vector 1 2)))"
+        self.assertEvaluatesTo(program, Vector.from_list([Integer(1), Integer(2)]))
+
+    def test_conversions_check_their_input(self):
+        for container in ['deque', 'gvector', 'priority-queue']:
+            for (function_name, argument) in [('list->' + container, "(vector 1)"),
+                                              ('vector->' + container, "(list 1)")]:
+                with self.assertRaises(SchemeTypeError) as context:
+                    self.evaluate("(%s %s)" % (function_name, argument))
+                self.assertIn(function_name, str(context.exception))
+
+    def test_gvector(self):
+        program = "(define g (make-gvector)) (gvector-add! g 1 2 3) (gvector-set! g 0 9) " \
+                  "(list (gvector-count g) (gvector-remove-last! g) (gvector->list g))"
+        self.assertEvaluatesTo(program, Cons.from_list([
+            Integer(3), Integer(3), Cons.from_list([Integer(9), Integer(2)])]))
+
+        program = "(gvector-ref (gvector 1) 1)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+    def test_priority_queue(self):
+        program = "(define q (list->priority-queue (list 5 1 4))) (priority-queue-push! q 2 3) " \
+                  "(list (priority-queue-pop! q) (priority-queue-pop! q) " \
+                  "(priority-queue->list q))"
+        self.assertEvaluatesTo(program, Cons.from_list([
+            Integer(1), Integer(2), Cons.from_list([Integer(3), Integer(4), Integer(5)])]))
+
+    def test_priority_queue_key(self):
+        # ties come out in the order they were added
+        program = "(define q (make-priority-queue car)) " \
+                  "(priority-queue-push! q (list 2 'a) (list 1 'b) (list 2 'c)) " \
+                  "(map cadr (priority-queue->list q))"
+        self.assertEvaluatesTo(program, Cons.from_list([Symbol('b'), Symbol('a'),
+                                                        Symbol('c')]))
+
+        program = "(priority-queue-push! (make-priority-queue) (list 1))"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+    def test_priority_queue_failed_push(self):
+        program = '(define q (make-priority-queue)) (priority-queue-push! q 1 3) ' \
+                  '(priority-queue-push! q "a")'
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+        # the queue is unchanged
+        program = "(list (priority-queue-length q) (priority-queue-pop! q) (priority-queue-pop! q))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(2), Integer(1), Integer(3)]))
+
+
+class RecordTest(InterpreterTest):
+    def test_define_record_type(self):
+        program = "(define-record-type <point> (make-point x y) point? " \
+                  "(x point-x set-point-x!) (y point-y)) " \
+                  "(define p (make-point 1 2)) (set-point-x! p 3) " \
+                  "(list (point-x p) (point-y p) (point? p) (point? 1))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(3), Integer(2),
+                                                        Boolean(True), Boolean(False)]))
+
+    def test_constructor_subset(self):
+        program = "(define-record-type node (make-node value) node? " \
+                  "(value node-value) (next node-next set-node-next!)) " \
+                  "(node-next (make-node 1))"
+        self.assertEvaluatesTo(program, Boolean(False))
+
+    def test_accessor_type_check(self):
+        program = "(define-record-type a (make-a x) a? (x a-x)) " \
+                  "(define-record-type b (make-b x) b? (x b-x)) " \
+                  "(a-x (make-b 1))"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+    def test_constructor_arity(self):
+        program = "(define-record-type a (make-a x) a? (x a-x)) (make-a)"
+        with self.assertRaises(SchemeArityError):
+            self.evaluate(program)
+
+    def test_external_representation(self):
+        program = "(define-record-type <point> (make-point x y) point? (x point-x) (y point-y)) " \
+                  "(make-point 1 2)"
+        self.assertEqual(self.evaluate(program).get_external_representation(),
+                         "#<point x=1 y=2>")
+
+    def test_record_type_is_not_callable(self):
+        program = "(define-record-type <point> (make-point x y) point? (x point-x) (y point-y)) " \
+                  "(<point> 1)"
+        with self.assertRaises(SchemeTypeError) as context:
+            self.evaluate(program)
+        self.assertIn("#<record-type point>", str(context.exception))
+
+        program = "(define (make-one) (<point> 1)) (make-one)"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate("(map <point> '(1))")
+
+        self.assertEvaluatesTo("(procedure? <point>)", Boolean(False))
+
+
+class SymbolTest(InterpreterTest):
+    def test_symbols_are_interned(self):
+        self.assertIs(Symbol('foo'), Symbol('foo'))
+        self.assertIs(self.evaluate("(quote foo)"), self.evaluate("(quote foo)"))
+
+    def test_string_to_symbol(self):
+        program = '(eq? (string->symbol "foo") (quote foo))'
+        self.assertEvaluatesTo(program, Boolean(True))
+
+        program = "(string->symbol 1)"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+    def test_symbol_to_string(self):
+        program = "(symbol->string (quote foo))"
+        self.assertEvaluatesTo(program, String("foo"))
+
+    def test_is_symbol(self):
+        program = "(list (symbol? (quote foo)) (symbol? \"foo\"))"
+        self.assertEvaluatesTo(program, Cons.from_list([Boolean(True), Boolean(False)]))
+
+
+class LiteralTest(InterpreterTest):
+    def test_quoted_literals_are_shared(self):
+        first = self.evaluate("(quote (1 (2 \"three\") 4.0))")
+        second = self.evaluate("'(1 (2 \"three\") 4.0)")
+        self.assertIs(first, second)
+
+        program = "(define (f) '(1 2)) (eq? (f) (f))"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+    def test_shared_substructure(self):
+        program = "(eq? (cdr '(1 2 3)) (cdr '(0 2 3)))"
+        self.assertEvaluatesTo(program, Boolean(True))
+
+    def test_distinct_literals(self):
+        program = "(eqv? '(1) '(1.0))"
+        self.assertEvaluatesTo(program, Boolean(False))
+
+        self.assertIsNot(self.evaluate("-0.0"), self.evaluate("0.0"))
+
+    def test_literals_are_immutable(self):
+        program = "(set-car! '(1 2) 3)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+        program = "(set-cdr! (cdr '(1 2)) 3)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+        program = "(define x (list 1 2)) (set-car! x 3) x"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(3), Integer(2)]))
+
+    def test_long_literal(self):
+        program = "'(%s)" % " ".join(["1"] * 20000)
+        self.assertEqual(len(self.evaluate(program)), 20000)
+
+
+class UnboxedTest(InterpreterTest):
+    def setUp(self):
+        immediates.unboxed = True
+        super().setUp()
+
+    def tearDown(self):
+        immediates.unboxed = False
+
+    def test_arithmetic(self):
+        program = "(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))) (fib 15)"
+        result = self.evaluate(program)
+
+        # results are boxed again when they leave the evaluator
+        self.assertIsInstance(result, Integer)
+        self.assertEqual(result, Integer(610))
+
+        program = "(list (/ 6 4) (/ 6 3) (* 2 0.5) (- 3))"
+        self.assertEvaluatesTo(program, Cons.from_list([Rational(Fraction(3, 2)), Integer(2),
+                                                        FloatingPoint(1.0), Integer(-3)]))
+
+    def test_unboxed_built_ins(self):
+        self.assertIs(unboxed_built_ins['+']([1, 2]), 3)
+        self.assertIs(unboxed_built_ins['<']([1, Integer(2)]), True)
+        self.assertIs(unboxed_built_ins['eqv?'](['a', Character('a')]), True)
+
+        with self.assertRaises(SchemeTypeError):
+            unboxed_built_ins['+']([1, True])
+
+    def test_error_messages(self):
+        # we name the Scheme type, not the Python type of the raw value
+        with self.assertRaises(SchemeTypeError) as context:
+            self.evaluate("(+ #t 1)")
+
+        self.assertIn("Boolean", context.exception.message)
+        self.assertNotIn("<class 'bool'>", context.exception.message)
+
+    def test_booleans(self):
+        program = "(list (if (< 2 1) 'yes 'no) (not (= 1 1)) (not #f))"
+        self.assertEvaluatesTo(program, Cons.from_list([Symbol('no'), Boolean(False),
+                                                        Boolean(True)]))
+
+    def test_mixed_with_boxed_data(self):
+        program = "(+ (car '(1 2)) 3)"
+        self.assertEvaluatesTo(program, Integer(4))
+
+        program = "(map (lambda (x) (* x x)) (list 1 2 3))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(4), Integer(9)]))
+
+        program = "(define (f . rest) rest) (f 1 #t #\\a)"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Boolean(True),
+                                                        Character('a')]))
+
+        program = "(define x 2) `(1 ,x ,(+ x 1))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(2), Integer(3)]))
+
+    def test_case(self):
+        program = "(case (+ 1 1) ((1) 'one) ((2) 'two) (else 'many))"
+        self.assertEvaluatesTo(program, Symbol('two'))
+
+
+class SpecialiseTest(InterpreterTest):
+    def setUp(self):
+        specialise.enabled = True
+        super().setUp()
+
+    def tearDown(self):
+        specialise.enabled = False
+
+    def specialise(self, program):
+        """Return the specialised body of the function defined by program."""
+        definition = parser.parse(program).head
+        (name, *parameters) = list(definition[1])
+
+        return specialise.specialise_function(name, parameters, definition.tail.tail,
+                                              self.environment)
+
+    def test_infers_types(self):
+        body = self.specialise("(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))")
+        (condition, _, recursion) = list(body.head.tail)
+
+        self.assertIsInstance(condition, specialise.SpecialisedOperation)
+        # we speculate that fib returns a fixnum, like its base case
+        self.assertIsInstance(recursion, specialise.SpecialisedOperation)
+        self.assertEqual(recursion.result_type, specialise.FIXNUM)
+
+        body = self.specialise("(define (f x) (let ((y (* x 2.0))) (+ y 1)))")
+        addition = body.head[2]
+        self.assertEqual(addition.result_type, specialise.FLONUM)
+
+    def test_nothing_to_specialise(self):
+        body = self.specialise("(define (f x) (car x))")
+        self.assertEqual(body, Cons(Cons.from_list([Symbol('car'), Symbol('x')])))
+
+    def test_specialised_results(self):
+        program = """(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+        (fib 15)"""
+        self.assertEvaluatesTo(program, Integer(610))
+
+        program = "(define (sum n) (do ((i 0 (+ i 1)) (total 0 (+ total i))) ((= i n) total))) (sum 10)"
+        self.assertEvaluatesTo(program, Integer(45))
+
+        program = "(define (q n) (list (quotient n 2) (remainder n 2) (modulo n 2))) (q -7)"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(-3), Integer(-1), Integer(1)]))
+
+    def test_guards(self):
+        # the operand isn't a fixnum, so we fall back to the generic +
+        program = "(define (inc n) (+ n 1)) (list (inc 1.5) (inc (/ 1 2)))"
+        self.assertEvaluatesTo(program, Cons.from_list([FloatingPoint(2.5),
+                                                        Rational(Fraction(3, 2))]))
+
+        program = "(inc #t)"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+        # the operator has been rebound
+        program = "(set! + -) (inc 5)"
+        self.assertEvaluatesTo(program, Integer(4))
+
+    def test_shadowed_operator(self):
+        program = "(define (f + x) (+ x 1)) (f - 5)"
+        self.assertEvaluatesTo(program, Integer(4))
+
+    def test_named_let(self):
+        program = """(define (f n) (let loop ((i 0) (total 0))
+                                      (if (= i n) total (loop (+ i 1) (+ total i)))))
+        (f 2000)"""
+        self.assertEvaluatesTo(program, Integer(1999000))
+
+        # the recursive call is inside a specialised operation, so
+        # it isn't a tail call
+        program = "(define (f n) (let loop ((i 0)) (if (= i n) 0 (+ 1 (loop (+ i 1)))))) (f 5)"
+        self.assertEvaluatesTo(program, Integer(5))
+
+    def test_unboxed(self):
+        immediates.unboxed = True
+        try:
+            program = "(define (f x) (* (+ x 1) 2.0)) (f 2)"
+            self.assertEvaluatesTo(program, FloatingPoint(6.0))
+        finally:
+            immediates.unboxed = False
+
+
+class FoldTest(InterpreterTest):
+    def setUp(self):
+        fold.enabled = True
+        super().setUp()
+
+    def tearDown(self):
+        fold.enabled = False
+
+    def fold(self, program):
+        """Return the folded body of the function defined by program."""
+        definition = parser.parse(program).head
+        parameters = definition[1].tail
+
+        return fold.fold_function(parameters, definition.tail.tail, self.environment)
+
+    def test_folds_constants(self):
+        body = self.fold("(define (seconds days) (* days (* 60 60 24)))")
+        folded = body.head[2]
+
+        self.assertIsInstance(folded, fold.FoldedExpression)
+        self.assertEqual(folded.replacement, Integer(86400))
+
+        body = self.fold("(define (f) (if (< 1 2) 'yes 'no))")
+        self.assertEqual(body.head.replacement, Cons.from_list([Symbol('quote'), Symbol('yes')]))
+
+        # a literal condition needs no guard
+        body = self.fold("(define (f x) (if #f (car x) x))")
+        self.assertEqual(body.head, Symbol('x'))
+
+    def test_nothing_to_fold(self):
+        definition = parser.parse("(define (f x) (+ x 1))").head
+        body = definition.tail.tail
+        self.assertIs(fold.fold_function(definition[1].tail, body, self.environment), body)
+
+        # errors are left until the code is run
+        for program in ["(define (f) (/ 1 0))", "(define (f) (modulo 1 0))",
+                        "(define (f) (remainder 5 0))", "(define (f) (exp 1000))",
+                        "(define (f) (log 0))"]:
+            body = self.fold(program)
+            self.assertNotIsInstance(body.head, fold.FoldedExpression)
+
+        self.evaluate("(define (g) (log 0))")
+        with self.assertRaises(ValueError):
+            self.evaluate("(g)")
+
+    def test_folded_results(self):
+        program = "(define (seconds days) (* days (* 60 60 24))) (seconds 2)"
+        self.assertEvaluatesTo(program, Integer(172800))
+
+        program = "(define (f x) (if (> (bitwise-and 6 3) 1) (list x) x)) (f 1)"
+        self.assertEvaluatesTo(program, Cons(Integer(1)))
+
+        program = "(define (f x) (if (= 1 2) x (* x 2.0))) (f 3)"
+        self.assertEvaluatesTo(program, FloatingPoint(6.0))
+
+    def test_statistics(self):
+        calls = fold.statistics['calls']
+        branches = fold.statistics['branches']
+
+        self.evaluate("(define (f x) (if (< 1 2) (+ 1 (* 2 3)) x))")
+
+        self.assertEqual(fold.statistics['calls'], calls + 3)
+        self.assertEqual(fold.statistics['branches'], branches + 1)
+
+    def test_redefined_built_in(self):
+        program = "(define (f) (* 2 3)) (set! * +) (f)"
+        self.assertEvaluatesTo(program, Integer(5))
+
+        program = "(define (g * x) (* 2 3)) (g - 0)"
+        self.assertEvaluatesTo(program, Integer(-1))
+
+    def test_named_let(self):
+        program = "(define (f) (let loop ((i 0)) (if (< i (* 20 100)) (loop (+ i 1)) i))) (f)"
+        self.assertEvaluatesTo(program, Integer(2000))
+
+        # the call to loop is in the branch we pruned, inside a
+        # FoldedExpression
+        program = """(define (f) (let loop ((i 0)) (if (< i 5) (if (= 1 1) (loop (+ i 1)) 0) i)))
+        (f)"""
+        self.assertEvaluatesTo(program, Integer(5))
+
+    def test_with_specialisation(self):
+        specialise.enabled = True
+        immediates.unboxed = True
+        try:
+            program = "(define (f x) (+ x (* 60 60))) (f 1)"
+            self.assertEvaluatesTo(program, Integer(3601))
+        finally:
+            specialise.enabled = False
+            immediates.unboxed = False
+
+
+class InlineTest(InterpreterTest):
+    def setUp(self):
+        inline.enabled = True
+        super().setUp()
+
+    def tearDown(self):
+        inline.enabled = False
+
+    def inline(self, program):
+        """Return the body of the last function defined by program, with
+        calls inlined.
+
+        """
+        definitions = list(parser.parse(program))
+        for definition in definitions[:-1]:
+            self.evaluate(definition.get_external_representation())
+
+        definition = definitions[-1]
+        return inline.inline_function(definition[1].tail, definition.tail.tail,
+                                      self.environment)
+
+    def test_inlines_library_functions(self):
+        body = self.inline("(define (f x) (if (zero? x) 0 (abs x)))")
+        (condition, _, absolute) = list(body.head.tail)
+
+        self.assertIsInstance(condition, inline.InlinedCall)
+        # abs calls positive?, which is inlined into it
+        self.assertIsInstance(absolute, inline.InlinedCall)
+        self.assertIsInstance(absolute.body[1], inline.InlinedCall)
+
+    def test_not_inlined(self):
+        program = """(define (fact n) (if (= n 0) 1 (* n (fact (- n 1)))))
+        (define (f x) (fact x))"""
+        self.assertNotIsInstance(self.inline(program).head, inline.InlinedCall)
+
+        # too big
+        program = """(define (big x) (+ x x x x x x x x x x x x x x x x x x x x x))
+        (define (f x) (big x))"""
+        self.assertNotIsInstance(self.inline(program).head, inline.InlinedCall)
+
+        # creates a local variable
+        program = """(define (g x) (let ((y x)) y))
+        (define (f x) (g x))"""
+        self.assertNotIsInstance(self.inline(program).head, inline.InlinedCall)
+
+        # the wrong number of arguments, which should still be an error
+        program = "(define (f x) (zero? x x))"
+        self.assertNotIsInstance(self.inline(program).head, inline.InlinedCall)
+
+    def test_inlined_results(self):
+        program = """(define (f x) (if (zero? x) 'zero (abs x)))
+        (list (f 0) (f -3))"""
+        self.assertEvaluatesTo(program, Cons.from_list([Symbol('zero'), Integer(3)]))
+
+        program = """(define (square x) (* x x))
+        (define (sum-squares lst) (if (null? lst) 0 (+ (square (car lst)) (sum-squares (cdr lst)))))
+        (sum-squares '(1 2 3))"""
+        self.assertEvaluatesTo(program, Integer(14))
+
+        # arguments are evaluated once, even if used more than once
+        program = """(define count 0)
+        (define (next) (set! count (+ count 1)) count)
+        (define (f) (abs (next)))
+        (f) count"""
+        self.assertEvaluatesTo(program, Integer(1))
+
+    def test_redefined_callee(self):
+        program = "(define (f x) (zero? x)) (set! zero? (lambda (y) 'redefined)) (f 1)"
+        self.assertEvaluatesTo(program, Symbol('redefined'))
+
+        program = "(define (g zero?) (zero? 1)) (g (lambda (y) 'local))"
+        self.assertEvaluatesTo(program, Symbol('local'))
+
+    def test_higher_order_built_ins(self):
+        # map calls show in the environment of the call to apply-all,
+        # where k is bound, so apply-all can't be inlined
+        program = """(define (show z) (+ z k))
+        (define (apply-all k xs) (map show xs))
+        (define (run) (apply-all 10 (list 1 2)))
+        (run)"""
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(11), Integer(12)]))
+
+        program = """(define (square x) (* (car (map f x)) (car (map f x))))
+        (define (f x) (if (pair? x) (square x) x))
+        (f '((2)))"""
+        self.assertEvaluatesTo(program, Integer(16))
+        self.assertNotIsInstance(self.inline("(define (g x) (square x))").head,
+                                 inline.InlinedCall)
+
+    def test_named_let(self):
+        program = "(define (f) (let loop ((i 0)) (if (zero? (- i 2000)) i (loop (+ i 1))))) (f)"
+        self.assertEvaluatesTo(program, Integer(2000))
+
+        # the call to loop is an argument of an inlined call, so it
+        # isn't a tail call
+        program = "(define (f) (let loop ((i 0)) (if (= i 3) 0 (abs (loop (+ i 1)))))) (f)"
+        self.assertEvaluatesTo(program, Integer(0))
+
+
+class CheckTest(InterpreterTest):
+    def setUp(self):
+        check.enabled = True
+        super().setUp()
+
+    def tearDown(self):
+        check.enabled = False
+
+    def test_unbound_variables(self):
+        program = "(define x 1) (define (f y) y) (f z)"
+        with self.assertRaises(UndefinedVariable):
+            self.evaluate(program)
+
+        # we reported the problem before running anything
+        self.assertNotIn('x', self.environment)
+
+        # locals, later definitions and macro arguments are fine
+        program = """(define (f x) (let ((y x)) (g y)))
+        (define (g x) (cond (((null? x) 'none) (else x))))
+        (defmacro ignore (x) #t)
+        (define (h) (ignore unbound-name))
+        (f 1)"""
+        self.assertEvaluatesTo(program, Integer(1))
+
+    def test_wrong_arity(self):
+        program = "(define (f x y) x) (define (g) (f 1))"
+        with self.assertRaises(SchemeArityError):
+            self.evaluate(program)
+
+        program = """(define-record-type point (make-point x y) point? (x point-x))
+        (point-x (make-point 1))"""
+        with self.assertRaises(SchemeArityError):
+            self.evaluate(program)
+
+        program = "(define (v x . rest) x) (v)"
+        with self.assertRaises(SchemeArityError):
+            self.evaluate(program)
+
+    def test_every_problem_reported(self):
+        program = "(define (f x) (f x x)) (g 1) (f)"
+        with self.assertRaises(SchemeArityError) as context:
+            self.evaluate(program)
+
+        self.assertEqual(context.exception.message.split("\n"), [
+            "f requires exactly 1 argument(s), but received 2.",
+            "g has not been defined.",
+            "f requires exactly 1 argument(s), but received 0.",
+        ])
+
+    def test_checked_calls(self):
+        program = """(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+        (define (f) (fib 10))
+        (f)"""
+        self.assertEvaluatesTo(program, Integer(55))
+
+        definition = parser.parse("(define (g) (fib 10) (fib 1 2))").head
+        body = check.check_function(Symbol('g'), Nil(), definition.tail.tail,
+                                    self.environment)
+
+        self.assertIsInstance(body[0], check.CheckedCall)
+        self.assertNotIsInstance(body[1], check.CheckedCall)
+
+    def test_redefined_callee(self):
+        program = """(define (g x) x) (define (f) (g 1))
+        (set! g (lambda (a b) a))
+        (f)"""
+        with self.assertRaises(SchemeArityError):
+            self.evaluate(program)
+
+    def test_free_variables(self):
+        # variables are dynamically scoped, so the caller may bind x
+        program = "(define (f) x) (define (g x) (f)) (g 1)"
+
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            self.assertEvaluatesTo(program, Integer(1))
+            warnings = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+
+        self.assertEqual(warnings, "Warning: x is not defined, so it must be bound by the caller.\n")
+
+    def test_case_bodies(self):
+        program = "(case 1 ((1) undefined-thing) (else 'other))"
+        with self.assertRaises(UndefinedVariable):
+            self.evaluate(program)
+
+        program = "(define (f x) x) (case 1 ((1) (f 1 2)))"
+        with self.assertRaises(SchemeArityError):
+            self.evaluate(program)
+
+    def test_named_let(self):
+        program = """(define (sq x) (* x x))
+        (define (f) (let loop ((i 0)) (if (= i 3) 0 (sq (loop (+ i 1))))))
+        (f)"""
+        self.assertEvaluatesTo(program, Integer(0))
+
+    def test_memoized_arity(self):
+        program = "(define-memoized/options (f x) (10) x) (f 1 2)"
+        with self.assertRaises(SchemeArityError):
+            self.evaluate(program)
+
+    def test_no_arguments(self):
+        program = "(define (f) 1) (define (g) (f))"
+        self.evaluate(program)
+
+        check.enabled = False
+        with self.assertRaises(SchemeArityError):
+            self.evaluate("(f 2)")
+
+
+class MemoizeTest(InterpreterTest):
+    def assertStatistics(self, function_name, hits, misses, evictions, size):
+        statistics = [('hits', hits), ('misses', misses), ('evictions', evictions),
+                      ('size', size)]
+        self.assertEvaluatesTo("(memo-stats %s)" % function_name,
+                               Cons.from_list([Cons(Symbol(name), Integer(value))
+                                               for (name, value) in statistics]))
+
+    def test_define_memoized(self):
+        program = """(define-memoized (fib n)
+          (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+        (fib 30)"""
+        self.assertEvaluatesTo(program, Integer(832040))
+
+        # each recursive call is made once, and fib(n - 2) is cached
+        # by the time the second call needs it
+        self.assertStatistics("fib", 28, 31, 0, 31)
+
+    def test_define_memoized_options(self):
+        program = """(define-memoized/options (square x) (2) (* x x))
+        (list (square 1) (square 2) (square 3) (square 1))"""
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(4), Integer(9),
+                                                        Integer(1)]))
+
+        # 3 evicts 1, so it's computed again
+        self.assertStatistics("square", 0, 4, 2, 2)
+
+        program = """(define-memoized/options (wrap x) (#f #t) (list x))
+        (define kept (wrap 1))
+        (wrap 2)
+        (eq? kept (wrap 1))"""
+        self.assertEvaluatesTo(program, Boolean(True))
+        self.assertStatistics("wrap", 1, 2, 1, 1)
+
+    def test_memoize(self):
+        program = """(define calls 0)
+        (define (square x) (set! calls (+ calls 1)) (* x x))
+        (define fast-square (memoize square))
+        (list (fast-square 3) (fast-square 3) calls)"""
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(9), Integer(9), Integer(1)]))
+
+        # memoizing again starts a new cache, rather than wrapping the
+        # old one
+        self.assertEvaluatesTo("(define slow-square (memoize fast-square)) (slow-square 3) calls",
+                               Integer(2))
+        self.assertStatistics("slow-square", 0, 1, 0, 1)
+
+    def test_equal_keys(self):
+        program = """(define count (memoize length))
+        (count (list 1 2 3))
+        (count '(1 2 3))
+        (count (list 1 2))"""
+        self.evaluate(program)
+        self.assertStatistics("count", 1, 2, 0, 2)
+
+    def test_lru_eviction(self):
+        program = """(define square (memoize (lambda (x) (* x x)) 2))
+        (list (square 1) (square 2) (square 1) (square 3) (square 2) (square 1))"""
+        self.evaluate(program)
+
+        # 3 evicts 2, the least recently used, 2 evicts 1, then 1
+        # evicts 3
+        self.assertStatistics("square", 1, 5, 3, 2)
+
+    def test_weak_values(self):
+        program = """(define wrap (memoize (lambda (x) (list x)) #f #t))
+        (define kept (wrap 1))
+        (wrap 2)
+        (eq? kept (wrap 1))"""
+        self.assertEvaluatesTo(program, Boolean(True))
+
+        # only the result we kept is still cached
+        self.assertStatistics("wrap", 1, 2, 1, 1)
+
+    def test_memoize_errors(self):
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate("(memoize 1)")
+
+        with self.assertRaises(InvalidArgument):
+            self.evaluate("(memoize car 0)")
+
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate("(memo-stats car)")
+
+        with self.assertRaises(SchemeArityError):
+            self.evaluate("((memoize (lambda (x) x)) 1 2)")
+
+
+class PromiseTest(InterpreterTest):
+    def test_delay(self):
+        program = """(define calls 0)
+        (define p (delay (begin (set! calls (+ calls 1)) 'value)))
+        (list (promise? p) calls (force p) (force p) calls)"""
+        self.assertEvaluatesTo(program, Cons.from_list([
+            Boolean(True), Integer(0), Symbol('value'), Symbol('value'), Integer(1)]))
+
+    def test_reentrant_force(self):
+        # from R7RS: the value computed first is the one we keep
+        program = """(define x 5)
+        (define p (delay (begin (set! x (+ x 1)) (if (> x 6) x (force p)))))
+        (force p)
+        (set! x 10)
+        (force p)"""
+        self.assertEvaluatesTo(program, Integer(7))
+
+    def test_make_promise(self):
+        self.assertEvaluatesTo("(force (make-promise 5))", Integer(5))
+        self.assertEvaluatesTo("(define p (delay 1)) (eq? (make-promise p) p)",
+                               Boolean(True))
+        self.assertEvaluatesTo("(force 3)", Integer(3))
+
+    def test_delay_force_chain(self):
+        program = """(define (countdown n)
+          (delay-force (if (= n 0) (delay 'done) (countdown (- n 1)))))
+        (force (countdown 10000))"""
+        self.assertEvaluatesTo(program, Symbol('done'))
+
+    def test_delay_force_type_error(self):
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate("(force (delay-force 1))")
+
+
+class StreamTest(InterpreterTest):
+    def setUp(self):
+        super().setUp()
+        # a promise is forced in a copy of the environment it was made
+        # in, so we count in a vector rather than assigning a variable
+        self.evaluate("""(define generated (vector 0))
+        (define (integers-from n)
+          (vector-set! generated 0 (+ (vector-ref generated 0) 1))
+          (cons-stream n (integers-from (+ n 1))))""")
+
+    def test_stream_car_cdr(self):
+        program = "(stream-car (stream-cdr (integers-from 7)))"
+        self.assertEvaluatesTo(program, Integer(8))
+
+        self.assertEvaluatesTo("(stream-pair? (integers-from 1))", Boolean(True))
+        self.assertEvaluatesTo("(stream-null? the-empty-stream)", Boolean(True))
+
+    def test_stream_to_list(self):
+        program = "(stream->list 3 (integers-from 1))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(2), Integer(3)]))
+
+        program = "(stream->list (cons-stream 1 (cons-stream 2 the-empty-stream)))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(2)]))
+
+    def test_stream_map(self):
+        program = "(stream->list 3 (stream-map + (integers-from 0) (integers-from 10)))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(10), Integer(12), Integer(14)]))
+
+        program = "(stream->list (stream-map - (stream-take 2 (integers-from 1))))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(-1), Integer(-2)]))
+
+    def test_stream_filter(self):
+        program = """(stream->list (stream-take 3 (stream-filter
+          (lambda (n) (= (remainder n 100) 0)) (integers-from 1))))"""
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(100), Integer(200),
+                                                        Integer(300)]))
+
+        program = "(stream->list (stream-filter odd? (stream-take 4 (integers-from 1))))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(3)]))
+
+    def peak_memory_searching(self, gap):
+        """Peak memory used by stream-filter to find the next match, gap
+        elements on from the last one.
+
+        """
+        self.evaluate("""(define multiples (stream-filter
+          (lambda (n) (= (remainder n %d) 0)) (integers-from 1)))""" % gap)
+
+        tracemalloc.start()
+        try:
+            self.evaluate("(stream-car (stream-cdr multiples))")
+            (_, peak) = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        del self.environment['multiples']
+        return peak
+
+    def test_stream_filter_memory(self):
+        # the pairs we pass between matches are freed, so the memory we
+        # use doesn't grow with the distance between them
+        small_gap_peak = self.peak_memory_searching(300)
+        large_gap_peak = self.peak_memory_searching(3000)
+
+        self.assertLess(large_gap_peak, small_gap_peak * 2)
+
+    def test_streams_are_lazy(self):
+        program = """(define evens (stream-take 2 (stream-filter even? (integers-from 1))))
+        (vector-ref generated 0)"""
+        self.assertEvaluatesTo(program, Integer(2))
+
+        # we don't force the stream beyond the last element we take
+        self.assertEvaluatesTo("(stream->list evens) (vector-ref generated 0)", Integer(4))
+
+    def test_stream_errors(self):
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate("(stream-car '())")
+
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate("(stream-map car (list 1 2))")
+
+        with self.assertRaises(InvalidArgument):
+            self.evaluate("(stream-take -1 (integers-from 1))")
+
+
+class BitwiseTest(InterpreterTest):
+    def test_bitwise_operations(self):
+        program = "(list (bitwise-and 12 10) (bitwise-ior 12 10) (bitwise-xor 12 10) (bitwise-not 12))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(8), Integer(14), Integer(6),
+                                                        Integer(-13)]))
+
+        program = "(list (bitwise-and) (bitwise-or) (bitwise-and -1 5 7))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(-1), Integer(0), Integer(5)]))
+
+        program = "(bitwise-and 1 1.0)"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+    def test_arithmetic_shift(self):
+        program = "(list (arithmetic-shift 1 100) (arithmetic-shift 8 -2) (arithmetic-shift -8 -1))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(2 ** 100), Integer(2),
+                                                        Integer(-4)]))
+
+    def test_bit_count(self):
+        program = "(list (bit-count 0) (bit-count 255) (bit-count -1) (bit-count -256))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(0), Integer(8), Integer(0),
+                                                        Integer(8)]))
+
+    def test_bit_set(self):
+        program = "(list (bit-set? 0 5) (bit-set? 1 5) (bit-set? 100 -1))"
+        self.assertEvaluatesTo(program, Cons.from_list([Boolean(True), Boolean(False),
+                                                        Boolean(True)]))
+
+        program = "(bit-set? -1 5)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+
+class BitsetTest(InterpreterTest):
+    def test_bitset(self):
+        program = "(bitset->list (bitset 5 1 3 1))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(1), Integer(3), Integer(5)]))
+
+        # a negative member is out of range, as a negative index is
+        # for bit-set?
+        program = "(bitset -1)"
+        with self.assertRaises(InvalidArgument):
+            self.evaluate(program)
+
+        program = "(bitset 1.5)"
+        with self.assertRaises(SchemeTypeError):
+            self.evaluate(program)
+
+    def test_membership(self):
+        program = """(define b (make-bitset))
+        (bitset-add! b 70) (bitset-add! b 2) (bitset-remove! b 2) (bitset-remove! b 3)
+        (list (bitset-contains? b 70) (bitset-contains? b 2) (bitset-count b))"""
+        self.assertEvaluatesTo(program, Cons.from_list([Boolean(True), Boolean(False),
+                                                        Integer(1)]))
+
+    def test_set_operations(self):
+        program = """(define a (list->bitset (list 1 2 3)))
+        (define b (bitset 2 3 4))
+        (map bitset->list (list (bitset-union a b) (bitset-intersection a b)
+                                (bitset-difference a b)))"""
+        self.assertEvaluatesTo(program, Cons.from_list([
+            Cons.from_list([Integer(1), Integer(2), Integer(3), Integer(4)]),
+            Cons.from_list([Integer(2), Integer(3)]),
+            Cons(Integer(1))]))
+
+    def test_large_sets(self):
+        self.environment['evens'] = Bitset(sum(1 << n for n in range(0, 200000, 2)))
+        self.environment['threes'] = Bitset(sum(1 << n for n in range(0, 300000, 3)))
+
+        program = "(bitset-count (bitset-intersection evens threes))"
+        self.assertEvaluatesTo(program, Integer(33334))
+
+    def test_integer_conversion(self):
+        program = "(list (bitset->integer (bitset 0 3)) (bitset->list (integer->bitset 10)))"
+        self.assertEvaluatesTo(program, Cons.from_list([Integer(9),
+                                                        Cons.from_list([Integer(1), Integer(3)])]))
+
 
 class IOTest(InterpreterTest):
     def setUp(self):
@@ -1,15 +1,20 @@
-from .errors import SchemeArityError
+from .errors import SchemeArityError, SchemeTypeError, InvalidArgument
+from .data_types import Cons, Nil, Vector
+
 
 def check_argument_number(function_name, given_arguments,
                           min_arguments, max_arguments=None):
     assert max_arguments is None or min_arguments <= max_arguments
 
+    # finding the length of a linked list walks it, so we only do it once
+    argument_number = len(given_arguments)
+
     right_argument_number = True
 
-    if len(given_arguments) < min_arguments:
+    if argument_number < min_arguments:
         right_argument_number = False
 
-    if max_arguments and len(given_arguments) > max_arguments:
+    if max_arguments is not None and argument_number > max_arguments:
         right_argument_number = False
 
     if not right_argument_number:
@@ -17,16 +22,47 @@ def check_argument_number(function_name, given_arguments,
             raise SchemeArityError("%s requires exactly %d argument(s), but "
                                   "received %d." % (function_name,
                                                     min_arguments,
-                                                    len(given_arguments)))
+                                                    argument_number))
         else:
-            if max_arguments:
+            if max_arguments is not None:
                 raise SchemeArityError("%s requires between %d and %d argument(s), but "
                                       "received %d." % (function_name,
                                                         min_arguments,
                                                         max_arguments,
-                                                        len(given_arguments)))
+                                                        argument_number))
             else:
                 raise SchemeArityError("%s requires at least %d argument(s), but "
                                       "received %d." % (function_name,
                                                         min_arguments,
-                                                        len(given_arguments)))
+                                                        argument_number))
+
+
+def check_procedure(function_name, function):
+    if not callable(function):
+        raise SchemeTypeError("%s requires a function, "
+                              "you gave me a %s." % (function_name, function.__class__))
+
+
+def check_type(function_name, value, expected_type, type_name):
+    if not isinstance(value, expected_type):
+        raise SchemeTypeError("%s requires a %s, you gave me %s."
+                              % (function_name, type_name, value.get_external_representation()))
+
+
+def check_list(function_name, list_given):
+    if not isinstance(list_given, (Cons, Nil)) or not list_given.is_proper():
+        raise SchemeTypeError("%s requires a proper list, "
+                              "you gave me a %s." % (function_name, list_given.__class__))
+
+
+def check_vector(function_name, vector):
+    if not isinstance(vector, Vector):
+        raise SchemeTypeError("%s requires a vector, "
+                              "you gave me a %s." % (function_name, vector.__class__))
+
+
+def check_mutable(function_name, value):
+    """Literals are constants, so we refuse to modify them."""
+    if getattr(value, 'frozen', False):
+        raise InvalidArgument("%s can't modify the literal constant %s."
+                              % (function_name, value.get_external_representation()))
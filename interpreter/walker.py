@@ -0,0 +1,283 @@
+"""Walking function bodies.
+
+Our optimisation passes rewrite the body of each function as it's
+defined. CodeWalker does the work they have in common: it knows which
+special forms contain code and which contain data, keeps track of the
+local variables in scope, and leaves the arguments of macros alone,
+since a macro may inspect them.
+
+Every walk method returns a tuple (new_s_expression, info), where info
+is whatever a pass has inferred about the value of the expression, or
+None if it knows nothing.
+
+"""
+from .data_types import Atom, Symbol, Cons, Function
+
+
+# symbols are interned, so this is the same symbol as primitives.QUOTE
+QUOTE = Symbol('quote')
+
+SPECIAL_FORMS = ['quote', 'quasiquote', 'defmacro', 'define-record-type',
+                 'case', 'lambda', 'define', 'let', 'do', 'set!', 'if']
+
+
+class CompiledExpression(object):
+    """An expression rewritten by a pass into an object that the
+    evaluator runs by calling its evaluate method.
+
+    """
+    __slots__ = ()
+
+    def evaluate(self, environment):
+        raise NotImplementedError
+
+    def subexpressions(self):
+        """The s-expressions that evaluate may evaluate, so analyses such
+        as the tail call check on named let can look inside us. None
+        means we don't know, and callers must assume the worst.
+
+        """
+        return None
+
+    def get_external_representation(self):
+        raise NotImplementedError
+
+
+def external_representation(s_expression):
+    if hasattr(s_expression, 'get_external_representation'):
+        return s_expression.get_external_representation()
+
+    # a raw value
+    return str(s_expression)
+
+
+class CodeWalker(object):
+    """Rewrite the body of a function. Subclasses override the walk_
+    methods for the expressions they're interested in.
+
+    scope maps the local variables at each point to what we know about
+    their values.
+
+    """
+    def __init__(self, environment):
+        self.environment = environment
+
+    def walk_body(self, body, scope):
+        """Rewrite a list of s-expressions. Returns a tuple (new_body,
+        info), where info is for the last expression.
+
+        """
+        new_body = []
+        info = None
+
+        for s_expression in body:
+            (new_s_expression, info) = self.walk(s_expression, scope)
+            new_body.append(new_s_expression)
+
+        return (new_body, info)
+
+    def walk(self, s_expression, scope):
+        if isinstance(s_expression, Symbol):
+            return self.walk_symbol(s_expression, scope)
+
+        if isinstance(s_expression, Atom):
+            return self.walk_literal(s_expression)
+
+        if isinstance(s_expression, CompiledExpression):
+            # already rewritten, e.g. the body of a nested define
+            return self.walk_compiled(s_expression, scope)
+
+        if not isinstance(s_expression, Cons) or not s_expression.is_proper():
+            return (s_expression, None)
+
+        head = s_expression.head
+
+        if isinstance(head, Symbol) and head.value not in scope:
+            name = head.value
+
+            if name in SPECIAL_FORMS:
+                return self.walk_special_form(name, s_expression, scope)
+
+            if self.is_macro(name):
+                # a macro may inspect its arguments, so we leave them
+                # alone
+                return (s_expression, None)
+
+        return self.walk_call(s_expression, scope)
+
+    def is_macro(self, name):
+        binding = self.environment.get(name)
+        return callable(binding) and not isinstance(binding, Function)
+
+    def variable_info(self, info):
+        """What we record in scope about a variable initialised to a
+        value with this info.
+
+        """
+        return info
+
+    def walk_symbol(self, symbol, scope):
+        return (symbol, scope.get(symbol.value))
+
+    def walk_literal(self, atom):
+        return (atom, None)
+
+    def walk_compiled(self, compiled_expression, scope):
+        return (compiled_expression, None)
+
+    def walk_call(self, s_expression, scope):
+        elements = [self.walk(element, scope)[0] for element in s_expression]
+        return (Cons.from_list(elements), None)
+
+    def walk_if(self, s_expression, scope):
+        elements = [self.walk(argument, scope)[0] for argument in s_expression.tail]
+        return (Cons(s_expression.head, Cons.from_list(elements)), None)
+
+    def walk_special_form(self, name, s_expression, scope):
+        arguments = list(s_expression.tail)
+
+        try:
+            if name == 'if':
+                return self.walk_if(s_expression, scope)
+
+            elif name == 'lambda':
+                inner_scope = dict(scope)
+                for parameter in arguments[0]:
+                    inner_scope[parameter.value] = None
+
+                (body, _) = self.walk_body(arguments[1:], inner_scope)
+                return (Cons.from_list([s_expression.head, arguments[0]] + body), None)
+
+            elif name == 'define' and isinstance(arguments[0], Cons):
+                # an internal function definition
+                function_name = arguments[0].head
+                scope[function_name.value] = None
+
+                inner_scope = dict(scope)
+                for parameter in arguments[0].tail:
+                    inner_scope[parameter.value] = None
+
+                (body, _) = self.walk_body(arguments[1:], inner_scope)
+                return (Cons.from_list([s_expression.head, arguments[0]] + body), None)
+
+            elif name == 'define' and isinstance(arguments[0], Symbol):
+                (value, _) = self.walk(arguments[1], scope)
+                scope[arguments[0].value] = None
+                return (Cons.from_list([s_expression.head, arguments[0], value]), None)
+
+            elif name == 'set!':
+                (value, _) = self.walk(arguments[1], scope)
+
+                if arguments[0].value in scope:
+                    # we can't keep track of assignments, so stop
+                    # assuming anything about this variable
+                    scope[arguments[0].value] = None
+
+                return (Cons.from_list([s_expression.head, arguments[0], value]), None)
+
+            elif name == 'let':
+                return self.walk_let(s_expression, arguments, scope)
+
+            elif name == 'do':
+                return self.walk_do(s_expression, arguments, scope)
+
+            elif name == 'case':
+                (key, _) = self.walk(arguments[0], scope)
+
+                clauses = []
+                for clause in arguments[1:]:
+                    if isinstance(clause, Cons) and clause.is_proper():
+                        # the datums are data, the body is code
+                        (body, _) = self.walk_body(clause.tail, scope)
+                        clause = Cons(clause.head, Cons.from_list(body))
+
+                    clauses.append(clause)
+
+                return (Cons.from_list([s_expression.head, key] + clauses), None)
+
+        except (IndexError, AttributeError, TypeError):
+            # a malformed form, which we leave for the evaluator to
+            # report when it's run
+            pass
+
+        # quote, quasiquote, defmacro and define-record-type contain
+        # data, not code
+        return (s_expression, None)
+
+    def walk_let(self, s_expression, arguments, scope):
+        inner_scope = dict(scope)
+        prefix = [s_expression.head]
+
+        if isinstance(arguments[0], Symbol):
+            # a named let
+            prefix.append(arguments[0])
+            inner_scope[arguments[0].value] = None
+            arguments = arguments[1:]
+
+        bindings = []
+        for binding in arguments[0]:
+            (variable, init) = list(binding)
+            (new_init, init_info) = self.walk(init, scope)
+
+            bindings.append(Cons.from_list([variable, new_init]))
+            inner_scope[variable.value] = self.variable_info(init_info)
+
+        (body, body_info) = self.walk_body(arguments[1:], inner_scope)
+
+        return (Cons.from_list(prefix + [Cons.from_list(bindings)] + body), body_info)
+
+    def walk_do(self, s_expression, arguments, scope):
+        variable_specs = [list(variable_spec) for variable_spec in arguments[0]]
+
+        inner_scope = dict(scope)
+        inits = []
+        for variable_spec in variable_specs:
+            (new_init, init_info) = self.walk(variable_spec[1], scope)
+            inits.append(new_init)
+            inner_scope[variable_spec[0].value] = self.variable_info(init_info)
+
+        steps = self.walk_steps(variable_specs, inner_scope)
+
+        # a variable keeps what we know about its initial value only
+        # if its step agrees, otherwise we walk the steps again
+        # knowing less
+        changed = False
+        for (variable_spec, step) in zip(variable_specs, steps):
+            variable_name = variable_spec[0].value
+
+            if step is not None and self.variable_info(step[1]) != inner_scope[variable_name]:
+                inner_scope[variable_name] = None
+                changed = True
+
+        if changed:
+            steps = self.walk_steps(variable_specs, inner_scope)
+
+        new_specs = []
+        for (variable_spec, new_init, step) in zip(variable_specs, inits, steps):
+            new_spec = [variable_spec[0], new_init]
+
+            if step is not None:
+                new_spec.append(step[0])
+
+            new_specs.append(Cons.from_list(new_spec))
+
+        (exit_clause, _) = self.walk_body(arguments[1], inner_scope)
+        (commands, _) = self.walk_body(arguments[2:], inner_scope)
+
+        return (Cons.from_list([s_expression.head, Cons.from_list(new_specs),
+                                Cons.from_list(exit_clause)] + commands),
+                None)
+
+    def walk_steps(self, variable_specs, scope):
+        """Walk the step of each do variable, giving None for variables
+        without one.
+
+        """
+        steps = []
+        for variable_spec in variable_specs:
+            if len(variable_spec) == 3:
+                steps.append(self.walk(variable_spec[2], scope))
+            else:
+                steps.append(None)
+
+        return steps
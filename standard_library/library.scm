@@ -29,56 +29,11 @@
       x
       (- x)))
 
-; list functions
-(define (null? x)
-  (eqv? x '()))
-
-; FIXME: doesn't handle infinite lists
-(define (list? x)
-  (if (null? x)
-      #t
-      (if (pair? x)
-          (list? (cdr x))
-          #f)))
-
-(define (list . args)
-  args)
-
-(define (length x)
-  (if (null? x)
-      0
-      (+ 1 (length (cdr x)))))
-
-(define (caar x)
-  (car (car x)))
-
-(define (cadr x)
-  (car (cdr x)))
-
-(define (cdar x)
-  (cdr (car x)))
-
-(define (cddr x)
-  (cdr (cdr x)))
-
-; control features
-(define (map function list)
-  (if (null? list)
-      '()
-      (cons (function (car list))
-            (map function (cdr list)))))
-
-(define (for-each function list)
-  (if (null? list)
-      '()
-      (begin
-        (function (car list))
-        (for-each function (cdr list)))))
+; list functions, map and for-each are built-ins, see
+; interpreter/built_ins/lists.py and control.py
 
 ; scoping macros
-(defmacro let (assignments . body)
-  `((lambda ,(map car assignments) ,@body)
-    ,@(map cadr assignments)))
+; (let is a primitive, so that named let can run as a loop)
 
 (defmacro cond (clauses)
   (let ((first-clause (car clauses)))
@@ -91,48 +46,29 @@
              ; otherwise recurse on the rest of the clauses
              (cond ,(cdr clauses))))))
 
-; vector functions
-(define (vector . args)
-  (let ((v (make-vector (length args)))
-        (index 0))
-    (for-each
-     (lambda (arg)
-       (vector-set! v index arg)
-       (set! index (+ index 1)))
-     args)
-    v))
-
-(define (vector->list vector)
-  ;; vector-list-iter is a recursive helper function that moves
-  ;; through the vector and builds a list.
-  (let ((vector->list-iter
-         (lambda (index)
-           (if (>= index (vector-length vector))
-               '()
-               (cons
-                (vector-ref vector index)
-                (vector->list-iter (+ index 1)))))))
-    (vector->list-iter 0)))
-
-(define (list->vector list)
-  (let ((v (make-vector (length list)))
-        (index 0))
-    (for-each
-     (lambda (item)
-       (vector-set! v index item)
-       (set! index (+ index 1)))
-     list)
-    v))
-
-(define (vector-fill! vector fill)
-  (let ((vector-fill-iter
-         (lambda (index)
-           (if (>= index (vector-length vector))
-               '()
-               (begin
-                 (vector-set! vector index fill)
-                 (vector-fill-iter (+ index 1)))))))
-    (vector-fill-iter 0)))
+; memoization: define a function, then replace it with a memoized
+; version, so its recursive calls are cached too
+(defmacro define-memoized (signature . body)
+  `(begin
+     (define ,signature ,@body)
+     (set! ,(car signature) (memoize ,(car signature)))))
+
+; (define-memoized/options (f args ...) (max-size [weak?]) body ...)
+; passes the options on to memoize, e.g. (#f #t) for an unbounded
+; cache of weakly held results
+(defmacro define-memoized/options (signature options . body)
+  `(begin
+     (define ,signature ,@body)
+     (set! ,(car signature) (memoize ,(car signature) ,@options))))
+
+; streams, as in SICP. The other stream functions are built-ins, see
+; interpreter/built_ins/streams.py
+(defmacro cons-stream (head tail)
+  `(cons ,head (delay ,tail)))
+
+(define the-empty-stream '())
+
+; vector functions are built-ins, see interpreter/built_ins/vectors.py
 
 ; I/O
 (define (newline)
@@ -141,7 +77,7 @@
 ; booleans
 ; note that R5RS requires 'and and 'or to take a variable number of arguments
 (defmacro and (x y)
-  `(if ,x (if ,y ,y #f) #f))
+  `(if ,x ,y #f))
 
 (defmacro or (x y)
   `(if ,x ,x ,y))